@@ -1,14 +1,26 @@
+import atexit
+import io
 import os
+import queue
+import shlex
+import struct
 import subprocess
+import threading
+import time
+import uuid
 import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 import cv2
+import numpy as np
 import shutil
 
-from config import load_config
-from utils import print_with_color
+from config import get_settings
+from utils import print_with_color, CenterGrid, frame_fingerprint, wait_until_stable
+from element_table import ElementTable
+from artifacts import Frame
 
 
-configs = load_config()
+configs = get_settings()
 
 
 def get_android_sdk_path():
@@ -78,15 +90,22 @@ def find_sdk_tool(tool_name, subfolder='platform-tools'):
 
 
 class AndroidElement:
+    # Also used as the row view of ElementTable (see element_table.py)
     def __init__(self, uid, bbox, attrib):
         self.uid = uid
         self.bbox = bbox
         self.attrib = attrib
 
 
+_adb_path = None
+
+
 def get_adb_path():
-    """Get adb executable path using find_sdk_tool helper"""
-    return find_sdk_tool('adb', 'platform-tools')
+    """Get adb executable path using find_sdk_tool helper (resolved once per process)"""
+    global _adb_path
+    if _adb_path is None:
+        _adb_path = find_sdk_tool('adb', 'platform-tools')
+    return _adb_path
 
 
 def execute_adb(adb_command):
@@ -126,6 +145,264 @@ def execute_adb(adb_command):
     return "ERROR"
 
 
+class AdbShellSession:
+    """
+    Long-lived `adb -s <serial> shell` process that runs commands over stdin.
+
+    Every command is followed by a unique marker line carrying its exit status, so the
+    output can be framed without forking a new adb client for each command. Output is read by a
+    background thread, so a command that hangs (or a device that stops answering) is given up
+    after timeout seconds instead of blocking the caller forever.
+    """
+    def __init__(self, adb_path, device, timeout=30.0):
+        self.device = device
+        self.timeout = timeout
+        self.proc = subprocess.Popen([adb_path, "-s", device, "shell"],
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT)
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read_lines, daemon=True).start()
+
+    def _read_lines(self):
+        """Queue the session's output line by line, then b"" once the process exits"""
+        try:
+            for line in iter(self.proc.stdout.readline, b""):
+                self.lines.put(line)
+        except (OSError, ValueError):
+            pass
+        self.lines.put(b"")
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def run(self, command):
+        """
+        Run a shell command in the session.
+
+        Args:
+            command: Device-side shell command (e.g., "input tap 100 200")
+
+        Returns:
+            (returncode, output); None if the command could not be sent, so it is safe to run it
+            another way; "ERROR" if it was sent but the session died or timed out (the session is
+            then killed), as the command may already have run on the device
+        """
+        marker = uuid.uuid4().hex
+        script = f"( {command} ) < /dev/null 2>&1; printf '\\n%s %d\\n' {marker} $?\n"
+        deadline = time.time() + self.timeout
+        try:
+            self.proc.stdin.write(script.encode("utf-8"))
+            self.proc.stdin.flush()
+        except (OSError, ValueError):
+            return None
+        lines = []
+        while True:
+            try:
+                line = self.lines.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                print_with_color(f"ERROR: adb shell command timed out after {self.timeout}s: {command}", "red")
+                self.proc.kill()
+                return "ERROR"
+            if not line:
+                print_with_color(f"ERROR: adb shell session closed while running: {command}", "red")
+                return "ERROR"
+            if line.startswith(marker.encode("ascii")):
+                returncode = int(line.split()[1])
+                break
+            lines.append(line)
+        output = b"".join(lines).decode("utf-8", errors="replace")
+        # Drop the newline printed in front of the marker
+        if output.endswith("\n"):
+            output = output[:-1]
+        return returncode, output
+
+    def close(self):
+        if self.alive():
+            try:
+                self.proc.stdin.write(b"exit\n")
+                self.proc.stdin.flush()
+                self.proc.wait(timeout=2)
+            except (OSError, ValueError, subprocess.TimeoutExpired):
+                self.proc.kill()
+
+
+class AdbShellPool:
+    """
+    Pool of persistent shell sessions keyed by device serial.
+
+    Sessions are handed out one caller at a time; concurrent callers on the same device get
+    their own session, and at most `max_idle` sessions per device are kept around afterwards.
+    """
+    def __init__(self, max_idle=2):
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, device):
+        with self._lock:
+            sessions = self._idle.setdefault(device, [])
+            while sessions:
+                session = sessions.pop()
+                if session.alive():
+                    return session
+        adb_path = get_adb_path()
+        if not adb_path:
+            return None
+        try:
+            return AdbShellSession(adb_path, device, configs.get("ADB_SHELL_TIMEOUT", 30.0))
+        except OSError:
+            return None
+
+    def _release(self, session):
+        with self._lock:
+            sessions = self._idle.setdefault(session.device, [])
+            if session.alive() and len(sessions) < self.max_idle:
+                sessions.append(session)
+                return
+        session.close()
+
+    def run(self, device, command):
+        """
+        Run a command on the device.
+
+        Returns:
+            (returncode, output), None if no session could take the command, or "ERROR" if it
+            was sent but did not complete (see AdbShellSession.run)
+        """
+        session = self._acquire(device)
+        if session is None:
+            return None
+        result = session.run(command)
+        if result is None or result == "ERROR":
+            session.close()
+            return result
+        self._release(session)
+        return result
+
+    def close(self, device=None):
+        """Close idle sessions for one device, or for all devices when device is None"""
+        with self._lock:
+            devices = [device] if device is not None else list(self._idle.keys())
+            sessions = []
+            for d in devices:
+                sessions.extend(self._idle.pop(d, []))
+        for session in sessions:
+            session.close()
+
+
+_shell_pool = AdbShellPool(max_idle=configs.get("ADB_MAX_SESSIONS", 2))
+atexit.register(_shell_pool.close)
+
+
+def execute_adb_shell(device, command):
+    """
+    Execute a device shell command, preferring the pooled persistent session
+
+    Falls back to a one-off `adb -s <device> shell` subprocess when persistent sessions are
+    disabled or the session cannot be started or written to. A command that was sent but timed
+    out (ADB_SHELL_TIMEOUT) or lost its session is not rerun, since an input event may already
+    have reached the device.
+
+    Args:
+        device: Device serial
+        command: Device-side shell command (e.g., "input tap 100 200")
+
+    Returns:
+        Command output or "ERROR"
+    """
+    if configs.get("ADB_PERSISTENT_SHELL", True):
+        result = _shell_pool.run(device, command)
+        if result == "ERROR":
+            return result
+        if result is not None:
+            returncode, output = result
+            if returncode == 0:
+                return output.strip()
+            print_with_color(f"Command execution failed: adb -s {device} shell {command}", "red")
+            print_with_color(output, "red")
+            return "ERROR"
+    adb_path = get_adb_path()
+    if not adb_path:
+        print_with_color("ERROR: adb command not found", "red")
+        return "ERROR"
+    # Passed as one argument, so &&, || and redirections reach the device shell instead of the host's
+    result = subprocess.run([adb_path, "-s", device, "shell", command],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode == 0:
+        return result.stdout.strip()
+    print_with_color(f"Command execution failed: adb -s {device} shell {command}", "red")
+    print_with_color(result.stderr, "red")
+    return "ERROR"
+
+
+def execute_adb_exec_out(device, command):
+    """
+    Execute a device command with `adb exec-out` and return its raw stdout
+
+    Unlike `adb shell`, exec-out does not rewrite line endings, so binary output such as
+    screencap frames reaches the host unmodified without a device-side file.
+
+    Args:
+        device: Device serial
+        command: Device-side command (e.g., "screencap -p")
+
+    Returns:
+        Output bytes or "ERROR"
+    """
+    adb_path = get_adb_path()
+    if not adb_path:
+        print_with_color("ERROR: adb command not found", "red")
+        return "ERROR"
+    result = subprocess.run([adb_path, "-s", device, "exec-out"] + command.split(),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode == 0 and result.stdout:
+        return result.stdout
+    print_with_color(f"Command execution failed: adb -s {device} exec-out {command}", "red")
+    print_with_color(result.stderr.decode("utf-8", errors="replace"), "red")
+    return "ERROR"
+
+
+def find_png_end(data, start):
+    """
+    Offset just past the PNG that starts at start in data, found by walking its chunks (4-byte
+    length, type, data, CRC) to IEND; searching for the IEND bytes is not enough, as they can occur
+    in compressed image data.
+
+    Returns:
+        End offset, or -1 if the PNG is truncated
+    """
+    pos = start + 8
+    while pos + 12 <= len(data):
+        length = int.from_bytes(data[pos:pos + 4], "big")
+        chunk_type = data[pos + 4:pos + 8]
+        pos += 12 + length
+        if chunk_type == b"IEND":
+            return pos if pos <= len(data) else -1
+    return -1
+
+
+def decode_raw_screencap(data):
+    """
+    Decode the output of `screencap` without -p into a BGR image.
+
+    The raw format is a little-endian header (width, height, pixel format and, since
+    Android 9, a colour space) followed by width * height RGBA pixels.
+
+    Returns:
+        BGR ndarray or None if the data is malformed
+    """
+    if len(data) < 12:
+        return None
+    width, height, _ = struct.unpack_from("<III", data, 0)
+    pixel_bytes = width * height * 4
+    header_size = len(data) - pixel_bytes
+    if header_size not in (12, 16):
+        return None
+    rgba = np.frombuffer(data, dtype=np.uint8, count=pixel_bytes, offset=header_size).reshape(height, width, 4)
+    return cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGR)
+
+
 def list_all_devices():
     """List all connected Android devices"""
     adb_path = get_adb_path()
@@ -167,19 +444,55 @@ def list_available_emulators():
     return []
 
 
-def start_emulator(avd_name=None, wait_for_boot=True):
+def launch_emulator(avd_name, snapshot=None, port=None, headless=False, read_only=False, cold_boot=False):
+    """
+    Launch an emulator process without waiting for it to boot
+
+    Args:
+        avd_name: Name of the AVD to launch
+        snapshot: Quickboot snapshot to boot from (None uses the AVD's default quickboot snapshot)
+        port: Console port; the instance then gets the serial emulator-<port>
+        headless: Run without a window, audio or boot animation
+        read_only: Launch with -read-only so several instances of the same AVD can run at once
+        cold_boot: Ignore snapshots and perform a full boot
+
+    Returns:
+        subprocess.Popen of the emulator (stdout piped, stderr merged), or None if the emulator is not found
+    """
+    emulator_path = find_sdk_tool('emulator', 'emulator')
+    if not emulator_path:
+        return None
+    cmd = [emulator_path, '-avd', avd_name]
+    if cold_boot:
+        cmd.append('-no-snapshot-load')
+    elif snapshot:
+        cmd += ['-snapshot', snapshot]
+    if port:
+        cmd += ['-port', str(port)]
+    if headless:
+        cmd += ['-no-window', '-no-audio', '-no-boot-anim']
+    if read_only:
+        cmd.append('-read-only')
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                            text=True, errors="replace")
+
+
+def start_emulator(avd_name=None, wait_for_boot=True, snapshot=None, port=None, headless=None):
     """
     Start an Android emulator
 
+    Boots from the quickboot snapshot unless EMULATOR_QUICKBOOT is disabled in the config.
+
     Args:
         avd_name: Name of AVD to start (if None, uses first available)
         wait_for_boot: Wait for emulator to fully boot
+        snapshot: Named snapshot to boot from instead of the default quickboot snapshot
+        port: Console port (the emulator serial becomes emulator-<port>)
+        headless: Run without a window (defaults to EMULATOR_HEADLESS)
 
     Returns:
         True if successful, False otherwise
     """
-    import time
-
     # Get emulator path using new helper function
     emulator_path = find_sdk_tool('emulator', 'emulator')
 
@@ -209,58 +522,52 @@ def start_emulator(avd_name=None, wait_for_boot=True):
         print_with_color(f"Available AVDs: {', '.join(avds)}", "yellow")
         return False
 
-    # Start emulator in background with cold boot
-    print_with_color(f"Starting emulator: {avd_name} (cold boot)...", "green")
-    subprocess.Popen([emulator_path, '-avd', avd_name, '-no-snapshot-load'],
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL)
+    cold_boot = not configs.get("EMULATOR_QUICKBOOT", True)
+    if headless is None:
+        headless = configs.get("EMULATOR_HEADLESS", False)
+    print_with_color(f"Starting emulator: {avd_name} ({'cold boot' if cold_boot else 'quickboot'})...", "green")
+    process = launch_emulator(avd_name, snapshot=snapshot, port=port, headless=headless, cold_boot=cold_boot)
+    # Nobody reads the console output here; drain it so the emulator never blocks on a full pipe
+    threading.Thread(target=process.stdout.read, daemon=True).start()
 
     if wait_for_boot:
-        return wait_for_device()
+        return wait_for_device(device=f"emulator-{port}" if port else None)
 
     return True
 
 
-def wait_for_device(timeout=120):
+def wait_for_device(timeout=120, device=None):
     """
     Wait for Android device to be ready
 
+    Blocks on `adb wait-for-device` until the transport comes up, then waits on the device side for
+    sys.boot_completed in the same adb call, instead of polling from the host.
+
     Args:
         timeout: Maximum seconds to wait
+        device: Serial to wait for (if None, waits for any device)
 
     Returns:
         True if device is ready, False if timeout
     """
-    import time
+    adb_path = get_adb_path()
+    if not adb_path:
+        print_with_color("ERROR: adb command not found", "red")
+        return False
 
     print_with_color(f"Waiting for device to be ready (timeout: {timeout}s)...", "yellow")
-
-    # Wait for device to be detected
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        devices = list_all_devices()
-        if devices:
-            print_with_color(f"Device detected: {devices[0]}", "green")
-            break
-        time.sleep(2)
-    else:
-        print_with_color("ERROR: Timeout waiting for device", "red")
+    cmd = [adb_path] + (["-s", device] if device else []) + [
+        "wait-for-device", "shell",
+        "while [ \"$(getprop sys.boot_completed)\" != 1 ]; do sleep 0.2; done; getprop sys.boot_completed"]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        print_with_color("ERROR: Device did not boot in time", "red")
         return False
-
-    # Wait for device to boot completely
-    print_with_color("Waiting for device to boot completely...", "yellow")
-    adb_command = "adb wait-for-device shell getprop sys.boot_completed"
-
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        result = execute_adb(adb_command)
-        if result == "1":
-            print_with_color("✓ Device is ready!", "green")
-            time.sleep(2)  # Extra wait for stability
-            return True
-        time.sleep(3)
-
-    print_with_color("ERROR: Device did not boot in time", "red")
+    if result.returncode == 0 and result.stdout.strip() == "1":
+        print_with_color("✓ Device is ready!", "green")
+        return True
+    print_with_color(f"ERROR: Waiting for device failed: {result.stderr.strip()}", "red")
     return False
 
 
@@ -354,6 +661,9 @@ def get_id_from_element(elem):
 
 
 def traverse_tree(xml_path, elem_list, attrib, add_index=False):
+    # xml_path may also be an in-memory file object (see AndroidController.get_xml_source)
+    if hasattr(xml_path, "seek"):
+        xml_path.seek(0)
     path = []
     for event, elem in ET.iterparse(xml_path, ['start', 'end']):
         if event == 'start':
@@ -385,28 +695,153 @@ def traverse_tree(xml_path, elem_list, attrib, add_index=False):
         if event == 'end':
             path.pop()
 
+
+def extract_elements(xml_path, min_dist=None, add_index=True):
+    """
+    Extract the labeled element list from a UI hierarchy in one streaming pass.
+
+    Equivalent to running traverse_tree for "clickable" and for "focusable" and then keeping
+    the focusable elements that are not within min_dist of a clickable one, but the XML is
+    parsed once and the distance checks go through a CenterGrid instead of scanning every
+    element collected so far.
+
+    Args:
+        xml_path: Path to the hierarchy XML or an in-memory file object
+        min_dist: Minimum centre distance between labeled elements (defaults to MIN_DIST)
+        add_index: Append the node index to element uids
+
+    Returns:
+        ElementTable of AndroidElement rows: clickable elements first, then the remaining
+        focusable ones
+    """
+    if min_dist is None:
+        min_dist = configs["MIN_DIST"]
+    if hasattr(xml_path, "seek"):
+        xml_path.seek(0)
+    clickable_grid = CenterGrid(min_dist)
+    focusable_grid = CenterGrid(min_dist)
+    clickable_list = []
+    focusable_list = []
+    path = []
+    for event, elem in ET.iterparse(xml_path, ['start', 'end']):
+        if event == 'end':
+            path.pop()
+            continue
+        path.append(elem)
+        is_clickable = elem.attrib.get("clickable") == "true"
+        is_focusable = elem.attrib.get("focusable") == "true"
+        if not is_clickable and not is_focusable:
+            continue
+        bounds = elem.attrib["bounds"][1:-1].split("][")
+        x1, y1 = map(int, bounds[0].split(","))
+        x2, y2 = map(int, bounds[1].split(","))
+        center = (x1 + x2) // 2, (y1 + y2) // 2
+        keep_clickable = is_clickable and not clickable_grid.is_close(center)
+        keep_focusable = is_focusable and not focusable_grid.is_close(center)
+        if not keep_clickable and not keep_focusable:
+            continue
+        elem_id = get_id_from_element(elem)
+        if len(path) > 1:
+            elem_id = get_id_from_element(path[-2]) + "_" + elem_id
+        if add_index:
+            elem_id += f"_{elem.attrib['index']}"
+        if keep_clickable:
+            clickable_grid.add(center)
+            clickable_list.append((elem_id, (x1, y1, x2, y2)))
+        if keep_focusable:
+            focusable_grid.add(center)
+            focusable_list.append((elem_id, (x1, y1, x2, y2)))
+
+    # Clickable elements are only complete after the pass, so the merge happens here
+    clickable = ElementTable([uid for uid, _ in clickable_list], [bbox for _, bbox in clickable_list],
+                             ["clickable"] * len(clickable_list), AndroidElement)
+    focusable = ElementTable([uid for uid, _ in focusable_list], [bbox for _, bbox in focusable_list],
+                             ["focusable"] * len(focusable_list), AndroidElement)
+    return clickable.concat(focusable.take(focusable.far_from(clickable.centers, min_dist)))
+
+
+# Markers framing the text that precedes the PNG in act_and_observe output
+_ACT_FAILED = "__APPAGENT_ACT_FAILED__"
+_SETTLE = "__APPAGENT_SETTLE__"
+
+
 class AndroidController:
     def __init__(self, device):
         self.device = device
         self.screenshot_dir = configs["ANDROID_SCREENSHOT_DIR"]
         self.xml_dir = configs["ANDROID_XML_DIR"]
+        self.capture_mode = configs.get("SCREENSHOT_CAPTURE", "exec-out")
+        self.xml_mode = configs.get("XML_CAPTURE", "stream")
+        self._xml_stream_target = None
+        self._capture_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"capture-{device}")
+        self.last_capture_times = {}
+        self.last_frame = None
+        self._last_png = None
+        # Fingerprint of the latest screen seen (capture or settle poll) and, after a fused round,
+        # the device-side md5 of its raw pixels
+        self.screen_fingerprint = None
+        self.screen_hash = None
         self.width, self.height = self.get_device_size()
         self.backslash = "\\"
 
     def get_device_size(self):
-        adb_command = f"adb -s {self.device} shell wm size"
-        result = execute_adb(adb_command)
+        result = execute_adb_shell(self.device, "wm size")
         if result != "ERROR":
             return map(int, result.split(": ")[1].split("x"))
         return 0, 0
 
+    def capture_frame(self):
+        """
+        Capture the screen straight into memory with `adb exec-out screencap`.
+
+        In "raw" capture mode the uncompressed RGBA frame is transferred, which skips PNG
+        encoding on the device at the cost of more bytes over the wire.
+
+        Returns:
+            Decoded BGR ndarray or "ERROR"
+        """
+        raw = self.capture_mode == "raw"
+        data = execute_adb_exec_out(self.device, "screencap" if raw else "screencap -p")
+        if data == "ERROR":
+            return data
+        if raw:
+            frame = decode_raw_screencap(data)
+            self._last_png = None
+        else:
+            frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            self._last_png = data
+        if frame is None:
+            print_with_color("ERROR: Failed to decode screenshot data", "red")
+            return "ERROR"
+        self.last_frame = frame
+        self.screen_fingerprint = frame_fingerprint(frame)
+        self.screen_hash = None
+        return frame
+
+    def save_frame(self, prefix, save_dir):
+        """Write the last captured frame to save_dir as a PNG, reusing the device-encoded bytes if available"""
+        path = os.path.join(save_dir, prefix + ".png")
+        if self._last_png is not None:
+            with open(path, "wb") as f:
+                f.write(self._last_png)
+        else:
+            cv2.imwrite(path, self.last_frame)
+        return path
+
     def get_screenshot(self, prefix, save_dir):
-        cap_command = f"adb -s {self.device} shell screencap -p " \
+        if self.capture_mode != "pull":
+            frame = self.capture_frame()
+            if isinstance(frame, str):
+                return frame
+            return self.save_frame(prefix, save_dir)
+        cap_command = f"screencap -p " \
                       f"{os.path.join(self.screenshot_dir, prefix + '.png').replace(self.backslash, '/')}"
         pull_command = f"adb -s {self.device} pull " \
                        f"{os.path.join(self.screenshot_dir, prefix + '.png').replace(self.backslash, '/')} " \
                        f"{os.path.join(save_dir, prefix + '.png')}"
-        result = execute_adb(cap_command)
+        self.last_frame = self._last_png = None
+        self.screen_fingerprint = self.screen_hash = None
+        result = execute_adb_shell(self.device, cap_command)
         if result != "ERROR":
             result = execute_adb(pull_command)
             if result != "ERROR":
@@ -414,13 +849,74 @@ class AndroidController:
             return result
         return result
 
+    def frame(self, screenshot_path):
+        """
+        The screenshot at screenshot_path as an in-memory Frame.
+
+        Reuses the frame and PNG bytes kept from the capture, so the file is only read back in
+        "pull" capture mode.
+        """
+        name = os.path.splitext(os.path.basename(screenshot_path))[0]
+        if self.last_frame is None:
+            return Frame.from_path(screenshot_path, name)
+        return Frame(self.last_frame, name, png=self._last_png)
+
+    def dump_hierarchy(self):
+        """
+        Dump the UI hierarchy and return it over stdout in a single adb invocation.
+
+        The dump is first written to /dev/tty so that nothing touches device storage; if the
+        device refuses that, it falls back to dumping into ANDROID_XML_DIR and printing the
+        file from the same shell command. The working target is remembered per controller, and
+        forgotten when it stops working so the next dump probes both again.
+
+        Returns:
+            XML string or "ERROR"
+        """
+        flags = "--compressed " if configs.get("XML_COMPRESSED", False) else ""
+        device_path = os.path.join(self.xml_dir, "hierarchy.xml").replace(self.backslash, '/')
+        targets = ["/dev/tty", device_path] if self._xml_stream_target is None else [self._xml_stream_target]
+        for target in targets:
+            if target == "/dev/tty":
+                script = f"uiautomator dump {flags}/dev/tty || true"
+            else:
+                script = f"uiautomator dump {flags}{target} > /dev/null && cat {target}"
+            # One quoted sh -c argument, so the operators are run by the device on every transport
+            result = execute_adb_shell(self.device, f"sh -c {shlex.quote(script)}")
+            if result == "ERROR":
+                continue
+            start = result.find("<?xml")
+            end = result.rfind("</hierarchy>")
+            if start < 0 or end < 0:
+                continue
+            self._xml_stream_target = target
+            return result[start:end + len("</hierarchy>")]
+        self._xml_stream_target = None
+        print_with_color("ERROR: Failed to stream the UI hierarchy", "red")
+        return "ERROR"
+
+    def get_xml_source(self):
+        """Stream the UI hierarchy into an in-memory file object that traverse_tree can parse directly"""
+        xml = self.dump_hierarchy()
+        if xml == "ERROR":
+            return xml
+        return io.BytesIO(xml.encode("utf-8"))
+
     def get_xml(self, prefix, save_dir):
-        dump_command = f"adb -s {self.device} shell uiautomator dump " \
+        if self.xml_mode == "stream":
+            xml = self.dump_hierarchy()
+            if xml == "ERROR":
+                return xml
+            xml_path = os.path.join(save_dir, prefix + ".xml")
+            with open(xml_path, "w", encoding="utf-8") as f:
+                f.write(xml)
+            return xml_path
+        dump_command = f"uiautomator dump " \
                        f"{os.path.join(self.xml_dir, prefix + '.xml').replace(self.backslash, '/')}"
         pull_command = f"adb -s {self.device} pull " \
                        f"{os.path.join(self.xml_dir, prefix + '.xml').replace(self.backslash, '/')} " \
                        f"{os.path.join(save_dir, prefix + '.xml')}"
-        result = execute_adb(dump_command)
+        result = execute_adb_shell(self.device, dump_command)
         if result != "ERROR":
             result = execute_adb(pull_command)
             if result != "ERROR":
@@ -428,29 +924,216 @@ class AndroidController:
             return result
         return result
 
-    def back(self):
-        adb_command = f"adb -s {self.device} shell input keyevent KEYCODE_BACK"
-        ret = execute_adb(adb_command)
-        return ret
+    def observe(self, prefix, save_dir, xml_prefix=None, xml_dir=None, unchanged=None):
+        """
+        Capture the screenshot and the UI hierarchy of the same screen concurrently.
+
+        The two captures run on separate persistent shell sessions, so the round pays for the
+        slower of them instead of their sum. Timings are kept in last_capture_times.
+
+        With an `unchanged` predicate (e.g. ScreenCache.matches) the hierarchy dump is skipped when
+        the screen is one the caller has already parsed. If the latest screen seen (usually the last
+        settle poll) passes the predicate, the screenshot is taken alone and checked again before the
+        dump is skipped; otherwise both captures run concurrently as usual.
+
+        Args:
+            prefix: Screenshot filename prefix
+            save_dir: Directory to save the screenshot
+            xml_prefix: Hierarchy filename prefix (defaults to prefix)
+            xml_dir: Directory to save the hierarchy; if None it is returned as an in-memory
+                     file object from get_xml_source()
+            unchanged: Optional predicate on a screen fingerprint
+
+        Returns:
+            (screenshot_path, xml_path_or_source), either of which may be "ERROR"; the hierarchy
+            is None if its dump was skipped
+        """
+        def timed(name, func, *func_args):
+            start = time.time()
+            result = func(*func_args)
+            self.last_capture_times[name] = time.time() - start
+            return result
 
-    def tap(self, x, y):
-        adb_command = f"adb -s {self.device} shell input tap {x} {y}"
-        ret = execute_adb(adb_command)
-        return ret
+        def get_xml():
+            if xml_dir is None:
+                return timed("xml", self.get_xml_source)
+            return timed("xml", self.get_xml, xml_prefix or prefix, xml_dir)
+
+        start = time.time()
+        if unchanged is not None and unchanged(self.screen_fingerprint):
+            self.last_capture_times.pop("xml", None)
+            screenshot_path = timed("screenshot", self.get_screenshot, prefix, save_dir)
+            xml_path = None
+            if screenshot_path != "ERROR" and not unchanged(self.screen_fingerprint):
+                # The screen changed after all (e.g. a late animation); dump it after the screenshot
+                xml_path = get_xml()
+            self.last_capture_times["total"] = time.time() - start
+            return screenshot_path, xml_path
+        screenshot_future = self._capture_executor.submit(timed, "screenshot", self.get_screenshot, prefix, save_dir)
+        xml_future = self._capture_executor.submit(get_xml)
+        screenshot_path = screenshot_future.result()
+        xml_path = xml_future.result()
+        self.last_capture_times["total"] = time.time() - start
+        return screenshot_path, xml_path
+
+    def _screen_fingerprint(self):
+        data = execute_adb_exec_out(self.device, "screencap")
+        if data == "ERROR":
+            return None
+        self.screen_fingerprint = frame_fingerprint(decode_raw_screencap(data))
+        self.screen_hash = None
+        return self.screen_fingerprint
+
+    def wait_until_stable(self):
+        """
+        Wait for the screen to settle after an action by polling raw frame fingerprints.
+
+        Bounds come from SETTLE_MIN_WAIT / SETTLE_MAX_WAIT; with SETTLE_WAIT disabled this falls
+        back to the fixed REQUEST_INTERVAL sleep.
+
+        Returns:
+            Measured settle time in seconds
+        """
+        if not configs.get("SETTLE_WAIT", True):
+            time.sleep(configs["REQUEST_INTERVAL"])
+            return float(configs["REQUEST_INTERVAL"])
+        # The last captured screen is the one the action was taken on
+        settle_time, stable = wait_until_stable(self._screen_fingerprint,
+                                                min_wait=configs.get("SETTLE_MIN_WAIT", 0.3),
+                                                max_wait=configs.get("SETTLE_MAX_WAIT", 10),
+                                                interval=configs.get("SETTLE_INTERVAL", 0.25),
+                                                tolerance=configs.get("SETTLE_TOLERANCE", 8),
+                                                baseline=self.screen_fingerprint,
+                                                unchanged_wait=configs.get("SETTLE_UNCHANGED_WAIT", 2.0))
+        if not stable:
+            print_with_color(f"WARNING: Screen still changing after {settle_time:.2f}s, continuing", "yellow")
+        return settle_time
+
+    def run_batch(self, commands):
+        """
+        Run several device commands (e.g. the steps of a multi-step gesture) in one shell invocation.
+
+        Args:
+            commands: List of device-side commands, executed in order until one fails
+
+        Returns:
+            Combined output or "ERROR"
+        """
+        return execute_adb_shell(self.device, " && ".join(commands))
+
+    def act_and_observe(self, commands, prefix, save_dir, xml_prefix=None, xml_dir=None, unchanged_hash=None):
+        """
+        Run actions, wait for the screen to settle and capture screenshot + UI hierarchy in one adb call.
+
+        The whole round is a single device-side script streamed back over `adb exec-out`: the actions,
+        a settle loop that re-captures raw frames until two consecutive ones hash identically (bounded
+        by SETTLE_MIN_WAIT / SETTLE_MAX_WAIT; a frame identical to the pre-action one only counts after
+        SETTLE_UNCHANGED_WAIT), `screencap -p`, and the hierarchy dump. The PNG is split
+        from the XML at its IEND chunk. The screenshot is always PNG, whatever SCREENSHOT_CAPTURE says.
+
+        The md5 of the settled raw frame is kept in screen_hash. If it equals unchanged_hash (the
+        screen_hash of a screen the caller has already parsed), the device stops after the settle loop
+        and neither the screenshot nor the hierarchy is transferred.
+
+        Args:
+            commands: List of device-side action commands (see tap_command, swipe_command, ...)
+            prefix: Screenshot filename prefix
+            save_dir: Directory to save the screenshot
+            xml_prefix: Hierarchy filename prefix (defaults to prefix)
+            xml_dir: Directory to save the hierarchy; if None it is returned as an in-memory file object
+            unchanged_hash: Optional screen_hash of the caller's current screen (needs SETTLE_WAIT)
+
+        Returns:
+            (screenshot_path, xml_path_or_source, settle_time), (None, None, settle_time) if the screen
+            still matched unchanged_hash, or "ERROR"
+        """
+        script = f"if ! ( {' && '.join(commands)} ) > /dev/null 2>&1; then echo {_ACT_FAILED}; exit 1; fi; "
+        if configs.get("SETTLE_WAIT", True):
+            interval = configs.get("SETTLE_INTERVAL", 0.25)
+            min_wait = configs.get("SETTLE_MIN_WAIT", 0.3)
+            max_polls = max(1, int(configs.get("SETTLE_MAX_WAIT", 10) / interval))
+            # Polls during which a screen identical to the pre-action one does not count as settled
+            # (the action's effect may not have started yet)
+            unchanged_polls = max(0, int((configs.get("SETTLE_UNCHANGED_WAIT", 2.0) - min_wait) / interval))
+            if self.screen_hash:
+                script = f"b={self.screen_hash}; " + script
+            else:
+                script = "b=$(screencap | md5sum); b=${b%% *}; " + script
+            script += f"t0=$(date +%s%N); sleep {min_wait}; p=; i=0; " \
+                      f"while [ $i -lt {max_polls} ]; do c=$(screencap | md5sum); " \
+                      f"[ \"$c\" = \"$p\" ] && {{ [ \"${{c%% *}}\" != \"$b\" ] || [ $i -ge {unchanged_polls} ]; }} && break; " \
+                      f"p=$c; i=$((i+1)); sleep {interval}; done; echo {_SETTLE} $t0 $(date +%s%N) $i ${{p%% *}}; "
+            if unchanged_hash:
+                script += f"[ \"${{p%% *}}\" = \"{unchanged_hash}\" ] && exit 0; "
+        else:
+            script += f"sleep {configs['REQUEST_INTERVAL']}; "
+        device_path = os.path.join(self.xml_dir, "hierarchy.xml").replace(self.backslash, '/')
+        flags = "--compressed " if configs.get("XML_COMPRESSED", False) else ""
+        script += f"screencap -p; uiautomator dump {flags}{device_path} > /dev/null && cat {device_path}"
+
+        start = time.time()
+        data = execute_adb_exec_out(self.device, script)
+        if data == "ERROR":
+            return data
+        if data.startswith(_ACT_FAILED.encode()):
+            print_with_color(f"ERROR: Action failed: {' && '.join(commands)}", "red")
+            return "ERROR"
+        png_start = data.find(b"\x89PNG\r\n\x1a\n")
+        png_end = find_png_end(data, png_start) if png_start >= 0 else -1
+        xml_start = data.find(b"<?xml", png_end) if png_end >= 0 else -1
+        xml_end = data.rfind(b"</hierarchy>")
+        self.last_capture_times["total"] = time.time() - start
+
+        settle_time = float(configs["REQUEST_INTERVAL"])
+        screen_hash = None
+        header = data[:png_start if png_start >= 0 else len(data)].decode("utf-8", errors="replace").split()
+        if _SETTLE in header:
+            t0, t1, polls, screen_hash = header[header.index(_SETTLE) + 1:header.index(_SETTLE) + 5]
+            if t0.isdigit() and t1.isdigit():
+                settle_time = (int(t1) - int(t0)) / 1e9
+            else:
+                # date +%N is not supported everywhere; estimate from the number of polls
+                settle_time = configs.get("SETTLE_MIN_WAIT", 0.3) + int(polls) * configs.get("SETTLE_INTERVAL", 0.25)
+        if unchanged_hash and png_start < 0 and screen_hash == unchanged_hash:
+            self.screen_hash = screen_hash
+            return None, None, settle_time
+        if png_start < 0 or png_end < 0 or xml_start < 0 or xml_end < 0:
+            print_with_color("ERROR: Incomplete output from the batched action", "red")
+            return "ERROR"
 
-    def text(self, input_str):
+        png = data[png_start:png_end]
+        frame = cv2.imdecode(np.frombuffer(png, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            print_with_color("ERROR: Could not decode the screenshot of the batched action", "red")
+            return "ERROR"
+        self.screen_hash = screen_hash
+        self._last_png = png
+        self.last_frame = frame
+        self.screen_fingerprint = frame_fingerprint(self.last_frame)
+        screenshot_path = self.save_frame(prefix, save_dir)
+        xml = data[xml_start:xml_end + len(b"</hierarchy>")]
+        if xml_dir is None:
+            return screenshot_path, io.BytesIO(xml), settle_time
+        xml_path = os.path.join(xml_dir, (xml_prefix or prefix) + ".xml")
+        with open(xml_path, "wb") as f:
+            f.write(xml)
+        return screenshot_path, xml_path, settle_time
+
+    def back_command(self):
+        return "input keyevent KEYCODE_BACK"
+
+    def tap_command(self, x, y):
+        return f"input tap {x} {y}"
+
+    def text_command(self, input_str):
         input_str = input_str.replace(" ", "%s")
         input_str = input_str.replace("'", "")
-        adb_command = f"adb -s {self.device} shell input text {input_str}"
-        ret = execute_adb(adb_command)
-        return ret
+        return f"input text {input_str}"
 
-    def long_press(self, x, y, duration=1000):
-        adb_command = f"adb -s {self.device} shell input swipe {x} {y} {x} {y} {duration}"
-        ret = execute_adb(adb_command)
-        return ret
+    def long_press_command(self, x, y, duration=1000):
+        return f"input swipe {x} {y} {x} {y} {duration}"
 
-    def swipe(self, x, y, direction, dist="medium", quick=False):
+    def swipe_command(self, x, y, direction, dist="medium", quick=False):
         unit_dist = int(self.width / 10)
         if dist == "long":
             unit_dist *= 3
@@ -467,18 +1150,47 @@ class AndroidController:
         else:
             return "ERROR"
         duration = 100 if quick else 400
-        adb_command = f"adb -s {self.device} shell input swipe {x} {y} {x+offset[0]} {y+offset[1]} {duration}"
-        ret = execute_adb(adb_command)
-        return ret
+        return f"input swipe {x} {y} {x+offset[0]} {y+offset[1]} {duration}"
 
-    def swipe_precise(self, start, end, duration=400):
+    def swipe_precise_command(self, start, end, duration=400):
         start_x, start_y = start
         end_x, end_y = end
-        adb_command = f"adb -s {self.device} shell input swipe {start_x} {start_x} {end_x} {end_y} {duration}"
-        ret = execute_adb(adb_command)
+        return f"input swipe {start_x} {start_y} {end_x} {end_y} {duration}"
+
+    def back(self):
+        ret = execute_adb_shell(self.device, self.back_command())
+        return ret
+
+    def tap(self, x, y):
+        ret = execute_adb_shell(self.device, self.tap_command(x, y))
+        return ret
+
+    def text(self, input_str):
+        ret = execute_adb_shell(self.device, self.text_command(input_str))
+        return ret
+
+    def long_press(self, x, y, duration=1000):
+        ret = execute_adb_shell(self.device, self.long_press_command(x, y, duration))
+        return ret
+
+    def swipe(self, x, y, direction, dist="medium", quick=False):
+        command = self.swipe_command(x, y, direction, dist, quick)
+        if command == "ERROR":
+            return command
+        ret = execute_adb_shell(self.device, command)
+        return ret
+
+    def swipe_precise(self, start, end, duration=400):
+        ret = execute_adb_shell(self.device, self.swipe_precise_command(start, end, duration))
         return ret
 
     def get_screenshot_with_bbox(self, screenshot_before, save_dir, tl, br):
+        if not isinstance(screenshot_before, str):
+            # In-memory image (ndarray / Frame): draw on a copy and return it
+            img = getattr(screenshot_before, "image", screenshot_before).copy()
+            cv2.rectangle(img, (int(tl[0]), int(tl[1])), (int(br[0]), int(br[1])), (0, 255, 0), 2)
+            return img
+
         # Copy the screenshot_before image
         img_path = save_dir
         shutil.copy(screenshot_before, img_path)
@@ -495,12 +1207,15 @@ class AndroidController:
         return img_path
 
     def draw_circle(self, x, y, img_path, r=10, thickness=2):
-        img = cv2.imread(img_path)
+        # An ndarray is drawn on in place instead of being read from and written back to disk
+        img = cv2.imread(img_path) if isinstance(img_path, str) else img_path
         cv2.circle(img, (int(x), int(y)), r, (0, 0, 255), thickness)
-        cv2.imwrite(img_path, img)
+        if isinstance(img_path, str):
+            cv2.imwrite(img_path, img)
+        return img
 
     def draw_arrow(self, x, y, direction, dist, image_path, arrow_color=(0, 255, 0), thickness=2):
-        img = cv2.imread(image_path)
+        img = cv2.imread(image_path) if isinstance(image_path, str) else image_path
 
         # Calculate the arrow length based on the screen width and dist
         screen_width = img.shape[1]
@@ -528,4 +1243,6 @@ class AndroidController:
         cv2.arrowedLine(img, (x, y), end_point, arrow_color, thickness)
 
         # Save the modified image
-        cv2.imwrite(image_path, img)
+        if isinstance(image_path, str):
+            cv2.imwrite(image_path, img)
+        return img
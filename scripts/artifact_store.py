@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+
+import cv2
+
+from artifacts import Frame
+
+MANIFEST_NAME = "manifest.jsonl"
+
+_ENCODINGS = {
+    "png": (".png", []),
+    # Quality above 100 selects lossless WebP
+    "webp": (".webp", [cv2.IMWRITE_WEBP_QUALITY, 101]),
+}
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for the screenshots of task and demo directories.
+
+    Every image is stored once under <root>/<2 hex>/<pixel digest>.<format>, however many rounds,
+    tasks or demos produce it, and the directory the artifact was meant for gets a line in its
+    manifest.jsonl mapping the artifact's file name to the blob (as a path relative to that
+    directory, so a tree can be moved as a whole). resolve_artifact() turns the old paths used in
+    reports and logs back into files.
+
+    Blobs are written to a temporary file and renamed into place, so several processes (e.g. a
+    fleet of executors) can share one store.
+    """
+    def __init__(self, root, fmt="webp"):
+        if fmt not in _ENCODINGS:
+            raise ValueError(f"Unsupported artifact format {fmt}, use one of {sorted(_ENCODINGS)}")
+        self.root = root
+        self.fmt = fmt
+        self.blobs_written = 0
+        self.bytes_written = 0
+        self.dedup_hits = 0
+        self.lock = threading.Lock()
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], f"{digest}{_ENCODINGS[self.fmt][0]}")
+
+    def put(self, frame, artifact_path):
+        """
+        Store a frame as the artifact at artifact_path.
+
+        Args:
+            frame: Frame (or ndarray) to store
+            artifact_path: Path the artifact would have had as a plain file; its directory gets the manifest entry
+
+        Returns:
+            Number of bytes written for the blob (0 if the image was already stored)
+        """
+        if not isinstance(frame, Frame):
+            frame = Frame(frame, os.path.splitext(os.path.basename(artifact_path))[0])
+        blob = self.blob_path(frame.digest())
+        written = 0
+        if os.path.exists(blob):
+            with self.lock:
+                self.dedup_hits += 1
+        else:
+            ext, params = _ENCODINGS[self.fmt]
+            ok, buf = cv2.imencode(ext, frame.image, params)
+            data = buf.tobytes()
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp_path = f"{blob}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, blob)
+            written = len(data)
+            with self.lock:
+                self.blobs_written += 1
+                self.bytes_written += written
+        artifact_dir, name = os.path.split(artifact_path)
+        entry = {"name": name, "blob": os.path.relpath(blob, artifact_dir or "."), "digest": frame.digest()}
+        with open(os.path.join(artifact_dir, MANIFEST_NAME), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        return written
+
+    def adopt(self, path, frame=None):
+        """Move an image file that was written as a plain file into the store"""
+        if frame is None:
+            frame = Frame.from_path(path)
+            if frame is None:
+                return 0
+        written = self.put(frame, path)
+        os.remove(path)
+        return written
+
+    def stats(self):
+        return {"blobs_written": self.blobs_written, "bytes_written": self.bytes_written,
+                "dedup_hits": self.dedup_hits}
+
+
+_stores = {}
+
+
+def get_artifact_store(root_dir, configs):
+    """
+    Shared store under <root_dir>/artifacts if ARTIFACT_STORE is enabled.
+
+    Returns:
+        ArtifactStore, or None when artifacts are written as plain files
+    """
+    if not configs.get("ARTIFACT_STORE", False):
+        return None
+    root = os.path.abspath(os.path.join(root_dir, "artifacts"))
+    store = _stores.get(root)
+    if store is None:
+        store = ArtifactStore(root, configs.get("ARTIFACT_FORMAT", "webp"))
+        _stores[root] = store
+    return store
+
+
+_manifests = {}
+
+
+def load_manifest(artifact_dir):
+    """
+    Artifact name -> blob path (relative to artifact_dir) of a directory; later entries win.
+
+    Cached until the manifest file changes.
+    """
+    manifest_path = os.path.join(artifact_dir, MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(manifest_path)
+    except OSError:
+        return {}
+    cached = _manifests.get(manifest_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    entries = {}
+    with open(manifest_path, "r") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entries[entry["name"]] = entry["blob"]
+    _manifests[manifest_path] = (mtime, entries)
+    return entries
+
+
+def resolve_artifact(path):
+    """
+    File that holds an artifact: the path itself if it exists, else the blob its directory's
+    manifest points at.
+
+    Returns:
+        Path, or None if the artifact is in neither place
+    """
+    if os.path.exists(path):
+        return path
+    artifact_dir, name = os.path.split(path)
+    blob = load_manifest(artifact_dir or ".").get(name)
+    if blob is None:
+        return None
+    return os.path.normpath(os.path.join(artifact_dir, blob))
+
+
+def load_artifact(path):
+    """
+    Frame of an artifact wherever it is stored, named after the original path.
+
+    Returns:
+        Frame, or None if the artifact cannot be found or decoded
+    """
+    resolved = resolve_artifact(path)
+    if resolved is None:
+        return None
+    return Frame.from_path(resolved, os.path.splitext(os.path.basename(path))[0])
+
+
+def rewrite_report(report_path, output_path=None):
+    """
+    Copy of a markdown report whose image links point at the stored blobs.
+
+    Args:
+        report_path: Report written with plain artifact paths (e.g. ![Before](./3_before.png))
+        output_path: Where to write the copy (default: <report>_resolved.md next to it)
+
+    Returns:
+        Path of the rewritten report
+    """
+    report_dir = os.path.dirname(report_path)
+    if output_path is None:
+        output_path = os.path.splitext(report_path)[0] + "_resolved.md"
+
+    def replace(match):
+        link = match.group(2)
+        resolved = resolve_artifact(os.path.join(report_dir, link))
+        if resolved is None:
+            return match.group(0)
+        return f"{match.group(1)}({os.path.relpath(resolved, os.path.dirname(output_path) or '.')})"
+
+    with open(report_path, "r") as f:
+        text = f.read()
+    with open(output_path, "w") as f:
+        f.write(re.sub(r"(!\[[^\]]*\])\(([^)\s]+)\)", replace, text))
+    return output_path
+
+
+if __name__ == "__main__":
+    from config import get_settings
+    from utils import print_with_color
+
+    arg_desc = "AppAgent - Artifact Store"
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=arg_desc)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Move the PNGs of task / demo directories into the store")
+    import_parser.add_argument("dirs", nargs="+")
+    import_parser.add_argument("--root_dir", default="./")
+    import_parser.add_argument("--format", choices=sorted(_ENCODINGS), default=None)
+    resolve_parser = subparsers.add_parser("resolve", help="Print the file holding an artifact")
+    resolve_parser.add_argument("path")
+    report_parser = subparsers.add_parser("report", help="Write a copy of a report with links to the stored blobs")
+    report_parser.add_argument("report")
+    report_parser.add_argument("--output", default=None)
+    args = vars(parser.parse_args())
+
+    if args["command"] == "import":
+        configs = get_settings()
+        store = ArtifactStore(os.path.abspath(os.path.join(args["root_dir"], "artifacts")),
+                              args["format"] or configs.get("ARTIFACT_FORMAT", "webp"))
+        before = 0
+        for top in args["dirs"]:
+            for dirpath, _, filenames in os.walk(top):
+                if os.path.abspath(dirpath).startswith(store.root):
+                    continue
+                for filename in sorted(filenames):
+                    if filename.endswith(".png"):
+                        path = os.path.join(dirpath, filename)
+                        before += os.path.getsize(path)
+                        store.adopt(path)
+        stats = store.stats()
+        print_with_color(f"Imported {stats['blobs_written'] + stats['dedup_hits']} images: {before / 1024 ** 2:.1f} MB "
+                         f"-> {stats['bytes_written'] / 1024 ** 2:.1f} MB in {stats['blobs_written']} blobs "
+                         f"({stats['dedup_hits']} duplicates)", "green")
+    elif args["command"] == "resolve":
+        resolved = resolve_artifact(args["path"])
+        if resolved is None:
+            print_with_color(f"ERROR: {args['path']} is neither a file nor in its directory's manifest", "red")
+            sys.exit(1)
+        print(resolved)
+    elif args["command"] == "report":
+        print(rewrite_report(args["report"], args["output"]))
@@ -0,0 +1,304 @@
+import atexit
+import base64
+import hashlib
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def content_digest(data):
+    """SHA-256 hex digest of bytes or of an ndarray's pixels and shape"""
+    digest = hashlib.sha256()
+    if isinstance(data, np.ndarray):
+        digest.update(repr(data.shape).encode())
+        data = np.ascontiguousarray(data)
+    digest.update(memoryview(data).cast("B"))
+    return digest.hexdigest()
+
+
+class Frame:
+    """
+    A decoded screenshot carried through labeling, resizing and encoding without going through disk.
+
+    Attributes:
+        image: BGR ndarray
+        name: Artifact name without extension (e.g. "3_before_labeled"), used when the frame is saved
+        png: PNG bytes of image if they are already known (e.g. as encoded by screencap), else None
+        max_size: Longest side when sent to a model, overriding IMAGE_MAX_WIDTH / IMAGE_MAX_HEIGHT (e.g. for
+                  full-resolution crops); None uses the configured size
+    """
+    def __init__(self, image, name, png=None, max_size=None):
+        self.image = image
+        self.name = name
+        self.png = png
+        self.max_size = max_size
+        self._digest = None
+
+    @classmethod
+    def from_path(cls, path, name=None):
+        """Load a frame from an image file; returns None if it cannot be decoded"""
+        with open(path, "rb") as f:
+            data = f.read()
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        if name is None:
+            name = os.path.splitext(os.path.basename(path))[0]
+        return cls(image, name, png=data if data.startswith(b"\x89PNG") else None)
+
+    def digest(self):
+        """Content hash of the image, computed once (frames are not modified after creation)"""
+        if self._digest is None:
+            self._digest = content_digest(self.image)
+        return self._digest
+
+    def derive(self, image, suffix):
+        """New frame for an edited copy of this one, named <name>_<suffix>"""
+        return Frame(image, f"{self.name}_{suffix}")
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    def resized(self, max_size):
+        """Image scaled down (aspect ratio kept) so that its longest side is at most max_size"""
+        height, width = self.image.shape[:2]
+        if width <= max_size and height <= max_size:
+            return self.image
+        scale = max_size / max(width, height)
+        return cv2.resize(self.image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+    def encode_png(self):
+        if self.png is None:
+            ok, buf = cv2.imencode(".png", self.image)
+            self.png = buf.tobytes()
+        return self.png
+
+    def encode_jpeg(self, max_size=None, quality=85):
+        image = self.image if max_size is None else self.resized(max_size)
+        ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return buf.tobytes()
+
+    def to_base64(self, max_size=None, quality=85, optimize=True):
+        """
+        Base64 payload for a model request.
+
+        Args:
+            max_size: Longest side after resizing (None keeps the size)
+            quality: JPEG quality
+            optimize: If False, send the full-size PNG instead of a resized JPEG
+
+        Returns:
+            Base64 string
+        """
+        data = self.encode_jpeg(max_size, quality) if optimize else self.encode_png()
+        return base64.b64encode(data).decode("utf-8")
+
+
+class ArtifactSink:
+    """
+    Optional destination for the images a round produces (labeled screenshots, action overlays, ...).
+
+    The model pipeline works on Frames in memory; the sink only decides whether copies end up in the
+    task directory for reports and logs. A disabled sink still returns the would-be path so log entries
+    keep their shape. bytes_written counts what actually hit the disk.
+
+    With an ArtifactWriter the encoding and the write happen on the writer thread; save() only
+    queues the frame, which must not be modified afterwards. With an ArtifactStore (see
+    artifact_store.py) images go to the content-addressed store instead of plain PNG files.
+    """
+    def __init__(self, save_dir, enabled=True, writer=None, store=None):
+        self.save_dir = save_dir
+        self.enabled = enabled
+        self.writer = writer
+        self.store = store
+        self.bytes_written = 0
+        self.files_written = 0
+
+    def path(self, filename):
+        return os.path.join(self.save_dir, filename)
+
+    def save(self, frame, filename=None):
+        """
+        Write a frame (or bare ndarray, which then needs filename) as PNG.
+
+        Returns:
+            Path of the artifact
+        """
+        if not isinstance(frame, Frame):
+            frame = Frame(frame, os.path.splitext(filename)[0])
+        path = self.path(filename or frame.name + ".png")
+        if self.enabled:
+            self._submit(path, lambda: self._write(path, frame))
+        return path
+
+    def adopt(self, path, frame=None):
+        """
+        Move an image that was already written as a plain file (e.g. a raw screenshot) into the
+        store; without a store the file stays where it is. The file must not be read afterwards.
+        """
+        if self.store is not None:
+            self._submit(path, lambda: self._count(self.store.adopt(path, frame)))
+
+    def _submit(self, path, write):
+        if self.writer is not None:
+            self.writer.run(path, write)
+        else:
+            write()
+
+    def _write(self, path, frame):
+        if self.store is not None:
+            self._count(self.store.put(frame, path))
+            return
+        data = frame.encode_png()
+        with open(path, "wb") as f:
+            f.write(data)
+        self._count(len(data))
+
+    def _count(self, size):
+        self.bytes_written += size
+        self.files_written += 1
+
+
+class ArtifactWriter:
+    """
+    Writer thread that takes artifact files and log appends out of the round loop.
+
+    Jobs go through a bounded queue, so a disk that cannot keep up eventually blocks the caller
+    instead of buffering screenshots without limit. Each pass drains everything queued: file writes
+    (image encoding included) run in order, and text appends are grouped by file, so the report lines of a round
+    cost one open / write per file. flush() blocks until everything submitted so far is on disk;
+    close() flushes and stops the thread and runs at interpreter exit (including sys.exit from a
+    signal handler).
+    """
+    def __init__(self, max_pending=64):
+        self.jobs = queue.Queue(max_pending)
+        self.errors = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def run(self, path, write):
+        """Queue write(), which creates the file at path, to run on the writer thread"""
+        self._submit(("file", path, write))
+
+    def append(self, path, text):
+        """Queue text to be appended to a log file; appends to one file keep their order"""
+        self._submit(("append", path, text))
+
+    def _submit(self, job):
+        if self.closed:
+            self._write_batch([job])
+        else:
+            self.jobs.put(job)
+
+    def _run(self):
+        while True:
+            batch = [self.jobs.get()]
+            while True:
+                try:
+                    batch.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            self._write_batch([job for job in batch if job is not None])
+            for _ in batch:
+                self.jobs.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        appends = OrderedDict()
+        for kind, path, payload in batch:
+            if kind == "append":
+                appends.setdefault(path, []).append(payload)
+                continue
+            try:
+                payload()
+            except Exception as e:
+                self._report(path, e)
+        for path, texts in appends.items():
+            try:
+                with open(path, "a") as f:
+                    f.write("".join(texts))
+            except Exception as e:
+                self._report(path, e)
+
+    def _report(self, path, error):
+        from utils import print_with_color
+
+        self.errors += 1
+        print_with_color(f"ERROR: Failed to write {path}: {error}", "red")
+
+    def flush(self):
+        """Block until every queued write is done"""
+        if not self.closed:
+            self.jobs.join()
+
+    def close(self):
+        if self.closed:
+            return
+        self.jobs.put(None)
+        self.thread.join()
+        self.closed = True
+
+
+class PayloadCache:
+    """
+    LRU cache of ready-to-send base64 image payloads, keyed by image content plus encoding parameters.
+
+    The same labeled screenshot is typically sent twice (action call, then reflection call); with the
+    cache the second request reuses the payload instead of resizing and re-encoding it. Entries are
+    evicted least-recently-used once their total size exceeds max_bytes.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(data, *params):
+        """Content hash of data (bytes, ndarray or Frame) combined with the encoding parameters"""
+        if isinstance(data, Frame):
+            content = data.digest()
+        else:
+            content = content_digest(data)
+        return content + repr(params)
+
+    def get_or_create(self, key, build):
+        """Return the cached payload for key, calling build() to create it on a miss"""
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return payload
+            self.misses += 1
+        payload = build()
+        with self.lock:
+            if key not in self.entries and len(payload) <= self.max_bytes:
+                self.entries[key] = payload
+                self.size += len(payload)
+                while self.size > self.max_bytes:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.size -= len(evicted)
+                    self.evictions += 1
+        return payload
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self.entries),
+                "bytes": self.size}
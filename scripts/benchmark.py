@@ -0,0 +1,370 @@
+import argparse
+import io
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from utils import print_with_color
+
+arg_desc = "AppAgent - Performance Benchmarks"
+parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=arg_desc)
+subparsers = parser.add_subparsers(dest="bench", required=True)
+
+capture_parser = subparsers.add_parser("capture", help="Compare screenshot / UI hierarchy capture paths on a device")
+capture_parser.add_argument("--device", default=None, help="Device serial (defaults to the only attached device)")
+capture_parser.add_argument("--rounds", type=int, default=10, help="Number of captures per path")
+
+parse_parser = subparsers.add_parser("parse", help="Compare element extraction on synthetic feed hierarchies")
+parse_parser.add_argument("--nodes", type=int, nargs="+", default=[5000, 10000, 20000],
+                          help="Hierarchy sizes (number of nodes) to generate")
+parse_parser.add_argument("--rounds", type=int, default=1, help="Number of runs per size (the legacy path is slow)")
+parse_parser.add_argument("--min_dist", type=int, default=30, help="MIN_DIST used for de-duplication")
+
+pipeline_parser = subparsers.add_parser("pipeline", help="Compare disk I/O of the file-based and in-memory image paths")
+pipeline_parser.add_argument("--rounds", type=int, default=5, help="Number of simulated rounds")
+pipeline_parser.add_argument("--nodes", type=int, default=300, help="Size of the synthetic hierarchy to label")
+
+label_parser = subparsers.add_parser("label", help="Compare per-element putBText labeling with the label atlas")
+label_parser.add_argument("--elements", type=int, nargs="+", default=[20, 80, 200],
+                          help="Numbers of labeled elements per screenshot")
+label_parser.add_argument("--rounds", type=int, default=20, help="Number of labeling runs per size")
+
+pack_parser = subparsers.add_parser("pack", help="Compare ways of sending a before / after pair (two images, packed, "
+                                                 "change crops)")
+pack_parser.add_argument("--size", type=int, nargs=2, default=[1080, 2400], metavar=("WIDTH", "HEIGHT"),
+                         help="Screenshot size (e.g. 1280 720 for a web page)")
+pack_parser.add_argument("--rounds", type=int, default=20, help="Number of payload preparations per variant")
+
+
+def report(name, timings):
+    """Print mean / median / p95 of a list of timings (seconds)"""
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print_with_color(f"{name:<32} mean {statistics.mean(timings) * 1000:8.1f} ms | "
+                     f"median {statistics.median(timings) * 1000:8.1f} ms | p95 {p95 * 1000:8.1f} ms", "cyan")
+
+
+def time_calls(func, rounds, results=None):
+    """Time rounds calls of func; the return values are collected into results if given"""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+        if isinstance(result, str) and result == "ERROR":
+            print_with_color("ERROR: capture failed during benchmark", "red")
+            sys.exit(1)
+        if results is not None:
+            results.append(result)
+    return timings
+
+
+def make_feed_xml(num_nodes, width=1080, seed=0):
+    """
+    Build a uiautomator-style hierarchy for a long scrolling feed with about num_nodes nodes.
+
+    Every feed item is a clickable card with an avatar, a few text views and a row of action
+    buttons; some items carry a focusable input, mirroring comment boxes in social feeds.
+    """
+    rng = random.Random(seed)
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<hierarchy rotation="0">',
+             f'<node index="0" class="android.widget.FrameLayout" resource-id="" content-desc="" clickable="false" '
+             f'focusable="false" bounds="[0,0][{width},2400]">',
+             f'<node index="0" class="androidx.recyclerview.widget.RecyclerView" resource-id="com.app:id/feed" '
+             f'content-desc="" clickable="false" focusable="true" bounds="[0,0][{width},2400]">']
+    count, item, top = 2, 0, 0
+    while count < num_nodes:
+        height = rng.randint(300, 700)
+        bottom = top + height
+        lines.append(f'<node index="{item}" class="android.widget.LinearLayout" resource-id="com.app:id/card" '
+                     f'content-desc="" clickable="true" focusable="true" bounds="[0,{top}][{width},{bottom}]">')
+        children = [("android.widget.ImageView", "com.app:id/avatar", 20, top + 20, 140, top + 140, "false", "false"),
+                    ("android.widget.TextView", "com.app:id/author", 160, top + 20, 700, top + 70, "false", "false"),
+                    ("android.widget.TextView", "com.app:id/body", 20, top + 150, width - 20, bottom - 110,
+                     "false", "false")]
+        for j in range(4):
+            left = 20 + j * 260
+            children.append(("android.widget.ImageButton", f"com.app:id/action_{j}", left, bottom - 100,
+                             left + 200, bottom - 20, "true", "true"))
+        if rng.random() < 0.3:
+            children.append(("android.widget.EditText", "com.app:id/comment", 20, bottom - 200, width - 20,
+                             bottom - 120, "false", "true"))
+        for index, (cls, rid, x1, y1, x2, y2, clickable, focusable) in enumerate(children):
+            lines.append(f'<node index="{index}" class="{cls}" resource-id="{rid}" content-desc="" '
+                         f'clickable="{clickable}" focusable="{focusable}" bounds="[{x1},{y1}][{x2},{y2}]" />')
+        lines.append('</node>')
+        count += 1 + len(children)
+        item += 1
+        top = bottom
+    lines += ['</node>', '</node>', '</hierarchy>']
+    return "\n".join(lines).encode("utf-8"), count
+
+
+def legacy_extract(xml_source, min_dist):
+    """Element extraction as the scripts did it before extract_elements: two traversals plus a merge scan"""
+    from and_controller import traverse_tree
+
+    clickable_list = []
+    focusable_list = []
+    traverse_tree(xml_source, clickable_list, "clickable", True)
+    traverse_tree(xml_source, focusable_list, "focusable", True)
+    elem_list = clickable_list.copy()
+    for elem in focusable_list:
+        bbox = elem.bbox
+        center = (bbox[0][0] + bbox[1][0]) // 2, (bbox[0][1] + bbox[1][1]) // 2
+        close = False
+        for e in clickable_list:
+            bbox = e.bbox
+            center_ = (bbox[0][0] + bbox[1][0]) // 2, (bbox[0][1] + bbox[1][1]) // 2
+            dist = (abs(center[0] - center_[0]) ** 2 + abs(center[1] - center_[1]) ** 2) ** 0.5
+            if dist <= min_dist:
+                close = True
+                break
+        if not close:
+            elem_list.append(elem)
+    return elem_list
+
+
+def bench_parse(args):
+    from and_controller import extract_elements
+    from config import override_settings
+
+    # traverse_tree reads MIN_DIST from the config; align it with the benchmark setting
+    override_settings(MIN_DIST=args["min_dist"])
+    for num_nodes in args["nodes"]:
+        data, count = make_feed_xml(num_nodes)
+        legacy, single = [], []
+        legacy_timings = time_calls(lambda: legacy_extract(io.BytesIO(data), args["min_dist"]), args["rounds"], legacy)
+        single_timings = time_calls(lambda: extract_elements(io.BytesIO(data), args["min_dist"]), args["rounds"], single)
+        if [(e.uid, e.bbox) for e in legacy[-1]] != [(e.uid, e.bbox) for e in single[-1]]:
+            print_with_color(f"ERROR: extract_elements differs from the legacy path at {count} nodes", "red")
+            sys.exit(1)
+        print_with_color(f"{count} nodes, {len(single[-1])} labeled elements", "yellow")
+        report("legacy: 2x traverse_tree + merge", legacy_timings)
+        report("extract_elements", single_timings)
+
+
+def make_screenshot(width=1080, height=2400, seed=0):
+    """Synthetic app screenshot: flat cards with text-like stripes, so PNG/JPEG sizes are realistic"""
+    import cv2
+    import numpy as np
+
+    rng = random.Random(seed)
+    img = np.full((height, width, 3), 245, dtype=np.uint8)
+    top = 0
+    while top < height:
+        bottom = min(height, top + rng.randint(300, 700))
+        cv2.rectangle(img, (20, top + 10), (width - 20, bottom - 10), (255, 255, 255), -1)
+        cv2.circle(img, (80, top + 80), 50, tuple(rng.randint(0, 255) for _ in range(3)), -1)
+        for line in range(top + 150, bottom - 120, 40):
+            cv2.putText(img, "lorem ipsum dolor sit amet " * 2, (40, line), cv2.FONT_HERSHEY_SIMPLEX, 0.8,
+                        (40, 40, 40), 2)
+        top = bottom
+    return img
+
+
+def bench_pipeline(args):
+    import os
+    import cv2
+    from artifacts import ArtifactSink, Frame
+    from and_controller import extract_elements
+    from utils import draw_bbox_multi, encode_image, get_payload_cache, optimize_image, prepare_model_image
+
+    img = make_screenshot()
+    ok, png = cv2.imencode(".png", img)
+    png = png.tobytes()
+    elem_list = extract_elements(io.BytesIO(make_feed_xml(args["nodes"])[0]), 30)
+    # Only the part of the feed that is on screen gets labeled
+    elem_list = elem_list.take(elem_list.label_positions(10)[:, 1] < img.shape[0] - 60)
+    with tempfile.TemporaryDirectory() as save_dir:
+        def file_round(i):
+            """capture -> draw_bbox_multi(path, path) -> optimize_image -> encode_image"""
+            io_bytes = 0
+            raw_path = os.path.join(save_dir, f"{i}.png")
+            labeled_path = os.path.join(save_dir, f"{i}_labeled.png")
+            with open(raw_path, "wb") as f:
+                f.write(png)
+            io_bytes += len(png)
+            draw_bbox_multi(raw_path, labeled_path, elem_list)
+            io_bytes += os.path.getsize(raw_path) + os.path.getsize(labeled_path)
+            io_bytes += os.path.getsize(labeled_path)  # optimize_image reads it back...
+            optimized_path = optimize_image(labeled_path)
+            io_bytes += 2 * os.path.getsize(optimized_path)  # ...writes the JPEG, and encode_image reads it again
+            encode_image(optimized_path)
+            return io_bytes
+
+        sink = ArtifactSink(save_dir)
+
+        def frame_round(i):
+            """capture -> Frame -> draw_bbox_multi in memory -> sink.save -> prepare_model_image"""
+            written = sink.bytes_written
+            with open(os.path.join(save_dir, f"{i}.png"), "wb") as f:
+                f.write(png)
+            labeled = Frame(draw_bbox_multi(Frame(img, str(i), png=png), None, elem_list), f"{i}_labeled")
+            sink.save(labeled)
+            get_payload_cache().clear()  # every simulated round is a new screen
+            prepare_model_image(labeled)
+            return len(png) + sink.bytes_written - written
+
+        file_io, frame_io = [], []
+        file_timings = time_calls(lambda: file_round(len(file_io)), args["rounds"], file_io)
+        frame_timings = time_calls(lambda: frame_round(len(frame_io)), args["rounds"], frame_io)
+    print_with_color(f"{len(elem_list)} labeled elements on a {img.shape[1]}x{img.shape[0]} screenshot", "yellow")
+    report("file-based round", file_timings)
+    report("in-memory Frame round", frame_timings)
+    print_with_color(f"disk I/O per round: file-based {statistics.mean(file_io) / 1024:.0f} KB | "
+                     f"in-memory {statistics.mean(frame_io) / 1024:.0f} KB", "cyan")
+
+
+def make_elements(count, width=1080, height=2400, seed=0):
+    """count elements with random attributes spread over the screen, tags kept inside the frame"""
+    from and_controller import AndroidElement
+
+    rng = random.Random(seed)
+    elem_list = []
+    for i in range(count):
+        x, y = rng.randint(40, width - 160), rng.randint(40, height - 100)
+        elem_list.append(AndroidElement(f"elem_{i}", ((x - 30, y - 30), (x + 30, y + 30)),
+                                        rng.choice(["clickable", "focusable"])))
+    return elem_list
+
+
+def legacy_draw_labels(img, elem_list, record_mode=False, dark_mode=False):
+    """Labeling as draw_bbox_multi did it before the label atlas: one pyshine.putBText call per element"""
+    import pyshine as ps
+
+    imgcv = img.copy()
+    for count, elem in enumerate(elem_list, 1):
+        label_x = (elem.bbox[0][0] + elem.bbox[1][0]) // 2 + 10
+        label_y = (elem.bbox[0][1] + elem.bbox[1][1]) // 2 + 10
+        if record_mode:
+            color = (250, 0, 0) if elem.attrib == "clickable" else (0, 0, 250)
+            text_color = (255, 250, 250)
+        else:
+            text_color = (10, 10, 10) if dark_mode else (255, 250, 250)
+            color = (255, 250, 250) if dark_mode else (10, 10, 10)
+        imgcv = ps.putBText(imgcv, str(count), text_offset_x=label_x, text_offset_y=label_y, vspace=10, hspace=10,
+                            font_scale=1, thickness=2, background_RGB=color, text_RGB=text_color, alpha=0.5)
+    return imgcv
+
+
+def bench_label(args):
+    import numpy as np
+    from utils import draw_bbox_multi
+
+    img = make_screenshot()
+    for count in args["elements"]:
+        elem_list = make_elements(count)
+        print_with_color(f"{count} labeled elements on a {img.shape[1]}x{img.shape[0]} screenshot", "yellow")
+        for scheme, options in [("light", {}), ("dark", {"dark_mode": True}), ("record", {"record_mode": True})]:
+            legacy, atlas = [], []
+            draw_bbox_multi(img, None, elem_list, **options)  # rasterize the sprites once, as a long run would
+            report(f"{scheme}: putBText per element",
+                   time_calls(lambda: legacy_draw_labels(img, elem_list, **options), args["rounds"], legacy))
+            report(f"{scheme}: label atlas",
+                   time_calls(lambda: draw_bbox_multi(img, None, elem_list, **options), args["rounds"], atlas))
+            diff = np.abs(legacy[-1].astype(np.int16) - atlas[-1].astype(np.int16)).max(axis=2)
+            print_with_color(f"{scheme}: {np.count_nonzero(diff > 2) / diff.size * 100:.3f}% of pixels differ "
+                             f"by more than 2 levels (all of them where tags overlap)", "cyan")
+
+
+def bench_pack(args):
+    import base64
+    import cv2
+    import numpy as np
+    from artifacts import Frame
+    from config import override_settings
+    from image_pairs import estimate_image_tokens, prepare_image_pair
+    from utils import get_payload_cache, prepare_model_image
+
+    width, height = args["size"]
+    before = make_screenshot(width, height)
+    # The action opened a dialog over the lower part of the screen
+    after = before.copy()
+    cv2.rectangle(after, (width // 8, height // 2), (width * 7 // 8, height * 3 // 4), (255, 255, 255), -1)
+    cv2.putText(after, "Delete this item?", (width // 8 + 40, height // 2 + 80), cv2.FONT_HERSHEY_SIMPLEX, 1.2,
+                (20, 20, 20), 2)
+    before, after = Frame(before, "before"), Frame(after, "after")
+
+    def payload_tokens(payload):
+        image = cv2.imdecode(np.frombuffer(base64.b64decode(payload), dtype=np.uint8), cv2.IMREAD_COLOR)
+        return estimate_image_tokens(image.shape[1], image.shape[0])
+
+    def separate():
+        get_payload_cache().clear()
+        return [prepare_model_image(before), prepare_model_image(after)]
+
+    def prepared():
+        get_payload_cache().clear()
+        _, images, _ = prepare_image_pair("", before, after, "pair")
+        return [prepare_model_image(image) for image in images]
+
+    print_with_color(f"before / after pair of {width}x{height} screenshots", "yellow")
+    variants = [("two images", separate, {}),
+                ("packed", prepared, {"CHANGE_CROPS": False, "PACK_CROP_TO_CHANGE": False}),
+                ("packed, cropped to change", prepared, {"CHANGE_CROPS": False, "PACK_CROP_TO_CHANGE": True}),
+                ("change crops + thumbnail", prepared, {"CHANGE_CROPS": True, "PACK_IMAGE_PAIRS": False}),
+                ("packed change crops + thumbnail", prepared, {"CHANGE_CROPS": True, "PACK_IMAGE_PAIRS": True})]
+    for name, prepare, settings in variants:
+        override_settings(**settings)
+        payloads = []
+        report(f"{name}: prepare payload", time_calls(prepare, args["rounds"], payloads))
+        tokens = sum(payload_tokens(payload) for payload in payloads[-1])
+        size = sum(len(payload) * 3 / 4 for payload in payloads[-1])
+        print_with_color(f"{name}: ~{tokens} image tokens, {size / 1024:.1f} KB", "cyan")
+
+
+def bench_capture(args):
+    from and_controller import AndroidController, list_all_devices
+
+    device = args["device"]
+    if not device:
+        device_list = list_all_devices()
+        if len(device_list) != 1:
+            print_with_color(f"Please pass --device, attached devices: {device_list}", "red")
+            sys.exit(1)
+        device = device_list[0]
+    controller = AndroidController(device)
+    rounds = args["rounds"]
+    print_with_color(f"Capture benchmark on {device}, {rounds} rounds per path", "yellow")
+
+    with tempfile.TemporaryDirectory() as save_dir:
+        controller.capture_mode = "pull"
+        report("screenshot: screencap + pull", time_calls(lambda: controller.get_screenshot("bench", save_dir), rounds))
+        controller.capture_mode = "exec-out"
+        report("screenshot: exec-out png", time_calls(controller.capture_frame, rounds))
+        controller.capture_mode = "raw"
+        report("screenshot: exec-out raw", time_calls(controller.capture_frame, rounds))
+
+        controller.xml_mode = "pull"
+        report("hierarchy: dump + pull", time_calls(lambda: controller.get_xml("bench", save_dir), rounds))
+        report("hierarchy: stream", time_calls(controller.get_xml_source, rounds))
+        print_with_color(f"hierarchy stream target: {controller._xml_stream_target}", "yellow")
+
+        # A no-op action, so both paths pay the same settle wait on an idle screen
+        def separate_round():
+            if controller.run_batch(["true"]) == "ERROR":
+                return "ERROR"
+            controller.wait_until_stable()
+            return controller.observe("bench", save_dir)[0]
+
+        controller.capture_mode = "exec-out"
+        report("round: act + settle + observe", time_calls(separate_round, rounds))
+        report("round: act_and_observe", time_calls(lambda: controller.act_and_observe(["true"], "bench", save_dir),
+                                                    rounds))
+
+
+if __name__ == "__main__":
+    args = vars(parser.parse_args())
+    if args["bench"] == "capture":
+        bench_capture(args)
+    elif args["bench"] == "parse":
+        bench_parse(args)
+    elif args["bench"] == "pipeline":
+        bench_pipeline(args)
+    elif args["bench"] == "label":
+        bench_label(args)
+    elif args["bench"] == "pack":
+        bench_pack(args)
@@ -1,27 +1,186 @@
 import os
+import threading
+from collections.abc import Mapping
+from types import MappingProxyType
+
 import yaml
 
+# Environment variables always arrive as strings; these keys are converted to their YAML types
+BOOL_KEYS = ('ENABLE_LOCAL', 'ENABLE_API', 'WEB_HEADLESS', 'OPTIMIZE_IMAGES', 'DOC_REFINE', 'DARK_MODE',
+             'ADB_PERSISTENT_SHELL', 'XML_COMPRESSED', 'SETTLE_WAIT', 'EMULATOR_QUICKBOOT',
+             'EMULATOR_HEADLESS', 'ADB_FUSED_ACTIONS', 'SAVE_ARTIFACTS', 'ASYNC_ARTIFACTS',
+             'ARTIFACT_STORE', 'SCREEN_REUSE', 'PACK_IMAGE_PAIRS', 'PACK_CROP_TO_CHANGE',
+             'CHANGE_CROPS', 'SKIP_UNCHANGED', 'RESPONSE_CACHE', 'STREAM_RESPONSES', 'STREAM_EARLY_STOP',
+             'RATE_LIMIT')
+INT_KEYS = ('MAX_TOKENS', 'REQUEST_INTERVAL', 'WEB_VIEWPORT_WIDTH', 'WEB_VIEWPORT_HEIGHT',
+            'IMAGE_MAX_WIDTH', 'IMAGE_MAX_HEIGHT', 'IMAGE_QUALITY', 'MAX_ROUNDS', 'MIN_DIST',
+            'ADB_MAX_SESSIONS', 'EMULATOR_POOL_SIZE', 'EMULATOR_BASE_PORT', 'IMAGE_CACHE_MB',
+            'ARTIFACT_QUEUE_SIZE', 'SCREEN_REUSE_TOLERANCE', 'CHANGE_CROP_MAX_SIZE', 'CHANGE_THUMBNAIL_SIZE',
+            'RESPONSE_CACHE_MB', 'RESPONSE_CACHE_MAX_AGE_DAYS', 'MAX_CONCURRENT_REQUESTS', 'MAX_RETRIES',
+            'CIRCUIT_BREAKER_THRESHOLD')
+FLOAT_KEYS = ('TEMPERATURE', 'SETTLE_MIN_WAIT', 'SETTLE_MAX_WAIT', 'SETTLE_INTERVAL', 'SETTLE_TOLERANCE',
+              'SETTLE_UNCHANGED_WAIT', 'RETRY_BASE_DELAY', 'RETRY_MAX_DELAY', 'CIRCUIT_BREAKER_COOLDOWN',
+              'ADB_SHELL_TIMEOUT')
+# Declared type of every typed key; the other keys are strings or nested mappings / lists
+KEY_TYPES = {**dict.fromkeys(BOOL_KEYS, bool), **dict.fromkeys(INT_KEYS, int), **dict.fromkeys(FLOAT_KEYS, float)}
+
+
+def convert_value(key, value):
+    """
+    Convert a setting to the declared type of its key. Strings (environment variables, CLI flags)
+    are parsed, and an int is accepted for a float key.
+
+    Raises:
+        TypeError: the value cannot be a setting of this type (e.g. a list for MAX_ROUNDS)
+        ValueError: a string does not parse as the key's type
+    """
+    key_type = KEY_TYPES.get(key)
+    if key_type is None or value is None:
+        return value
+    if isinstance(value, str):
+        if key_type is bool:
+            return value.lower() in ('true', '1', 'yes')
+        return key_type(value)
+    if key_type is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, key_type) or (key_type is int and isinstance(value, bool)):
+        raise TypeError(f"Setting {key} must be {key_type.__name__}, got {value!r}")
+    return value
+
+
+def freeze(value):
+    """Read-only copy of a nested setting: dicts become MappingProxyType and lists become tuples"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
 
 def load_config(config_path="./config.yaml"):
+    """
+    Parse config.yaml and apply environment overrides.
+
+    This re-reads the file on every call and returns a fresh, mutable dict. Code that only reads
+    settings should use get_settings(), which parses once per process.
+    """
     # Load YAML first as defaults
     with open(config_path, "r") as file:
         configs = yaml.safe_load(file)
 
     # Override with environment variables (higher priority)
-    # Convert string 'true'/'false' to boolean for specific keys
-    bool_keys = ['ENABLE_LOCAL', 'ENABLE_API', 'WEB_HEADLESS', 'OPTIMIZE_IMAGES', 'DOC_REFINE', 'DARK_MODE']
-    int_keys = ['MAX_TOKENS', 'REQUEST_INTERVAL', 'WEB_VIEWPORT_WIDTH', 'WEB_VIEWPORT_HEIGHT',
-                'IMAGE_MAX_WIDTH', 'IMAGE_MAX_HEIGHT', 'IMAGE_QUALITY', 'MAX_ROUNDS', 'MIN_DIST']
-
     for key in configs.keys():
         if key in os.environ:
-            value = os.environ[key]
-            # Type conversion
-            if key in bool_keys:
-                configs[key] = value.lower() in ('true', '1', 'yes')
-            elif key in int_keys:
-                configs[key] = int(value)
-            else:
-                configs[key] = value
+            configs[key] = convert_value(key, os.environ[key])
 
     return configs
+
+
+class Settings(Mapping):
+    """
+    Read-only view of the configuration, shared by every module of a process.
+
+    Values are read like a dict (settings["MIN_DIST"], settings.get("MIN_DIST", 30)) or as attributes
+    (settings.MIN_DIST); item assignment raises TypeError, and nested values (RATE_LIMITS,
+    FALLBACK_MODELS) are frozen too. Keys in KEY_TYPES are checked and converted to their declared
+    type when loaded, so a wrong value fails at startup rather than in the middle of a run.
+
+    reload() and override() swap the whole underlying mapping at once, so a module-level
+    `configs = get_settings()` keeps seeing the current values, and a reader never observes a
+    half-updated configuration.
+    """
+    def __init__(self, config_path):
+        self._path = config_path
+        self._mtime = None
+        self._overrides = {}
+        self._values = MappingProxyType({})
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        mtime = os.path.getmtime(self._path)
+        values = load_config(self._path)
+        values.update(self._overrides)
+        self._values = MappingProxyType({key: freeze(convert_value(key, value)) for key, value in values.items()})
+        self._mtime = mtime
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __getattr__(self, key):
+        try:
+            return self.__dict__["_values"][key]
+        except KeyError:
+            raise AttributeError(key) from None
+
+    def __setitem__(self, key, value):
+        raise TypeError("Settings are read-only; use override_settings() to change a value")
+
+    def __repr__(self):
+        return f"Settings({self._path!r}, {dict(self._values)!r})"
+
+    def reload(self, force=False):
+        """
+        Re-read the config file if it changed on disk since it was last loaded.
+
+        Overrides set with override() survive the reload.
+
+        Returns:
+            True if the settings were reloaded
+        """
+        with self._lock:
+            try:
+                changed = os.path.getmtime(self._path) != self._mtime
+            except OSError:
+                return False
+            if not (changed or force):
+                return False
+            self._load()
+            return True
+
+    def override(self, **values):
+        """Replace settings for this process (e.g. from command line flags); values are type-converted"""
+        with self._lock:
+            converted = {key: freeze(convert_value(key, value)) for key, value in values.items()}
+            self._overrides.update(converted)
+            merged = dict(self._values)
+            merged.update(converted)
+            self._values = MappingProxyType(merged)
+
+
+_settings = {}
+_settings_lock = threading.Lock()
+
+
+def get_settings(config_path="./config.yaml"):
+    """
+    Process-wide settings for config_path, parsed on first use.
+
+    Returns:
+        Settings instance (the same object on every call)
+    """
+    key = os.path.abspath(config_path)
+    settings = _settings.get(key)
+    if settings is None:
+        with _settings_lock:
+            settings = _settings.get(key)
+            if settings is None:
+                settings = Settings(config_path)
+                _settings[key] = settings
+    return settings
+
+
+def reload_settings(config_path="./config.yaml"):
+    """Reload the shared settings if config.yaml changed; returns True if it did"""
+    return get_settings(config_path).reload()
+
+
+def override_settings(**values):
+    """Override settings for every module of this process"""
+    get_settings().override(**values)
@@ -1,13 +1,15 @@
 import argparse
 import ast
+import asyncio
 import json
 import os
 import re
 import sys
-import time
 
 import prompts
-from config import load_config
+from artifact_store import load_artifact
+from config import get_settings
+from image_pairs import prepare_image_pair, format_pack_stats
 from model import OpenAIModel, OllamaModel
 from utils import print_with_color
 
@@ -18,7 +20,7 @@ parser.add_argument("--demo", required=True)
 parser.add_argument("--root_dir", default="./")
 args = vars(parser.parse_args())
 
-configs = load_config()
+configs = get_settings()
 
 if configs["MODEL"] == "api":
     # API Model: Supports 100+ providers via LiteLLM (OpenAI, Claude, Grok, Gemini, etc.)
@@ -59,13 +61,18 @@ if not os.path.exists(docs_dir):
     os.mkdir(docs_dir)
 
 print_with_color(f"Starting to generate documentations for the app {app} based on the demo {demo_name}", "yellow")
-doc_count = 0
+task_desc = open(task_desc_path, "r").read()
+steps = []
 with open(record_path, "r") as infile:
     step = len(infile.readlines()) - 1
     infile.seek(0)
     for i in range(1, step + 1):
-        img_before = os.path.join(labeled_ss_dir, f"{demo_name}_{i}.png")
-        img_after = os.path.join(labeled_ss_dir, f"{demo_name}_{i + 1}.png")
+        # Plain files, or blobs in the artifact store listed in the directory's manifest
+        img_before = load_artifact(os.path.join(labeled_ss_dir, f"{demo_name}_{i}.png"))
+        img_after = load_artifact(os.path.join(labeled_ss_dir, f"{demo_name}_{i + 1}.png"))
+        if img_before is None or img_after is None:
+            print_with_color(f"ERROR: Labeled screenshots of step {i} not found", "red")
+            break
         rec = infile.readline().strip()
         action, resource_id = rec.split(":::")
         action_type = action.split("(")[0]
@@ -91,47 +98,87 @@ with open(record_path, "r") as infile:
             prompt = re.sub(r"<ui_element>", swipe_area, prompt)
         else:
             break
-        task_desc = open(task_desc_path, "r").read()
         prompt = re.sub(r"<task_desc>", task_desc, prompt)
+        steps.append((i, action_type, resource_id, prompt, img_before, img_after))
+
+
+async def generate_doc(i, action_type, resource_id, prompt, img_before, img_after):
+    """
+    Generate (or refine) the documentation of one element from one demo step.
+
+    Returns:
+        1 if a doc was written, else 0
+    """
+    doc_name = resource_id + ".txt"
+    doc_path = os.path.join(docs_dir, doc_name)
+
+    if os.path.exists(doc_path):
+        doc_content = ast.literal_eval(open(doc_path).read())
+        if doc_content[action_type]:
+            if configs["DOC_REFINE"]:
+                suffix = re.sub(r"<old_doc>", doc_content[action_type], prompts.refine_doc_suffix)
+                prompt += suffix
+                print_with_color(f"Documentation for the element {resource_id} already exists. The doc will be "
+                                 f"refined based on the latest demo.", "yellow")
+            else:
+                print_with_color(f"Documentation for the element {resource_id} already exists. Turn on DOC_REFINE "
+                                 f"in the config file if needed.", "yellow")
+                return 0
+    else:
+        doc_content = {
+            "tap": "",
+            "text": "",
+            "v_swipe": "",
+            "h_swipe": "",
+            "long_press": ""
+        }
+
+    print_with_color(f"Waiting for GPT-4V to generate documentation for the element {resource_id}", "yellow")
+    prompt, images, pack_stats = prepare_image_pair(prompt, img_before, img_after, f"{demo_name}_{i}_pair")
+    if pack_stats:
+        print_with_color(format_pack_stats(pack_stats), "cyan")
+    if images is None:
+        print_with_color(f"The screen did not change in step {i}, no documentation generated for the element "
+                         f"{resource_id}", "yellow")
+        return 0
+    status, rsp, metadata = await mllm.aget_model_response(prompt, images)
+    if not status:
+        print_with_color(rsp, "red")
+        return 0
+    doc_content[action_type] = rsp
+    with open(log_path, "a") as logfile:
+        log_item = {"step": i, "prompt": prompt, "image_before": f"{demo_name}_{i}.png",
+                    "image_after": f"{demo_name}_{i + 1}.png", "response": rsp,
+                    "response_time": metadata["response_time"], "prompt_tokens": metadata["prompt_tokens"],
+                    "image_pack": pack_stats}
+        logfile.write(json.dumps(log_item) + "\n")
+    with open(doc_path, "w") as outfile:
+        outfile.write(str(doc_content))
+    print_with_color(f"Documentation generated and saved to {doc_path}", "yellow")
+    return 1
+
+
+async def generate_docs(steps):
+    """
+    Run the steps in waves of concurrent requests (at most MAX_CONCURRENT_REQUESTS in flight, paced by
+    the provider's rate limiter).
+
+    A wave holds at most one step per element, so a later demo step of the same element is sent
+    only after the earlier one's doc is written and can refine it, as in a sequential run.
+    """
+    doc_count = 0
+    while steps:
+        wave, later, elements = [], [], set()
+        for step in steps:
+            if step[2] in elements:
+                later.append(step)
+            else:
+                elements.add(step[2])
+                wave.append(step)
+        doc_count += sum(await asyncio.gather(*(generate_doc(*step) for step in wave)))
+        steps = later
+    return doc_count
 
-        doc_name = resource_id + ".txt"
-        doc_path = os.path.join(docs_dir, doc_name)
-
-        if os.path.exists(doc_path):
-            doc_content = ast.literal_eval(open(doc_path).read())
-            if doc_content[action_type]:
-                if configs["DOC_REFINE"]:
-                    suffix = re.sub(r"<old_doc>", doc_content[action_type], prompts.refine_doc_suffix)
-                    prompt += suffix
-                    print_with_color(f"Documentation for the element {resource_id} already exists. The doc will be "
-                                     f"refined based on the latest demo.", "yellow")
-                else:
-                    print_with_color(f"Documentation for the element {resource_id} already exists. Turn on DOC_REFINE "
-                                     f"in the config file if needed.", "yellow")
-                    continue
-        else:
-            doc_content = {
-                "tap": "",
-                "text": "",
-                "v_swipe": "",
-                "h_swipe": "",
-                "long_press": ""
-            }
-
-        print_with_color(f"Waiting for GPT-4V to generate documentation for the element {resource_id}", "yellow")
-        status, rsp = mllm.get_model_response(prompt, [img_before, img_after])
-        if status:
-            doc_content[action_type] = rsp
-            with open(log_path, "a") as logfile:
-                log_item = {"step": i, "prompt": prompt, "image_before": f"{demo_name}_{i}.png",
-                            "image_after": f"{demo_name}_{i + 1}.png", "response": rsp}
-                logfile.write(json.dumps(log_item) + "\n")
-            with open(doc_path, "w") as outfile:
-                outfile.write(str(doc_content))
-            doc_count += 1
-            print_with_color(f"Documentation generated and saved to {doc_path}", "yellow")
-        else:
-            print_with_color(rsp, "red")
-        time.sleep(configs["REQUEST_INTERVAL"])
 
+doc_count = asyncio.run(generate_docs(steps))
 print_with_color(f"Documentation generation phase completed. {doc_count} docs generated.", "yellow")
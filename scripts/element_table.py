@@ -0,0 +1,109 @@
+import sys
+
+import numpy as np
+
+
+class ElementTable:
+    """
+    Column store for the labeled UI elements of one screen.
+
+    Bounding boxes and centres live in NumPy arrays so distance filtering and label placement
+    run vectorized, and uids are interned strings. Indexing
+    with an int builds an element object (AndroidElement / WebElement) from the row, so code
+    reading elem.uid / elem.bbox / elem.attrib keeps working unchanged.
+
+    Attributes:
+        uids: List of interned uid strings
+        bboxes: int32 array of shape (n, 4) holding x1, y1, x2, y2
+        centers: int32 array of shape (n, 2), computed as in the scripts: (x1 + x2) // 2
+        attribs: Per-element attrib payload ("clickable"/"focusable" on Android, dict on web)
+    """
+    def __init__(self, uids, bboxes, attribs, element_cls):
+        self.uids = [sys.intern(uid) for uid in uids]
+        self.bboxes = np.asarray(bboxes, dtype=np.int32).reshape(-1, 4)
+        self.centers = (self.bboxes[:, :2] + self.bboxes[:, 2:]) // 2
+        self.attribs = list(attribs)
+        self.element_cls = element_cls
+
+    @classmethod
+    def from_elements(cls, elems, element_cls=None):
+        """Build a table from a list of element objects with uid, bbox and attrib"""
+        if element_cls is None:
+            element_cls = type(elems[0]) if elems else object
+        bboxes = [(e.bbox[0][0], e.bbox[0][1], e.bbox[1][0], e.bbox[1][1]) for e in elems]
+        return cls([e.uid for e in elems], bboxes, [e.attrib for e in elems], element_cls)
+
+    def __len__(self):
+        return len(self.uids)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError("element index out of range")
+            x1, y1, x2, y2 = self.bboxes[index].tolist()
+            return self.element_cls(self.uids[index], ((x1, y1), (x2, y2)), self.attribs[index])
+        return self.take(np.arange(len(self))[index])
+
+    def take(self, indices):
+        """Return a new table with the rows at indices (int array or boolean mask)"""
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        table = ElementTable.__new__(ElementTable)
+        table.uids = [self.uids[i] for i in indices]
+        table.bboxes = self.bboxes[indices]
+        table.centers = self.centers[indices]
+        table.attribs = [self.attribs[i] for i in indices]
+        table.element_cls = self.element_cls
+        return table
+
+    def concat(self, other):
+        """Return a new table with the rows of other appended"""
+        table = ElementTable.__new__(ElementTable)
+        table.uids = self.uids + other.uids
+        table.bboxes = np.concatenate([self.bboxes, other.bboxes])
+        table.centers = np.concatenate([self.centers, other.centers])
+        table.attribs = self.attribs + other.attribs
+        table.element_cls = self.element_cls
+        return table
+
+    def center(self, index):
+        """Tap point of the element at index as a pair of ints"""
+        x, y = self.centers[index].tolist()
+        return x, y
+
+    def far_from(self, points, min_dist, chunk_cells=4_000_000):
+        """
+        Boolean mask of rows whose centre is farther than min_dist from every point.
+
+        Distances are computed by broadcasting in chunks of rows so that memory stays bounded
+        by chunk_cells pairwise entries.
+        """
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        mask = np.ones(len(self), dtype=bool)
+        if len(points) == 0 or len(self) == 0:
+            return mask
+        centers = self.centers.astype(np.int64)
+        limit = min_dist * min_dist
+        chunk = max(1, chunk_cells // len(points))
+        for start in range(0, len(self), chunk):
+            block = centers[start:start + chunk]
+            dist_sq = ((block[:, None, :] - points[None, :, :]) ** 2).sum(axis=2)
+            mask[start:start + chunk] = ~(dist_sq <= limit).any(axis=1)
+        return mask
+
+    def without_uids(self, uids):
+        """Return the rows whose uid is not in uids"""
+        if not uids:
+            return self
+        return self.take(np.array([uid not in uids for uid in self.uids], dtype=bool))
+
+    def label_positions(self, offset=10):
+        """Top-left corner of each numeric tag, offset from the element centre as draw_bbox_multi does"""
+        return self.centers + offset
@@ -0,0 +1,220 @@
+import argparse
+import sys
+import threading
+import time
+
+from and_controller import execute_adb, launch_emulator, list_available_emulators, stop_emulator, wait_for_device
+from config import get_settings
+from utils import print_with_color
+
+configs = get_settings()
+
+
+class EmulatorInstance:
+    def __init__(self, avd_name, port):
+        self.avd_name = avd_name
+        self.port = port
+        self.serial = f"emulator-{port}"
+        self.process = None
+        self.booted = threading.Event()
+        self.leased = False
+
+    def _watch_console(self):
+        """Drain the emulator's console output and flag the boot-completed event it prints"""
+        for line in self.process.stdout:
+            if "Boot completed" in line or "Successfully loaded snapshot" in line:
+                self.booted.set()
+
+    def launch(self, snapshot, headless=True, read_only=True):
+        self.booted.clear()
+        self.process = launch_emulator(self.avd_name, snapshot=snapshot, port=self.port, headless=headless,
+                                       read_only=read_only)
+        if self.process is None:
+            return False
+        threading.Thread(target=self._watch_console, daemon=True).start()
+        return True
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def wait_ready(self, timeout):
+        """
+        Wait until the instance can take commands.
+
+        wait_for_device (one blocking adb call that returns once sys.boot_completed is set) runs with
+        the full timeout in the background, so it works for emulator builds that do not print the
+        "Boot completed" console event too. Meanwhile the emulator process is watched, and an
+        instance that died fails at once instead of after the timeout.
+        """
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(wait_for_device(timeout=timeout, device=self.serial)),
+                                  daemon=True)
+        waiter.start()
+        deadline = time.time() + timeout
+        while waiter.is_alive() and time.time() < deadline:
+            if self.process is not None and self.process.poll() is not None:
+                print_with_color(f"ERROR: Emulator {self.serial} exited with code {self.process.returncode} "
+                                 f"while booting", "red")
+                return False
+            # Wakes up early on the console event; the adb call then returns within a poll
+            waiter.join(0.1 if self.booted.is_set() else 0.5)
+        return bool(result and result[0])
+
+
+class EmulatorPool:
+    """
+    Keep a fixed number of headless emulator instances of one AVD booted and hand them out on request.
+
+    Instances boot from a named quickboot snapshot with -read-only, so several copies of the same AVD
+    run side by side and none of them writes back to the snapshot. release() restores the snapshot with
+    `adb emu avd snapshot load`, which takes seconds, instead of rebooting, so every task starts from
+    the same clean state.
+    """
+    def __init__(self, avd_name, size=2, snapshot="appagent_clean", base_port=5580, headless=True, boot_timeout=300):
+        self.avd_name = avd_name
+        self.snapshot = snapshot
+        self.headless = headless
+        self.boot_timeout = boot_timeout
+        # Console ports come in pairs (console, adb), so instances use every other port
+        self.instances = [EmulatorInstance(avd_name, base_port + 2 * i) for i in range(size)]
+        self.lock = threading.Condition()
+
+    def has_snapshot(self, serial):
+        result = execute_adb(f"adb -s {serial} emu avd snapshot list")
+        return result != "ERROR" and self.snapshot in result
+
+    def prepare_snapshot(self):
+        """
+        Create the pool snapshot if the AVD does not have it yet.
+
+        Boots one writable instance (cold boot falls back to the default quickboot state), saves the
+        current state under the pool snapshot name and shuts it down.
+
+        Returns:
+            True if the snapshot exists afterwards
+        """
+        instance = self.instances[0]
+        instance.process = launch_emulator(self.avd_name, port=instance.port, headless=self.headless)
+        if instance.process is None:
+            print_with_color("ERROR: emulator command not found", "red")
+            return False
+        threading.Thread(target=instance._watch_console, daemon=True).start()
+        try:
+            if not instance.wait_ready(self.boot_timeout):
+                return False
+            if self.has_snapshot(instance.serial):
+                print_with_color(f"Snapshot {self.snapshot} already exists for {self.avd_name}", "yellow")
+                return True
+            print_with_color(f"Saving snapshot {self.snapshot} for {self.avd_name}...", "yellow")
+            return execute_adb(f"adb -s {instance.serial} emu avd snapshot save {self.snapshot}") != "ERROR"
+        finally:
+            stop_emulator(instance.serial)
+            instance.process.wait()
+            instance.process = None
+
+    def _boot(self, instance):
+        if not instance.launch(self.snapshot, headless=self.headless):
+            return False
+        if instance.wait_ready(self.boot_timeout):
+            instance.booted.set()
+            return True
+        print_with_color(f"ERROR: {instance.serial} did not boot in time", "red")
+        return False
+
+    def start(self):
+        """
+        Boot every instance concurrently.
+
+        Returns:
+            List of serials that came up
+        """
+        if self.avd_name not in list_available_emulators():
+            print_with_color(f"ERROR: AVD '{self.avd_name}' not found", "red")
+            return []
+        print_with_color(f"Booting {len(self.instances)} x {self.avd_name} from snapshot {self.snapshot}...", "yellow")
+        start = time.time()
+        results = {}
+        threads = [threading.Thread(target=lambda i=i: results.__setitem__(i.serial, self._boot(i)))
+                   for i in self.instances]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        ready = [serial for serial, ok in results.items() if ok]
+        print_with_color(f"Emulator pool ready in {time.time() - start:.1f}s: {ready}", "green")
+        return ready
+
+    def acquire(self, timeout=None):
+        """
+        Lease a booted instance.
+
+        Returns:
+            Serial of the instance, or None if none became free within timeout
+        """
+        with self.lock:
+            free = lambda: [i for i in self.instances if not i.leased and i.alive() and i.booted.is_set()]
+            if not self.lock.wait_for(free, timeout):
+                return None
+            instance = free()[0]
+            instance.leased = True
+            return instance.serial
+
+    def reset(self, serial):
+        """
+        Restore the pool snapshot on an instance, relaunching it if the emulator process has died.
+
+        Returns:
+            True if the instance is back in the clean state
+        """
+        instance = next(i for i in self.instances if i.serial == serial)
+        if instance.alive():
+            start = time.time()
+            result = execute_adb(f"adb -s {serial} emu avd snapshot load {self.snapshot}")
+            if result != "ERROR" and wait_for_device(timeout=60, device=serial):
+                print_with_color(f"{serial} restored to {self.snapshot} in {time.time() - start:.1f}s", "green")
+                return True
+            print_with_color(f"WARNING: Snapshot restore failed on {serial}, relaunching", "yellow")
+            stop_emulator(serial)
+            instance.process.wait()
+        return self._boot(instance)
+
+    def release(self, serial, reset=True):
+        """Return a leased instance to the pool, restoring the clean snapshot first"""
+        if reset:
+            self.reset(serial)
+        with self.lock:
+            for instance in self.instances:
+                if instance.serial == serial:
+                    instance.leased = False
+            self.lock.notify_all()
+
+    def shutdown(self):
+        for instance in self.instances:
+            if instance.alive():
+                stop_emulator(instance.serial)
+                instance.process.wait()
+
+
+if __name__ == "__main__":
+    arg_desc = "AppAgent - Warm Emulator Pool"
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=arg_desc)
+    parser.add_argument("--avd", required=True, help="Name of the AVD to run")
+    parser.add_argument("--size", type=int, default=configs.get("EMULATOR_POOL_SIZE", 2))
+    parser.add_argument("--snapshot", default=configs.get("EMULATOR_SNAPSHOT", "appagent_clean"))
+    parser.add_argument("--prepare", action="store_true",
+                        help="Create the snapshot from the current AVD state before starting the pool")
+    args = vars(parser.parse_args())
+
+    pool = EmulatorPool(args["avd"], size=args["size"], snapshot=args["snapshot"],
+                        base_port=configs.get("EMULATOR_BASE_PORT", 5580))
+    if args["prepare"] and not pool.prepare_snapshot():
+        print_with_color("ERROR: Failed to prepare the pool snapshot", "red")
+        sys.exit(1)
+    if not pool.start():
+        sys.exit(1)
+    print_with_color("Emulators are warm. Press Ctrl+C to shut the pool down.", "yellow")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pool.shutdown()
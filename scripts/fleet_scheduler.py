@@ -0,0 +1,264 @@
+import argparse
+import datetime
+import json
+import os
+import queue
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from and_controller import list_all_devices
+from config import get_settings
+from utils import print_with_color
+
+configs = get_settings()
+
+arg_desc = "AppAgent - Multi-device Fleet Scheduler"
+parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=arg_desc)
+parser.add_argument("--jobs", required=True,
+                    help="JSONL file with one job per line: {\"app\": ..., \"task_desc\": ..., \"docs\": ...}")
+parser.add_argument("--root_dir", default="./")
+parser.add_argument("--devices", nargs="+", default=None,
+                    help="Device serials to lease (defaults to every attached device)")
+parser.add_argument("--docs", choices=["auto", "demo", "none"], default="auto",
+                    help="Documentation base for jobs that do not set one")
+parser.add_argument("--max_retries", type=int, default=2,
+                    help="Times a job is re-queued after the device running it was lost")
+parser.add_argument("--poll_interval", type=int, default=10,
+                    help="Seconds between checks for lost or newly attached devices")
+parser.add_argument("--avd", default=None,
+                    help="Run jobs on a warm pool of headless emulators of this AVD instead of attached devices")
+parser.add_argument("--pool_size", type=int, default=None,
+                    help="Number of emulator instances in the pool (defaults to EMULATOR_POOL_SIZE)")
+parser.add_argument("--model", choices=["api", "local"], default=None)
+parser.add_argument("--model_name", default=None)
+
+
+def load_jobs(jobs_path):
+    """
+    Read the job queue file.
+
+    Returns:
+        List of job dicts with app, task_desc and optional docs, or "ERROR"
+    """
+    jobs = []
+    with open(jobs_path, "r") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                print_with_color(f"ERROR: Invalid job on line {line_no}: {e}", "red")
+                return "ERROR"
+            if not job.get("app") or not job.get("task_desc"):
+                print_with_color(f"ERROR: Job on line {line_no} needs both app and task_desc", "red")
+                return "ERROR"
+            job["id"] = len(jobs) + 1
+            job["attempts"] = 0
+            jobs.append(job)
+    return jobs
+
+
+def safe_name(device):
+    """Device serial usable in a file name (emulator-5554, 192.168.0.2-5555)"""
+    return re.sub(r"[^\w.-]", "-", device)
+
+
+class DeviceStats:
+    def __init__(self, device):
+        self.device = device
+        self.succeeded = 0
+        self.failed = 0
+        self.lost = 0
+        self.busy_time = 0.0
+
+    def to_dict(self, wall_time):
+        finished = self.succeeded + self.failed
+        return {"device": self.device, "succeeded": self.succeeded, "failed": self.failed, "lost": self.lost,
+                "busy_time": round(self.busy_time, 1),
+                "tasks_per_hour": round(finished * 3600 / wall_time, 2) if wall_time > 0 else 0.0}
+
+
+class FleetScheduler:
+    """
+    Lease devices to a queue of task_executor jobs, one executor process per device at a time.
+
+    Every device gets its own worker thread that pulls the next job, runs task_executor.py pinned to
+    that device (--device) with stdin closed so a stray prompt fails fast instead of hanging, and
+    records the outcome. When an executor fails and its device has disappeared from adb, the job is
+    re-queued for another device (up to max_retries) and the device is retired until it reappears.
+
+    With an EmulatorPool, the leased devices are the pool's instances and each one is restored to the
+    pool snapshot between jobs (or relaunched if it died), so every job starts from the same state.
+    """
+    def __init__(self, jobs, root_dir, log_dir, default_docs="auto", max_retries=2, poll_interval=10,
+                 extra_args=None, pool=None):
+        self.pool = pool
+        self.root_dir = root_dir
+        self.log_dir = log_dir
+        self.default_docs = default_docs
+        self.max_retries = max_retries
+        self.poll_interval = poll_interval
+        self.extra_args = extra_args or []
+        self.pending = queue.Queue()
+        for job in jobs:
+            self.pending.put(job)
+        self.remaining = len(jobs)
+        self.results = []
+        self.stats = {}
+        self.workers = {}
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def _executor_cmd(self, job, device):
+        cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "task_executor.py"),
+               "--app", job["app"], "--task_desc", job["task_desc"], "--root_dir", self.root_dir,
+               "--device", device, "--docs", job.get("docs", self.default_docs)]
+        return cmd + self.extra_args
+
+    def _finish(self, job, device, status, elapsed):
+        with self.lock:
+            self.results.append({"job": job["id"], "app": job["app"], "task_desc": job["task_desc"],
+                                 "device": device, "status": status, "attempts": job["attempts"],
+                                 "time": round(elapsed, 1)})
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.done.set()
+
+    def _worker(self, device):
+        stats = self.stats[device]
+        while not self.done.is_set():
+            try:
+                job = self.pending.get(timeout=1)
+            except queue.Empty:
+                continue
+            job["attempts"] += 1
+            log_path = os.path.join(self.log_dir, f"job{job['id']}_{safe_name(device)}.log")
+            print_with_color(f"[{device}] Job {job['id']} ({job['app']}): {job['task_desc']}", "yellow")
+            start = time.time()
+            with open(log_path, "w") as log_file:
+                ret = subprocess.run(self._executor_cmd(job, device), stdin=subprocess.DEVNULL, stdout=log_file,
+                                     stderr=subprocess.STDOUT).returncode
+            elapsed = time.time() - start
+            stats.busy_time += elapsed
+            lost = False
+            if ret == 0:
+                stats.succeeded += 1
+                print_with_color(f"[{device}] Job {job['id']} finished in {elapsed:.1f}s", "green")
+                self._finish(job, device, "success", elapsed)
+            elif device not in list_all_devices():
+                lost = True
+                stats.lost += 1
+                if job["attempts"] <= self.max_retries:
+                    print_with_color(f"[{device}] Device lost, re-queueing job {job['id']}", "red")
+                    self.pending.put(job)
+                else:
+                    print_with_color(f"[{device}] Device lost, job {job['id']} out of retries", "red")
+                    self._finish(job, device, "device_lost", elapsed)
+            else:
+                stats.failed += 1
+                print_with_color(f"[{device}] Job {job['id']} failed (exit code {ret}), see {log_path}", "red")
+                self._finish(job, device, "failed", elapsed)
+            if self.pool is not None and not self.done.is_set():
+                # Restore the clean snapshot (or relaunch a dead instance) before the next job
+                lost = not self.pool.reset(device)
+            if lost:
+                with self.lock:
+                    del self.workers[device]
+                return
+
+    def lease(self, device):
+        """Start a worker for device unless one is already running"""
+        with self.lock:
+            if device in self.workers:
+                return
+            self.stats.setdefault(device, DeviceStats(device))
+            worker = threading.Thread(target=self._worker, args=(device,), daemon=True)
+            self.workers[device] = worker
+        print_with_color(f"Leased device {device}", "cyan")
+        worker.start()
+
+    def run(self, devices=None):
+        """
+        Run every job and block until the queue is drained.
+
+        Args:
+            devices: Fixed list of serials to lease; None leases every attached device, including ones
+                     attached while the queue is being processed
+
+        Returns:
+            Wall time in seconds
+        """
+        start = time.time()
+        if self.pool is not None:
+            devices = self.pool.start()
+        while not self.done.is_set():
+            attached = list_all_devices()
+            for device in attached:
+                if devices is None or device in devices:
+                    self.lease(device)
+            with self.lock:
+                idle = not self.workers
+            if idle and time.time() - start > self.poll_interval and not self.pending.empty():
+                print_with_color("ERROR: No devices left to run the remaining jobs", "red")
+                break
+            self.done.wait(self.poll_interval)
+        return time.time() - start
+
+    def report(self, wall_time):
+        """Print per-device throughput and return the summary dict"""
+        summary = {"wall_time": round(wall_time, 1), "jobs": self.results,
+                   "devices": [s.to_dict(wall_time) for s in self.stats.values()]}
+        print_with_color(f"Fleet finished {len(self.results)} jobs in {wall_time:.1f}s", "yellow")
+        for s in summary["devices"]:
+            print_with_color(f"{s['device']:<24} ok {s['succeeded']:3d} | failed {s['failed']:3d} | "
+                             f"lost {s['lost']:3d} | busy {s['busy_time']:8.1f}s | "
+                             f"{s['tasks_per_hour']:.2f} tasks/h", "cyan")
+        finished = sum(s["succeeded"] + s["failed"] for s in summary["devices"])
+        if wall_time > 0:
+            print_with_color(f"Fleet throughput: {finished * 3600 / wall_time:.2f} tasks/h", "cyan")
+        return summary
+
+
+if __name__ == "__main__":
+    args = vars(parser.parse_args())
+    jobs = load_jobs(args["jobs"])
+    if jobs == "ERROR":
+        sys.exit(1)
+    if not jobs:
+        print_with_color("No jobs to run.", "yellow")
+        sys.exit(0)
+
+    fleet_name = datetime.datetime.now().strftime("fleet_%Y-%m-%d_%H-%M-%S")
+    log_dir = os.path.join(args["root_dir"], "tasks", fleet_name)
+    os.makedirs(log_dir)
+    extra_args = []
+    if args["model"]:
+        extra_args += ["--model", args["model"]]
+    if args["model_name"]:
+        extra_args += ["--model_name", args["model_name"]]
+
+    pool = None
+    if args["avd"]:
+        from emulator_pool import EmulatorPool
+
+        pool = EmulatorPool(args["avd"], size=args["pool_size"] or configs.get("EMULATOR_POOL_SIZE", 2),
+                            snapshot=configs.get("EMULATOR_SNAPSHOT", "appagent_clean"),
+                            base_port=configs.get("EMULATOR_BASE_PORT", 5580))
+    scheduler = FleetScheduler(jobs, args["root_dir"], log_dir, default_docs=args["docs"],
+                               max_retries=args["max_retries"], poll_interval=args["poll_interval"],
+                               extra_args=extra_args, pool=pool)
+    print_with_color(f"Scheduling {len(jobs)} jobs, executor logs in {log_dir}", "yellow")
+    try:
+        wall_time = scheduler.run(args["devices"])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    summary = scheduler.report(wall_time)
+    with open(os.path.join(log_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    sys.exit(0 if all(r["status"] == "success" for r in summary["jobs"])
+             and len(summary["jobs"]) == len(jobs) else 1)
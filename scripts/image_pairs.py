@@ -0,0 +1,248 @@
+import math
+import time
+
+import cv2
+import numpy as np
+
+import prompts
+from artifacts import Frame
+from config import get_settings
+
+configs = get_settings()
+
+HEADER_HEIGHT = 24
+GAP = 6
+# Above this fraction of the screen (e.g. a new page) a change crop saves nothing over the full screenshots
+MAX_CROP_FRACTION = 0.5
+
+
+def _image(frame):
+    return getattr(frame, "image", frame)
+
+
+def changed_region(before, after, threshold=24, margin=16):
+    """
+    Bounding box of the pixels that differ between two screenshots.
+
+    Args:
+        before: Frame or BGR ndarray
+        after: Frame or BGR ndarray of the same size
+        threshold: Grey-level difference below which a pixel counts as unchanged (absorbs JPEG noise
+                   and anti-aliasing)
+        margin: Pixels added around the box on every side (clipped to the image)
+
+    Returns:
+        (left, top, right, bottom), the whole image if the sizes differ, or None if nothing changed
+    """
+    before, after = _image(before), _image(after)
+    height, width = before.shape[:2]
+    if after.shape[:2] != (height, width):
+        return 0, 0, max(width, after.shape[1]), max(height, after.shape[0])
+    diff = cv2.absdiff(cv2.cvtColor(before, cv2.COLOR_BGR2GRAY), cv2.cvtColor(after, cv2.COLOR_BGR2GRAY))
+    changed = diff > threshold
+    rows = np.flatnonzero(changed.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(changed[rows[0]:rows[-1] + 1].any(axis=0))
+    return (max(int(cols[0]) - margin, 0), max(int(rows[0]) - margin, 0),
+            min(int(cols[-1]) + 1 + margin, width), min(int(rows[-1]) + 1 + margin, height))
+
+
+def estimate_image_tokens(width, height):
+    """
+    Prompt tokens of an image under the tile-based accounting of OpenAI-style vision APIs
+    (fit into 2048 x 2048, shortest side at most 768, then 85 + 170 per 512 px tile).
+
+    Other providers count differently, but the ratio between two layouts is similar.
+    """
+    scale = min(1.0, 2048 / max(width, height), 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def _sent_size(image, max_size):
+    height, width = image.shape[:2]
+    if max_size is None or (width <= max_size and height <= max_size):
+        return width, height
+    scale = max_size / max(width, height)
+    return int(width * scale), int(height * scale)
+
+
+def pack_image_pair(before, after, name, max_width=None, max_height=None, region=None, labels=("BEFORE", "AFTER")):
+    """
+    Compose a before / after pair into one canvas, so a model call pays the per-image overhead once.
+
+    The two images are scaled by the same factor and placed side by side (portrait screens) or on
+    top of each other (landscape pages), whichever keeps the larger scale, each under a small
+    header with its label.
+
+    Args:
+        before: Frame or BGR ndarray
+        after: Frame or BGR ndarray
+        name: Name of the packed Frame
+        max_width: Canvas width limit (None: no limit)
+        max_height: Canvas height limit (None: no limit)
+        region: Optional (left, top, right, bottom) both images are cropped to first
+        labels: Header text of the two images
+
+    Returns:
+        (Frame, layout), layout being "side-by-side" or "stacked"
+    """
+    images = [_image(before), _image(after)]
+    if region is not None:
+        left, top, right, bottom = region
+        images = [image[top:bottom, left:right] for image in images]
+    (h1, w1), (h2, w2) = images[0].shape[:2], images[1].shape[:2]
+    max_width = max_width or float("inf")
+    max_height = max_height or float("inf")
+    side_scale = min(1.0, (max_width - GAP) / (w1 + w2), (max_height - HEADER_HEIGHT) / max(h1, h2))
+    stack_scale = min(1.0, max_width / max(w1, w2), (max_height - 2 * HEADER_HEIGHT - GAP) / (h1 + h2))
+    if side_scale == stack_scale:
+        side_by_side = h1 >= w1
+    else:
+        side_by_side = side_scale > stack_scale
+    scale = side_scale if side_by_side else stack_scale
+    sizes = [(max(int(w * scale), 1), max(int(h * scale), 1)) for w, h in ((w1, h1), (w2, h2))]
+    if side_by_side:
+        canvas = np.full((HEADER_HEIGHT + max(h for _, h in sizes), sizes[0][0] + GAP + sizes[1][0], 3), 255,
+                         np.uint8)
+        canvas[:, sizes[0][0]:sizes[0][0] + GAP] = 128
+        origins = [(0, HEADER_HEIGHT), (sizes[0][0] + GAP, HEADER_HEIGHT)]
+    else:
+        canvas = np.full((2 * HEADER_HEIGHT + GAP + sizes[0][1] + sizes[1][1], max(w for w, _ in sizes), 3), 255,
+                         np.uint8)
+        canvas[HEADER_HEIGHT + sizes[0][1]:HEADER_HEIGHT + sizes[0][1] + GAP] = 128
+        origins = [(0, HEADER_HEIGHT), (0, 2 * HEADER_HEIGHT + GAP + sizes[0][1])]
+    for image, (width, height), (x, y), label in zip(images, sizes, origins, labels):
+        if (width, height) != image.shape[1::-1]:
+            image = cv2.resize(np.ascontiguousarray(image), (width, height), interpolation=cv2.INTER_AREA)
+        canvas[y:y + height, x:x + width] = image
+        cv2.putText(canvas, label, (x + 4, y - 7), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1, cv2.LINE_AA)
+    return Frame(canvas, name), "side-by-side" if side_by_side else "stacked"
+
+
+def change_thumbnail(frame, region, size, name):
+    """Small copy of a screenshot with region outlined in red, as context for crops of that region"""
+    image = _image(frame)
+    height, width = image.shape[:2]
+    scale = min(1.0, size / max(width, height))
+    thumbnail = cv2.resize(np.ascontiguousarray(image), (max(int(width * scale), 1), max(int(height * scale), 1)),
+                           interpolation=cv2.INTER_AREA)
+    left, top, right, bottom = (int(v * scale) for v in region)
+    cv2.rectangle(thumbnail, (left, top), (max(right - 1, left), max(bottom - 1, top)), (0, 0, 255), 2)
+    return Frame(thumbnail, name, max_size=size)
+
+
+def _sent_tokens(images, max_size):
+    return sum(estimate_image_tokens(*_sent_size(_image(img), getattr(img, "max_size", None) or max_size))
+               for img in images)
+
+
+def prepare_image_pair(prompt, before, after, name, focus=None):
+    """
+    Images (and matching prompt) of a reflection / documentation call on a before / after pair.
+
+    The pair goes through up to three stages, each behind a setting:
+    - SKIP_UNCHANGED: if the screenshots are pixel-identical, no images are returned and the caller
+      can skip the call.
+    - CHANGE_CROPS: only the changed region is sent, at up to CHANGE_CROP_MAX_SIZE instead of the
+      IMAGE_MAX_WIDTH / IMAGE_MAX_HEIGHT downscale, after a CHANGE_THUMBNAIL_SIZE thumbnail of the
+      whole screen with the region outlined. Changes covering more than MAX_CROP_FRACTION of the
+      screen, and crops estimated to cost more image tokens than the pair without them, are sent
+      whole.
+    - PACK_IMAGE_PAIRS: before and after (or their crops) are packed into one canvas, within
+      IMAGE_MAX_WIDTH x IMAGE_MAX_HEIGHT (no limit with OPTIMIZE_IMAGES off) unless cropped, and
+      optionally cropped to the changed region there too (PACK_CROP_TO_CHANGE).
+    A prefix from prompts tells the model how to read what it gets.
+
+    Args:
+        prompt: Prompt written for two separate screenshots
+        before: Frame before the action
+        after: Frame after the action
+        name: Name prefix of the Frames created here
+        focus: Optional ((left, top), (right, bottom)) that a crop must contain, e.g. the bbox of the
+               element acted on, so its numeric tag stays visible
+
+    Returns:
+        (prompt, images, stats); images is None if the pair is unchanged. stats is None if the pair
+        is sent as it is, else a dict with the layout, the sent image sizes, estimated image tokens
+        as sent and as two full images, and the preparation time
+    """
+    pack = configs.get("PACK_IMAGE_PAIRS", True)
+    crops = configs.get("CHANGE_CROPS", False)
+    skip_unchanged = configs.get("SKIP_UNCHANGED", True)
+    pack_crop = pack and configs.get("PACK_CROP_TO_CHANGE", False)
+    if not (pack or crops or skip_unchanged):
+        return prompt, [before, after], None
+    start = time.time()
+    if configs.get("OPTIMIZE_IMAGES", True):
+        max_width, max_height = configs.get("IMAGE_MAX_WIDTH", 512), configs.get("IMAGE_MAX_HEIGHT", 512)
+        max_size = min(max_width, max_height)
+    else:
+        max_width = max_height = max_size = None
+    separate_tokens = _sent_tokens((before, after), max_size)
+
+    # Only a pixel-identical pair is skipped: changes below the crop threshold (a low-contrast toggle,
+    # a selection highlight) can still be the effect of the action
+    if skip_unchanged and np.array_equal(_image(before), _image(after)):
+        return prompt, None, {"layout": "unchanged", "sizes": [], "cropped": False, "image_tokens": 0,
+                              "separate_image_tokens": separate_tokens, "pack_time": time.time() - start}
+    region = changed_region(before, after) if crops or pack_crop else None
+    if region is not None and focus is not None:
+        (left, top), (right, bottom) = focus
+        region = (max(min(region[0], left), 0), max(min(region[1], top), 0),
+                  max(region[2], right), max(region[3], bottom))
+
+    if pack:
+        pack_region = region if pack_crop else None
+        packed, layout = pack_image_pair(before, after, name, max_width, max_height, pack_region)
+        if pack_region is not None:
+            layout = f"{layout}, cropped to change"
+        prefix = prompts.packed_crop_prefix if pack_region is not None else prompts.packed_pair_prefix
+        plan = ([packed], layout, prefix, pack_region is not None)
+    else:
+        plan = ([before, after], None, "", False)
+
+    height, width = _image(before).shape[:2]
+    if crops and region is not None and \
+            (region[2] - region[0]) * (region[3] - region[1]) <= MAX_CROP_FRACTION * width * height:
+        crop_size = configs.get("CHANGE_CROP_MAX_SIZE", 768)
+        images = [change_thumbnail(after, region, configs.get("CHANGE_THUMBNAIL_SIZE", 256), f"{name}_context")]
+        if pack:
+            packed, layout = pack_image_pair(before, after, f"{name}_change", crop_size, crop_size, region)
+            packed.max_size = crop_size
+            images.append(packed)
+            crop_plan = (images, f"change crops, {layout}", prompts.packed_change_crops_prefix, True)
+        else:
+            left, top, right, bottom = region
+            images += [Frame(_image(frame)[top:bottom, left:right], f"{name}_{suffix}", max_size=crop_size)
+                       for frame, suffix in ((before, "before_change"), (after, "after_change"))]
+            crop_plan = (images, "change crops", prompts.change_crops_prefix, True)
+        # The crops are sent sharper than the downscaled screens, which must not make the call dearer
+        if _sent_tokens(crop_plan[0], max_size) <= _sent_tokens(plan[0], max_size):
+            plan = crop_plan
+
+    images, layout, prefix, cropped = plan
+    if layout is None:
+        return prompt, images, None
+    sizes = [list(_sent_size(_image(img), getattr(img, "max_size", None) or max_size)) for img in images]
+    stats = {
+        "layout": layout,
+        "sizes": sizes,
+        "cropped": cropped,
+        "image_tokens": _sent_tokens(images, max_size),
+        "separate_image_tokens": separate_tokens,
+        "pack_time": time.time() - start,
+    }
+    return prefix + prompt, images, stats
+
+
+def format_pack_stats(stats):
+    """One-line summary of prepare_image_pair stats for logs and reports"""
+    if stats["layout"] == "unchanged":
+        return f"Screenshots identical, no images sent (~{stats['separate_image_tokens']} image tokens saved)"
+    saved = stats["separate_image_tokens"] - stats["image_tokens"]
+    sizes = " + ".join(f"{width}x{height}" for width, height in stats["sizes"])
+    return f"Sent {stats['layout']} {sizes}: ~{stats['image_tokens']} image tokens vs " \
+           f"~{stats['separate_image_tokens']} for two images ({saved} saved), " \
+           f"prepared in {stats['pack_time'] * 1000:.1f} ms"
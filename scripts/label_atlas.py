@@ -0,0 +1,130 @@
+import cv2
+import numpy as np
+
+# Tag colours in BGR. Record mode colours tags by the element's attribute.
+LIGHT_SCHEME = {"background": (10, 10, 10), "text": (250, 250, 255)}
+DARK_SCHEME = {"background": (250, 250, 255), "text": (10, 10, 10)}
+RECORD_SCHEME = {"background": {"clickable": (0, 0, 250), "focusable": (250, 0, 0), "other": (0, 250, 0)},
+                 "text": (250, 250, 255)}
+
+
+class LabelAtlas:
+    """
+    Numeric element tags rasterized once per process and composited onto screenshots in one pass.
+
+    A tag is the label text on a half-transparent box, laid out like pyshine.putBText (box padded
+    by `padding` around the text, text baseline at the bottom of the text area). For every label and
+    colour scheme the atlas keeps a sprite: the weight the screenshot keeps under each tag pixel and
+    the pre-blended box and text colour to add on top. render() cuts the region under every tag out
+    of the frame, composites all tags of the same size as one stacked multiply-add, and writes the
+    regions back, instead of one crop / blend / putText round per element.
+
+    Where tags overlap, the later tag is drawn on top of the earlier one instead of being blended
+    over it. Tags crossing the image border are clipped.
+    """
+    def __init__(self, font=cv2.FONT_HERSHEY_DUPLEX, font_scale=1, thickness=2, padding=10, alpha=0.5):
+        self.font = font
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self.padding = padding
+        self.alpha = alpha
+        self.coverage = {}
+        self.sprites = {}
+
+    def text_coverage(self, label):
+        """
+        Anti-aliased text coverage of a tag, including its padding.
+
+        Returns:
+            float32 array in 0-1, shape (text height + 2 * padding, text width + 2 * padding)
+        """
+        coverage = self.coverage.get(label)
+        if coverage is None:
+            (width, height), _ = cv2.getTextSize(label, self.font, fontScale=self.font_scale, thickness=self.thickness)
+            mask = np.zeros((height + 2 * self.padding, width + 2 * self.padding), dtype=np.uint8)
+            cv2.putText(mask, label, (self.padding, self.padding + height), self.font, fontScale=self.font_scale,
+                        color=255, thickness=self.thickness)
+            coverage = mask.astype(np.float32)[..., None] / 255
+            self.coverage[label] = coverage
+        return coverage
+
+    def sprite(self, label, background, text_color):
+        """
+        Pre-blended tag for one colour scheme; a pixel of the tagged image is
+        screenshot * weight / 255 + base.
+
+        Args:
+            background: BGR box colour
+            text_color: BGR text colour
+
+        Returns:
+            (weight, base) uint8 arrays of shape (height, width, 3)
+        """
+        key = (label, tuple(background), tuple(text_color))
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            coverage = self.text_coverage(label)
+            kept = self.alpha * (1 - coverage)
+            base = (1 - self.alpha) * (1 - coverage) * np.float32(background) + coverage * np.float32(text_color)
+            weight = np.broadcast_to(np.rint(kept * 255), base.shape)
+            sprite = (weight.astype(np.uint8), np.rint(base).astype(np.uint8))
+            self.sprites[key] = sprite
+        return sprite
+
+    def render(self, image, labels, positions, backgrounds, text_colors):
+        """
+        Draw tags onto image in place.
+
+        Args:
+            image: BGR ndarray
+            labels: Tag strings
+            positions: (x, y) of the top-left corner of each tag's text area
+            backgrounds: BGR box colour per tag, or one colour for all
+            text_colors: BGR text colour per tag, or one colour for all
+
+        Returns:
+            image
+        """
+        height, width = image.shape[:2]
+        if backgrounds and isinstance(backgrounds[0], int):
+            backgrounds = [backgrounds] * len(labels)
+        if text_colors and isinstance(text_colors[0], int):
+            text_colors = [text_colors] * len(labels)
+        # Tags are grouped by (clipped) size, so each group stacks into one array
+        groups = {}
+        for index, (label, (x, y), background, text_color) in enumerate(zip(labels, positions, backgrounds,
+                                                                             text_colors)):
+            weight, base = self.sprite(label, background, text_color)
+            x0, y0 = x - self.padding, y - self.padding
+            cx0, cy0 = max(x0, 0), max(y0, 0)
+            cx1, cy1 = min(x0 + weight.shape[1], width), min(y0 + weight.shape[0], height)
+            if cx0 >= cx1 or cy0 >= cy1:
+                continue
+            if (cy1 - cy0, cx1 - cx0) != weight.shape[:2]:
+                weight = weight[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0]
+                base = base[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0]
+            groups.setdefault((cy1 - cy0, cx1 - cx0), []).append((index, (cy0, cy1, cx0, cx1), weight, base))
+
+        tagged = []
+        for (tag_height, tag_width), group in groups.items():
+            shape = (len(group) * tag_height, tag_width, 3)
+            regions = np.stack([image[cy0:cy1, cx0:cx1] for _, (cy0, cy1, cx0, cx1), _, _ in group]).reshape(shape)
+            weights = np.stack([weight for _, _, weight, _ in group]).reshape(shape)
+            bases = np.stack([base for _, _, _, base in group]).reshape(shape)
+            result = cv2.add(cv2.multiply(regions, weights, scale=1 / 255), bases)
+            tagged += zip(group, result.reshape(len(group), tag_height, tag_width, 3))
+        # Written back in label order, so later tags end up on top
+        for (_, (cy0, cy1, cx0, cx1), _, _), tile in sorted(tagged, key=lambda t: t[0][0]):
+            image[cy0:cy1, cx0:cx1] = tile
+        return image
+
+
+_atlas = None
+
+
+def get_label_atlas():
+    """Process-wide atlas, so tags are rasterized once"""
+    global _atlas
+    if _atlas is None:
+        _atlas = LabelAtlas()
+    return _atlas
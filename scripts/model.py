@@ -1,3 +1,4 @@
+import asyncio
 import re
 import time
 from abc import abstractmethod
@@ -7,7 +8,8 @@ import requests
 import ollama
 
 try:
-    from litellm import completion
+    import litellm
+    from litellm import acompletion, completion, stream_chunk_builder
     LITELLM_AVAILABLE = True
 except ImportError:
     LITELLM_AVAILABLE = False
@@ -18,7 +20,378 @@ try:
 except ImportError:
     PSUTIL_AVAILABLE = False
 
-from utils import print_with_color, encode_image, optimize_image
+from config import get_settings
+from rate_limiter import estimate_tokens, get_rate_limiter, parse_retry_after
+from response_cache import get_response_cache
+from retry_policy import backoff_delay, get_circuit_breaker, is_retryable_status
+from utils import print_with_color, prepare_model_image, get_payload_cache
+
+configs = get_settings()
+
+
+def with_image_cache_stats(get_response, prompt, images):
+    """Call get_response and add the image payload cache hits/misses of this request to its metadata"""
+    cache = get_payload_cache()
+    hits, misses = cache.hits, cache.misses
+    status, rsp, metadata = get_response(prompt, images)
+    metadata["image_cache_hits"] = cache.hits - hits
+    metadata["image_cache_misses"] = cache.misses - misses
+    return status, rsp, metadata
+
+
+async def awith_image_cache_stats(aget_response, prompt, images):
+    """
+    Async counterpart of with_image_cache_stats. The cache counters are process-wide, so with
+    several requests in flight the numbers of one request can include another's.
+    """
+    cache = get_payload_cache()
+    hits, misses = cache.hits, cache.misses
+    status, rsp, metadata = await aget_response(prompt, images)
+    metadata["image_cache_hits"] = cache.hits - hits
+    metadata["image_cache_misses"] = cache.misses - misses
+    return status, rsp, metadata
+
+
+def _cached_response(model, prompt, images):
+    """
+    Look a request up in the response cache.
+
+    Returns:
+        (cache, key, hit): cache and key are None if the request is not cacheable; hit is the
+        (success, response_text, metadata) to return, or None
+    """
+    cache = get_response_cache(configs)
+    if cache is None or model.temperature != 0:
+        return None, None, None
+    start = time.time()
+    image_settings = [configs.get(key) for key in ("OPTIMIZE_IMAGES", "IMAGE_MAX_WIDTH", "IMAGE_MAX_HEIGHT",
+                                                   "IMAGE_QUALITY")]
+    key = cache.key(f"{model.provider}/{model.model}", [model.temperature, model.max_tokens, image_settings],
+                    prompt, images)
+    cached = cache.get(key)
+    if cached is None:
+        return cache, key, None
+    rsp, metadata = cached
+    metadata.update(cache_hit=True, cached_response_time=metadata["response_time"],
+                    response_time=time.time() - start, image_cache_hits=0, image_cache_misses=0)
+    print_with_color(f"✓ Cached {model.provider} response reused ({metadata['cached_response_time']:.2f}s saved)",
+                     "green")
+    return cache, key, (True, rsp, metadata)
+
+
+def _store_response(model, cache, key, result):
+    status, rsp, metadata = result
+    metadata["cache_hit"] = False
+    if status:
+        cache.put(key, f"{model.provider}/{model.model}", rsp, metadata)
+    return result
+
+
+def with_response_cache(model, get_response, prompt, images):
+    """
+    Call get_response unless the response cache (RESPONSE_CACHE, opt-in) already holds the answer.
+
+    Only deterministic requests (temperature 0) are cached, and only successful responses are stored.
+    metadata["cache_hit"] tells where the response came from; on a hit, response_time is the lookup
+    time and the original request's time is kept as cached_response_time.
+    """
+    cache, key, hit = _cached_response(model, prompt, images)
+    if hit is not None:
+        return hit
+    if cache is None:
+        return get_response(prompt, images)
+    return _store_response(model, cache, key, get_response(prompt, images))
+
+
+async def awith_response_cache(model, aget_response, prompt, images):
+    """Async counterpart of with_response_cache"""
+    cache, key, hit = _cached_response(model, prompt, images)
+    if hit is not None:
+        return hit
+    if cache is None:
+        return await aget_response(prompt, images)
+    return _store_response(model, cache, key, await aget_response(prompt, images))
+
+
+def with_rate_limit(model, get_response, prompt, images):
+    """
+    Call get_response once the provider's RateLimiter lets the request through (RATE_LIMIT), and
+    settle the limiter with the tokens the response used. metadata["rate_limit_wait"] is the time
+    the request waited.
+    """
+    limiter = get_rate_limiter(model.provider, configs)
+    if limiter is None:
+        return get_response(prompt, images)
+    estimated = estimate_tokens(prompt, images, model.max_tokens)
+    waited = limiter.acquire(estimated)
+    try:
+        result = get_response(prompt, images)
+    except BaseException:
+        limiter.refund(estimated)
+        raise
+    return _settle_rate_limit(model, limiter, estimated, waited, result)
+
+
+async def awith_rate_limit(model, aget_response, prompt, images):
+    """Async counterpart of with_rate_limit"""
+    limiter = get_rate_limiter(model.provider, configs)
+    if limiter is None:
+        return await aget_response(prompt, images)
+    estimated = estimate_tokens(prompt, images, model.max_tokens)
+    waited = await limiter.aacquire(estimated)
+    try:
+        result = await aget_response(prompt, images)
+    except BaseException:
+        limiter.refund(estimated)
+        raise
+    return _settle_rate_limit(model, limiter, estimated, waited, result)
+
+
+def _settle_rate_limit(model, limiter, estimated, waited, result):
+    status, rsp, metadata = result
+    if waited >= 1:
+        print_with_color(f"Waited {waited:.1f}s for the {model.provider} rate limit", "yellow")
+    if status:
+        limiter.record(estimated, metadata.get("total_tokens", 0))
+    else:
+        # A failed request generated nothing; keeping its max_tokens reservation would starve the next ones
+        limiter.refund(estimated)
+    metadata["rate_limit_wait"] = waited
+    return status, rsp, metadata
+
+
+def observe_rate_limit(provider, headers, status_code=None, retry_after=None):
+    """
+    Pass a response's rate limit headers to the provider's limiter; a 429 blocks the provider for
+    its Retry-After (or a backoff).
+
+    Returns:
+        Seconds the provider is blocked for, or None if the response was not rate limited
+    """
+    limiter = get_rate_limiter(provider, configs)
+    if limiter is None:
+        return None
+    headers = {key.lower(): value for key, value in (headers or {}).items()}
+    limiter.observe_headers(headers)
+    if status_code != 429:
+        return None
+    if retry_after is None:
+        retry_after = parse_retry_after(headers.get("retry-after", headers.get("llm_provider-retry-after")))
+    blocked = limiter.penalize(retry_after)
+    print_with_color(f"{provider} rate limit hit, requests paused for {blocked:.1f}s", "yellow")
+    return blocked
+
+
+def _failover_step(models, model, attempt, result, attempts):
+    """
+    Bookkeeping after one attempt of with_failover / awith_failover.
+
+    Returns:
+        "done", "next" (move on to the next model) or the seconds to wait before retrying
+    """
+    status, rsp, metadata = result
+    attempts.append({"provider": model.provider, "model": model.model, "attempt": attempt + 1,
+                     "latency": metadata.get("response_time", 0), "rate_limit_wait": metadata.get("rate_limit_wait", 0),
+                     "error": None if status else rsp})
+    breaker = get_circuit_breaker(model.provider, configs)
+    if status:
+        breaker.record_success()
+        if model is not models[0]:
+            print_with_color(f"✓ Response from fallback {model.provider} ({model.model})", "green")
+        return "done"
+    # Only outages count towards the circuit: a bad request or an auth error says nothing about the
+    # provider's health, and a 429 is already held back by the rate limiter
+    if not metadata.get("retryable", False) or "retry_after" in metadata:
+        breaker.abandon()
+    elif breaker.record_failure():
+        print_with_color(f"{model.provider} failed {breaker.failures} times in a row, skipping it for "
+                         f"{breaker.cooldown:.0f}s", "red")
+    if not metadata.get("retryable", False) or attempt >= configs.get("MAX_RETRIES", 3) \
+            or breaker.state != "closed":
+        return "next"
+    # After a 429 the rate limiter already holds the request back for the provider's Retry-After
+    if "retry_after" in metadata:
+        delay = 0.0
+    else:
+        delay = backoff_delay(attempt, configs.get("RETRY_BASE_DELAY", 1.0), configs.get("RETRY_MAX_DELAY", 30.0))
+    print_with_color(f"Retrying {model.provider} request ({attempt + 2}/{configs.get('MAX_RETRIES', 3) + 1}) "
+                     f"in {delay:.1f}s", "yellow")
+    return delay
+
+
+def _failover_result(models, result, attempts):
+    if result is None:
+        # Every circuit was open, nothing was sent
+        metadata = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "response_time": 0.0,
+                    "provider": models[0].provider, "model": models[0].model, "error": "circuit open"}
+        result = (False, "All providers are failing, requests paused by the circuit breakers", metadata)
+    result[2]["attempts"] = attempts
+    return result
+
+
+def with_failover(models, request, prompt, images):
+    """
+    Call request(model, prompt, images) on the first model whose provider responds.
+
+    Failures that can pass on a retry (timeouts, connection errors, 429, 5xx; metadata["retryable"])
+    are retried up to MAX_RETRIES times with jittered exponential backoff, then the next model of the
+    chain is tried. Providers whose circuit breaker is open are skipped. metadata["attempts"] lists
+    every attempt with its provider, model, latency and error.
+    """
+    attempts = []
+    result = None
+    for model in models:
+        breaker = get_circuit_breaker(model.provider, configs)
+        attempt = 0
+        while breaker.allow():
+            try:
+                result = request(model, prompt, images)
+            except BaseException:
+                breaker.abandon()
+                raise
+            step = _failover_step(models, model, attempt, result, attempts)
+            if step == "done":
+                return _failover_result(models, result, attempts)
+            if step == "next":
+                break
+            time.sleep(step)
+            attempt += 1
+    return _failover_result(models, result, attempts)
+
+
+async def awith_failover(models, arequest, prompt, images):
+    """Async counterpart of with_failover"""
+    attempts = []
+    result = None
+    for model in models:
+        breaker = get_circuit_breaker(model.provider, configs)
+        attempt = 0
+        while breaker.allow():
+            try:
+                result = await arequest(model, prompt, images)
+            except BaseException:
+                # Also a cancelled task (e.g. the timeout of aget_model_response)
+                breaker.abandon()
+                raise
+            step = _failover_step(models, model, attempt, result, attempts)
+            if step == "done":
+                return _failover_result(models, result, attempts)
+            if step == "next":
+                break
+            await asyncio.sleep(step)
+            attempt += 1
+    return _failover_result(models, result, attempts)
+
+
+_provider_semaphores = {}
+
+
+def provider_semaphore(provider):
+    """
+    Semaphore bounding the requests in flight to one provider from the running event loop, sized by
+    MAX_CONCURRENT_REQUESTS.
+    """
+    key = (provider, asyncio.get_running_loop())
+    semaphore = _provider_semaphores.get(key)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(configs.get("MAX_CONCURRENT_REQUESTS", 4))
+        _provider_semaphores[key] = semaphore
+    return semaphore
+
+
+# Fields of the explore and grid responses, in the order the prompts ask for them
+EXPLORE_FIELDS = ("Observation", "Thought", "Action", "Summary")
+
+
+class StreamParser:
+    """
+    Incremental parser of a streamed response in the "<Field>: <text>" line format of the prompts.
+
+    A field counts as complete once the newline that ends its first line has arrived, i.e. when
+    parse_explore_rsp / parse_grid_rsp would already extract the same text from the full response.
+    """
+    def __init__(self, fields):
+        self.fields = fields
+        self.text = ""
+        self.complete = set()
+
+    def feed(self, text):
+        """Append streamed text; returns True once every field is complete"""
+        self.text += text
+        # A field line can only be completed by a newline
+        if "\n" in text:
+            for field in self.fields:
+                if field not in self.complete and re.search(rf"{field}: .*?\n", self.text):
+                    self.complete.add(field)
+        return self.done
+
+    @property
+    def done(self):
+        return len(self.complete) == len(self.fields)
+
+
+def close_stream(stream):
+    """Close a streamed response; dropping the connection makes the provider stop generating"""
+    for target in (stream, getattr(stream, "completion_stream", None)):
+        close = getattr(target, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                pass
+
+
+def read_stream(stream, fields, start_time, chunk_text):
+    """
+    Read a streamed completion, feeding its text into a StreamParser.
+
+    With STREAM_EARLY_STOP the stream is closed as soon as all fields are complete, instead of
+    waiting for the model to finish (reasoning models often keep going after the Summary line).
+
+    Args:
+        stream: Iterator of response chunks
+        fields: Field names the response must contain, e.g. EXPLORE_FIELDS
+        start_time: Time the request was started
+        chunk_text: Function returning the (content, thinking) text of a chunk
+
+    Returns:
+        (chunks, stream_metadata) with the chunks received and the "ttft" (time to first token,
+        thinking included), "time_to_action" (time until the Action line was complete; None if it
+        never was) and "stopped_early" metadata
+    """
+    parser = StreamParser(fields)
+    early_stop = configs.get("STREAM_EARLY_STOP", True)
+    chunks = []
+    ttft = time_to_action = None
+    stopped = False
+    for chunk in stream:
+        chunks.append(chunk)
+        content, thinking = chunk_text(chunk)
+        if ttft is None and (content or thinking):
+            ttft = time.time() - start_time
+        if not content:
+            continue
+        done = parser.feed(content)
+        if time_to_action is None and "Action" in parser.complete:
+            time_to_action = time.time() - start_time
+        if done and early_stop:
+            stopped = True
+            break
+    if stopped:
+        close_stream(stream)
+        print_with_color(f"Response complete after {time.time() - start_time:.2f}s, generation stopped", "cyan")
+    return chunks, {"streamed": True, "ttft": ttft, "time_to_action": time_to_action, "stopped_early": stopped}
+
+
+def litellm_chunk_text(chunk):
+    if not chunk.choices:
+        return "", ""
+    delta = chunk.choices[0].delta
+    return delta.content or "", getattr(delta, "reasoning_content", None) or ""
+
+
+def ollama_chunk_text(chunk):
+    return chunk.message.content or "", chunk.message.thinking or ""
 
 
 class BaseModel:
@@ -26,10 +399,14 @@ class BaseModel:
         pass
 
     @abstractmethod
-    def get_model_response(self, prompt: str, images: List[str]) -> tuple[bool, str, dict]:
+    def get_model_response(self, prompt: str, images: List[str], fields: tuple = None) -> tuple[bool, str, dict]:
         """
         Get model response with metadata.
 
+        With STREAM_RESPONSES on, a request that names the fields its response must contain (e.g.
+        EXPLORE_FIELDS) is streamed, and metadata gets the "streamed", "ttft", "time_to_action"
+        and "stopped_early" entries of read_stream().
+
         Returns:
             tuple: (success, response_text, metadata)
             - success: bool indicating if request was successful
@@ -41,11 +418,53 @@ class BaseModel:
                     "total_tokens": int,
                     "response_time": float (seconds),
                     "provider": str,
-                    "model": str
+                    "model": str,
+                    "cache_hit": bool (only when RESPONSE_CACHE applies to the request),
+                    "attempts": list (OpenAIModel: provider, model, latency and error of every attempt)
                 }
         """
         pass
 
+    async def aget_model_response(self, prompt: str, images: List[str], timeout: float = None) -> tuple[bool, str, dict]:
+        """
+        Async counterpart of get_model_response, with the same (success, response_text, metadata) contract.
+
+        Requests to one provider wait for one of its MAX_CONCURRENT_REQUESTS slots (cached responses
+        do not). Cancelling the awaiting task cancels the request and frees its slot; a backend that
+        runs in a worker thread (legacy requests) finishes in the background and its result is dropped.
+
+        Args:
+            prompt: Text prompt
+            images: List of file paths or in-memory Frames
+            timeout: Optional seconds after which the request is cancelled and reported as failed
+
+        Returns:
+            (success, response_text, metadata)
+        """
+        start_time = time.time()
+        try:
+            return await asyncio.wait_for(awith_response_cache(self, self._arequest, prompt, images), timeout)
+        except asyncio.TimeoutError:
+            response_time = time.time() - start_time
+            print_with_color(f"ERROR: {self.provider} request cancelled after {response_time:.2f}s", "red")
+            metadata = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "response_time": response_time,
+                        "provider": self.provider, "model": self.model, "error": "timeout"}
+            return False, f"{self.provider} request timed out after {timeout}s", metadata
+
+    async def _arequest(self, prompt: str, images: List[str]) -> tuple[bool, str, dict]:
+        return await self._aattempt(prompt, images)
+
+    async def _aattempt(self, prompt: str, images: List[str]) -> tuple[bool, str, dict]:
+        """One request once a concurrency slot and the rate limiter let it through"""
+        async with provider_semaphore(self.provider):
+            return await awith_rate_limit(
+                self, lambda *request: awith_image_cache_stats(self._aget_response, *request), prompt, images)
+
+    @abstractmethod
+    async def _aget_response(self, prompt: str, images: List[str]) -> tuple[bool, str, dict]:
+        """Send one request without caching or concurrency limits"""
+        pass
+
 
 class OpenAIModel(BaseModel):
     """
@@ -63,8 +482,11 @@ class OpenAIModel(BaseModel):
 
     The implementation automatically detects the provider from the model name
     and handles the appropriate API format.
+
+    Failed requests are retried and then handed to the FALLBACK_MODELS chain, see with_failover().
     """
-    def __init__(self, base_url: str, api_key: str, model: str, temperature: float, max_tokens: int):
+    def __init__(self, base_url: str, api_key: str, model: str, temperature: float, max_tokens: int,
+                 fallbacks: list = None):
         super().__init__()
         self.base_url = base_url
         self.api_key = api_key
@@ -84,6 +506,14 @@ class OpenAIModel(BaseModel):
         else:
             print_with_color(f"✓ Model initialized: {model} (Legacy mode - install litellm for better compatibility)", "yellow")
 
+        # Models tried in order when this one keeps failing; without an api_key LiteLLM reads the
+        # provider's usual environment variable (OPENAI_API_KEY, ANTHROPIC_API_KEY, ...)
+        if fallbacks is None:
+            fallbacks = [OpenAIModel(base_url=entry.get("base_url", ""), api_key=entry.get("api_key"),
+                                     model=entry["model"], temperature=temperature, max_tokens=max_tokens, fallbacks=[])
+                         for entry in configs.get("FALLBACK_MODELS") or []]
+        self.fallbacks = fallbacks
+
     def _detect_provider(self, model: str) -> str:
         """Detect the provider from the model name."""
         if model.startswith("openrouter/"):
@@ -111,149 +541,194 @@ class OpenAIModel(BaseModel):
         else:
             return "OpenAI-compatible"
 
-    def get_model_response(self, prompt: str, images: List[str]) -> tuple[bool, str, dict]:
+    def get_model_response(self, prompt: str, images: List[str], fields: tuple = None) -> tuple[bool, str, dict]:
         """
         Get model response using LiteLLM (supports 100+ providers) or fallback to requests.
 
         Args:
             prompt: Text prompt
-            images: List of file paths
+            images: List of file paths or in-memory Frames
+            fields: Optional fields the response must contain; enables streaming (LiteLLM only)
 
         Returns:
             (success, response_text, metadata)
         """
+        def request(prompt, images):
+            return with_failover([self] + self.fallbacks, lambda model, *request: model._attempt(*request, fields),
+                                 prompt, images)
+        return with_response_cache(self, request, prompt, images)
+
+    def _attempt(self, prompt: str, images: List[str], fields: tuple = None) -> tuple[bool, str, dict]:
+        """One attempt on this model, once the rate limiter lets it through"""
         if self.use_litellm:
-            return self._get_response_litellm(prompt, images)
+            def get_response(prompt, images):
+                return self._get_response_litellm(prompt, images, fields)
         else:
-            return self._get_response_legacy(prompt, images)
+            get_response = self._get_response_legacy
+        return with_rate_limit(self, lambda *request: with_image_cache_stats(get_response, *request), prompt, images)
 
-    def _get_response_litellm(self, prompt: str, images: List[str]) -> tuple[bool, str, dict]:
-        """Get response using LiteLLM (supports all modern providers)."""
+    async def _arequest(self, prompt: str, images: List[str]) -> tuple[bool, str, dict]:
+        return await awith_failover([self] + self.fallbacks, lambda model, *request: model._aattempt(*request),
+                                    prompt, images)
+
+    async def _aget_response(self, prompt: str, images: List[str]) -> tuple[bool, str, dict]:
+        if not self.use_litellm:
+            # requests has no async API; the call runs in a worker thread
+            return await asyncio.to_thread(self._get_response_legacy, prompt, images)
         start_time = time.time()
+        # Image encoding is CPU work, keep it off the event loop
+        completion_params = await asyncio.to_thread(self._litellm_params, prompt, images)
+        try:
+            response = await acompletion(**completion_params)
+            return self._litellm_result(response, start_time)
+        except Exception as e:
+            return self._litellm_error(e, start_time)
 
-        # Optimize images before encoding
-        optimized_images = []
-        for img_path in images:
-            optimized_path = optimize_image(img_path)
-            optimized_images.append(optimized_path)
+    def _get_response_litellm(self, prompt: str, images: List[str], fields: tuple = None) -> tuple[bool, str, dict]:
+        """Get response using LiteLLM (supports all modern providers)."""
+        start_time = time.time()
+        completion_params = self._litellm_params(prompt, images)
+        try:
+            if fields and configs.get("STREAM_RESPONSES", False):
+                stream = completion(**completion_params, stream=True)
+                chunks, stream_metadata = read_stream(stream, fields, start_time, litellm_chunk_text)
+                # Rebuilds the full response; usage is counted locally if the stream did not carry it
+                response = stream_chunk_builder(chunks, messages=completion_params["messages"])
+                status, rsp, metadata = self._litellm_result(response, start_time)
+                metadata.update(stream_metadata)
+                return status, rsp, metadata
+            # LiteLLM automatically handles different provider formats
+            response = completion(**completion_params)
+            return self._litellm_result(response, start_time)
+        except Exception as e:
+            return self._litellm_error(e, start_time)
 
+    def _litellm_params(self, prompt: str, images: List[str]) -> dict:
+        """Completion parameters of a LiteLLM request, with the images optimized and encoded"""
         # Build content array
         content = [{"type": "text", "text": prompt}]
 
-        # Add images
-        for img in optimized_images:
-            base64_img = encode_image(img)
+        # Add images (optimized and encoded; Frames never touch disk)
+        for img in images:
+            base64_img = prepare_model_image(img)
             content.append({
                 "type": "image_url",
                 "image_url": {
                     "url": f"data:image/jpeg;base64,{base64_img}"
                 }
             })
-            print_with_color(f"Image encoded: {img}", "cyan")
-
-        try:
-            # Prepare completion parameters
-            completion_params = {
-                "model": self.model,
-                "messages": [{"role": "user", "content": content}],
-                "api_key": self.api_key,
-                "temperature": self.temperature,
-                "max_tokens": self.max_tokens,
-                "timeout": 120
-            }
+            print_with_color(f"Image encoded: {getattr(img, 'name', img)}", "cyan")
 
-            # Add base_url if provided (for custom endpoints like OpenRouter)
-            if self.base_url and self.base_url.strip():
-                completion_params["api_base"] = self.base_url
-                print_with_color(f"Using custom base URL: {self.base_url}", "cyan")
+        # Prepare completion parameters
+        completion_params = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": content}],
+            "api_key": self.api_key,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "timeout": 120
+        }
 
-            # LiteLLM automatically handles different provider formats
-            print_with_color(f"Sending request to {self.provider}...", "cyan")
-            response = completion(**completion_params)
+        # Add base_url if provided (for custom endpoints like OpenRouter)
+        if self.base_url and self.base_url.strip():
+            completion_params["api_base"] = self.base_url
+            print_with_color(f"Using custom base URL: {self.base_url}", "cyan")
 
-            # Calculate response time
-            response_time = time.time() - start_time
+        print_with_color(f"Sending request to {self.provider}...", "cyan")
+        return completion_params
 
-            # LiteLLM normalizes all responses to OpenAI format
-            response_content = response.choices[0].message.content
+    def _litellm_result(self, response, start_time: float) -> tuple[bool, str, dict]:
+        # Calculate response time
+        response_time = time.time() - start_time
+        observe_rate_limit(self.provider, (getattr(response, "_hidden_params", None) or {}).get("additional_headers"))
 
-            if not response_content or len(response_content.strip()) == 0:
-                print_with_color("WARNING: Model returned empty content", "yellow")
-                metadata = {
-                    "prompt_tokens": 0,
-                    "completion_tokens": 0,
-                    "total_tokens": 0,
-                    "response_time": response_time,
-                    "provider": self.provider,
-                    "model": self.model
-                }
-                return False, "Model returned empty response", metadata
+        # LiteLLM normalizes all responses to OpenAI format
+        response_content = response.choices[0].message.content
 
-            # Collect usage metadata
-            prompt_tokens = 0
-            completion_tokens = 0
-            total_tokens = 0
-
-            if hasattr(response, 'usage') and response.usage:
-                usage = response.usage
-                prompt_tokens = getattr(usage, 'prompt_tokens', 0)
-                completion_tokens = getattr(usage, 'completion_tokens', 0)
-                total_tokens = getattr(usage, 'total_tokens', prompt_tokens + completion_tokens)
-                print_with_color(
-                    f"Tokens - Prompt: {prompt_tokens}, Completion: {completion_tokens}, Total: {total_tokens}",
-                    "yellow"
-                )
-
-            # Print response time
-            print_with_color(f"✓ {self.provider} response received in {response_time:.2f}s", "green")
-
-            # Build metadata dict
+        if not response_content or len(response_content.strip()) == 0:
+            print_with_color("WARNING: Model returned empty content", "yellow")
             metadata = {
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "total_tokens": total_tokens,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "total_tokens": 0,
                 "response_time": response_time,
                 "provider": self.provider,
                 "model": self.model
             }
+            return False, "Model returned empty response", metadata
 
-            return True, response_content, metadata
+        # Collect usage metadata
+        prompt_tokens = 0
+        completion_tokens = 0
+        total_tokens = 0
 
-        except Exception as e:
-            response_time = time.time() - start_time
-            error_msg = str(e)
-
-            # Provide helpful error messages for common issues
-            if "authentication" in error_msg.lower() or "api_key" in error_msg.lower():
-                print_with_color(f"ERROR: Authentication failed for {self.provider}. Check your API key.", "red")
-            elif "rate_limit" in error_msg.lower() or "quota" in error_msg.lower():
-                print_with_color(f"ERROR: Rate limit or quota exceeded for {self.provider}.", "red")
-            elif "not found" in error_msg.lower() or "404" in error_msg:
-                print_with_color(f"ERROR: Model '{self.model}' not found. Check the model name.", "red")
-            else:
-                print_with_color(f"ERROR: {self.provider} request failed after {response_time:.2f}s: {error_msg}", "red")
+        if hasattr(response, 'usage') and response.usage:
+            usage = response.usage
+            prompt_tokens = getattr(usage, 'prompt_tokens', 0)
+            completion_tokens = getattr(usage, 'completion_tokens', 0)
+            total_tokens = getattr(usage, 'total_tokens', prompt_tokens + completion_tokens)
+            print_with_color(
+                f"Tokens - Prompt: {prompt_tokens}, Completion: {completion_tokens}, Total: {total_tokens}",
+                "yellow"
+            )
 
-            metadata = {
-                "prompt_tokens": 0,
-                "completion_tokens": 0,
-                "total_tokens": 0,
-                "response_time": response_time,
-                "provider": self.provider,
-                "model": self.model,
-                "error": error_msg
-            }
-            return False, f"{self.provider} request failed: {error_msg}", metadata
+        # Print response time
+        print_with_color(f"✓ {self.provider} response received in {response_time:.2f}s", "green")
+
+        # Build metadata dict
+        metadata = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": total_tokens,
+            "response_time": response_time,
+            "provider": self.provider,
+            "model": self.model
+        }
+
+        return True, response_content, metadata
+
+    def _litellm_error(self, e: Exception, start_time: float) -> tuple[bool, str, dict]:
+        response_time = time.time() - start_time
+        error_msg = str(e)
+        status_code = getattr(e, "status_code", None)
+        if status_code is None and "rate_limit" in error_msg.lower():
+            status_code = 429
+        if status_code is None:
+            retryable = isinstance(e, (litellm.Timeout, litellm.APIConnectionError)) or \
+                        "timeout" in error_msg.lower() or "connection" in error_msg.lower()
+        else:
+            retryable = is_retryable_status(status_code)
+        headers = getattr(e, "litellm_response_headers", None) or getattr(getattr(e, "response", None), "headers", None)
+        blocked = observe_rate_limit(self.provider, headers, status_code)
+
+        # Provide helpful error messages for common issues
+        if "authentication" in error_msg.lower() or "api_key" in error_msg.lower():
+            print_with_color(f"ERROR: Authentication failed for {self.provider}. Check your API key.", "red")
+        elif "rate_limit" in error_msg.lower() or "quota" in error_msg.lower():
+            print_with_color(f"ERROR: Rate limit or quota exceeded for {self.provider}.", "red")
+        elif "not found" in error_msg.lower() or "404" in error_msg:
+            print_with_color(f"ERROR: Model '{self.model}' not found. Check the model name.", "red")
+        else:
+            print_with_color(f"ERROR: {self.provider} request failed after {response_time:.2f}s: {error_msg}", "red")
+
+        metadata = {
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0,
+            "response_time": response_time,
+            "provider": self.provider,
+            "model": self.model,
+            "error": error_msg,
+            "retryable": retryable
+        }
+        if blocked is not None:
+            metadata["retry_after"] = blocked
+        return False, f"{self.provider} request failed: {error_msg}", metadata
 
     def _get_response_legacy(self, prompt: str, images: List[str]) -> tuple[bool, str, dict]:
         """Legacy implementation using requests (basic OpenAI compatibility only)."""
         start_time = time.time()
 
-        # Optimize images before encoding
-        optimized_images = []
-        for img_path in images:
-            optimized_path = optimize_image(img_path)
-            optimized_images.append(optimized_path)
-
         content = [
             {
                 "type": "text",
@@ -261,16 +736,16 @@ class OpenAIModel(BaseModel):
             }
         ]
 
-        # Encode images to base64
-        for img in optimized_images:
-            base64_img = encode_image(img)
+        # Optimize and encode images to base64
+        for img in images:
+            base64_img = prepare_model_image(img)
             content.append({
                 "type": "image_url",
                 "image_url": {
                     "url": f"data:image/jpeg;base64,{base64_img}"
                 }
             })
-            print_with_color(f"Image encoded to base64: {img}", "cyan")
+            print_with_color(f"Image encoded to base64: {getattr(img, 'name', img)}", "cyan")
 
         headers = {
             "Content-Type": "application/json",
@@ -287,19 +762,24 @@ class OpenAIModel(BaseModel):
             "temperature": self.temperature,
             "max_tokens": self.max_tokens
         }
+        http_response = None
         try:
-            response = requests.post(self.base_url, headers=headers, json=payload, timeout=120).json()
+            http_response = requests.post(self.base_url, headers=headers, json=payload, timeout=120)
+            observe_rate_limit(self.provider, http_response.headers, http_response.status_code)
+            response = http_response.json()
         except requests.exceptions.Timeout:
             response_time = time.time() - start_time
-            metadata = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "response_time": response_time, "provider": "OpenAI-compatible", "model": self.model}
+            metadata = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "response_time": response_time, "provider": "OpenAI-compatible", "model": self.model, "retryable": True}
             return False, "Request timeout after 120 seconds", metadata
         except requests.exceptions.RequestException as e:
             response_time = time.time() - start_time
-            metadata = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "response_time": response_time, "provider": "OpenAI-compatible", "model": self.model}
+            metadata = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "response_time": response_time, "provider": "OpenAI-compatible", "model": self.model, "retryable": True}
             return False, f"Request failed: {str(e)}", metadata
         except Exception as e:
             response_time = time.time() - start_time
-            metadata = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "response_time": response_time, "provider": "OpenAI-compatible", "model": self.model}
+            # e.g. an HTML error page of a gateway
+            retryable = http_response is not None and is_retryable_status(http_response.status_code)
+            metadata = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "response_time": response_time, "provider": "OpenAI-compatible", "model": self.model, "retryable": retryable}
             return False, f"Failed to parse response: {str(e)}", metadata
 
         # Calculate response time
@@ -307,7 +787,7 @@ class OpenAIModel(BaseModel):
 
         # Check for errors in response
         if "error" in response:
-            metadata = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "response_time": response_time, "provider": "OpenAI-compatible", "model": self.model}
+            metadata = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "response_time": response_time, "provider": "OpenAI-compatible", "model": self.model, "retryable": is_retryable_status(http_response.status_code)}
             return False, response["error"]["message"], metadata
 
         # Check if response has expected structure
@@ -361,24 +841,68 @@ class OllamaModel(BaseModel):
     def __init__(self, model: str, temperature: float, max_tokens: int):
         super().__init__()
         self.model = model
+        self.provider = "Ollama"
         # Ensure temperature is a float and max_tokens is an integer (correct types for Ollama)
         self.temperature = float(temperature)
         self.max_tokens = int(max_tokens)
         print_with_color(f"✓ Ollama Model initialized: {model}", "green")
 
-    def get_model_response(self, prompt: str, images: List[str]) -> tuple[bool, str, dict]:
+    def get_model_response(self, prompt: str, images: List[str], fields: tuple = None) -> tuple[bool, str, dict]:
         """
-        Get model response using Ollama SDK with file paths.
+        Get model response using Ollama SDK.
 
         Args:
             prompt: Text prompt
-            images: List of file paths (NOT base64!)
+            images: List of file paths or in-memory Frames
+            fields: Optional fields the response must contain; enables streaming
 
         Returns:
             (success, response_text, metadata)
         """
+        def request(prompt, images):
+            return with_rate_limit(self, lambda *request: with_image_cache_stats(get_response, *request), prompt,
+                                   images)
+
+        def get_response(prompt, images):
+            return self._get_response(prompt, images, fields)
+        return with_response_cache(self, request, prompt, images)
+
+    def _get_response(self, prompt: str, images: List[str], fields: tuple = None) -> tuple[bool, str, dict]:
+        start_time = time.time()
+        messages, options, usage_before = self._ollama_request(prompt, images)
+        try:
+            if fields and configs.get("STREAM_RESPONSES", False):
+                stream = ollama.chat(model=self.model, messages=messages, options=options, stream=True)
+                chunks, stream_metadata = read_stream(stream, fields, start_time, ollama_chunk_text)
+                print_with_color(f"[DEBUG] ollama.chat stream read ({len(chunks)} chunks)", "cyan")
+                if not chunks:
+                    raise ValueError("Stream ended without a response")
+                # The last chunk carries the response's model; give it the whole text
+                response = chunks[-1]
+                response.message.content = "".join(chunk.message.content or "" for chunk in chunks)
+                response.message.thinking = "".join(chunk.message.thinking or "" for chunk in chunks) or None
+                status, rsp, metadata = self._ollama_result(response, start_time, usage_before, len(images))
+                metadata.update(stream_metadata)
+                return status, rsp, metadata
+            response = ollama.chat(model=self.model, messages=messages, options=options)
+            print_with_color(f"[DEBUG] ollama.chat completed", "cyan")
+            return self._ollama_result(response, start_time, usage_before, len(images))
+        except Exception as e:
+            return self._ollama_error(e, start_time, usage_before)
+
+    async def _aget_response(self, prompt: str, images: List[str]) -> tuple[bool, str, dict]:
         start_time = time.time()
+        # Image encoding and the psutil samples block, keep them off the event loop
+        messages, options, usage_before = await asyncio.to_thread(self._ollama_request, prompt, images)
+        try:
+            response = await ollama.AsyncClient().chat(model=self.model, messages=messages, options=options)
+            print_with_color(f"[DEBUG] ollama.chat completed", "cyan")
+            return await asyncio.to_thread(self._ollama_result, response, start_time, usage_before, len(images))
+        except Exception as e:
+            return await asyncio.to_thread(self._ollama_error, e, start_time, usage_before)
 
+    def _ollama_request(self, prompt: str, images: List[str]) -> tuple[list, dict, tuple]:
+        """Messages and options of an Ollama request, and the (cpu, memory) usage before it"""
         # Measure initial resource usage if psutil is available
         cpu_before = 0
         mem_before = 0
@@ -386,123 +910,104 @@ class OllamaModel(BaseModel):
             cpu_before = psutil.cpu_percent(interval=0.1)
             mem_before = psutil.virtual_memory().percent
 
-        # Optimize images before sending to model
-        optimized_images = []
-        for img_path in images:
-            optimized_path = optimize_image(img_path)
-            optimized_images.append(optimized_path)
+        # Optimize and encode images (cached); the Ollama SDK accepts base64 strings
+        optimized_images = [prepare_model_image(img) for img in images]
 
         # Debug logging
         print_with_color(f"[DEBUG] Prompt length: {len(prompt)} chars", "cyan")
         print_with_color(f"[DEBUG] Images: {len(optimized_images)} files", "cyan")
         print_with_color(f"[DEBUG] Max tokens: {self.max_tokens}", "cyan")
-        for i, img_path in enumerate(optimized_images):
-            import os
-            if os.path.exists(img_path):
-                size_kb = os.path.getsize(img_path) / 1024
-                print_with_color(f"[DEBUG] Image {i+1}: {size_kb:.1f}KB - {img_path}", "cyan")
+        for i, payload in enumerate(optimized_images):
+            print_with_color(f"[DEBUG] Image {i+1}: {len(payload) * 3 / 4 / 1024:.1f}KB - "
+                             f"{getattr(images[i], 'name', images[i])}", "cyan")
+
+        # Images are sent as base64 payloads
+        print_with_color(f"[DEBUG] Calling ollama.chat with model={self.model}", "cyan")
+        # Add system message to prevent thinking mode
+        messages = [
+            {
+                'role': 'system',
+                'content': 'You are a helpful assistant. Provide direct, concise responses without showing your reasoning process.'
+            },
+            {
+                'role': 'user',
+                'content': prompt,
+                'images': optimized_images  # Use optimized images
+            }
+        ]
+        options = {
+            'temperature': self.temperature,
+            'num_predict': self.max_tokens,
+            'num_ctx': 8192,  # Set context window explicitly
+            'top_p': 0.9,  # Reduce randomness
+            'repeat_penalty': 1.5  # Prevent infinite loops in thinking mode
+        }
+        return messages, options, (cpu_before, mem_before)
+
+    @staticmethod
+    def _usage_average(usage_before):
+        if not PSUTIL_AVAILABLE:
+            return 0, 0
+        cpu_before, mem_before = usage_before
+        cpu_after = psutil.cpu_percent(interval=0.1)
+        mem_after = psutil.virtual_memory().percent
+        return (cpu_before + cpu_after) / 2, (mem_before + mem_after) / 2
+
+    def _ollama_result(self, response, start_time: float, usage_before: tuple, image_count: int) -> tuple[bool, str, dict]:
+        # Calculate response time
+        response_time = time.time() - start_time
+
+        # Debug: Print response structure (ChatResponse object, not dict)
+        print_with_color(f"[DEBUG] Response type: {type(response)}", "cyan")
+        print_with_color(f"[DEBUG] Response model: {response.model}", "cyan")
+
+        # Extract content from ChatResponse object
+        content = response.message.content
+
+        # Measure final resource usage
+        cpu_avg, mem_avg = self._usage_average(usage_before)
+
+        # Ollama metadata includes resource usage instead of token counts
+        metadata = {
+            "prompt_tokens": 0,  # Not applicable for Ollama
+            "completion_tokens": 0,  # Not applicable for Ollama
+            "total_tokens": 0,  # Not applicable for Ollama
+            "response_time": response_time,
+            "provider": "Ollama",
+            "model": self.model,
+            "cpu_usage": cpu_avg,
+            "memory_usage": mem_avg
+        }
+
+        # If content is empty, try to use thinking field (qwen3-vl:4b sometimes uses this)
+        if not content or len(content.strip()) == 0:
+            if hasattr(response.message, 'thinking') and response.message.thinking:
+                print_with_color("WARNING: Content empty, using thinking field", "yellow")
+                # Thinking field might be too verbose, skip it
+                print_with_color(f"[DEBUG] Thinking length: {len(response.message.thinking)} chars", "yellow")
+                return False, "Model returned empty content (only thinking field available)", metadata
             else:
-                print_with_color(f"[DEBUG] Image {i+1}: NOT FOUND - {img_path}", "red")
+                print_with_color("WARNING: Model returned empty content", "yellow")
+                print_with_color(f"[DEBUG] Full message: {response.message}", "red")
+                return False, "Model returned empty response", metadata
 
-        try:
-            # Ollama SDK accepts file paths directly!
-            print_with_color(f"[DEBUG] Calling ollama.chat with model={self.model}", "cyan")
-            # Add system message to prevent thinking mode
-            messages = [
-                {
-                    'role': 'system',
-                    'content': 'You are a helpful assistant. Provide direct, concise responses without showing your reasoning process.'
-                },
-                {
-                    'role': 'user',
-                    'content': prompt,
-                    'images': optimized_images  # Use optimized images
-                }
-            ]
-
-            response = ollama.chat(
-                model=self.model,
-                messages=messages,
-                options={
-                    'temperature': self.temperature,
-                    'num_predict': self.max_tokens,
-                    'num_ctx': 8192,  # Set context window explicitly
-                    'top_p': 0.9,  # Reduce randomness
-                    'repeat_penalty': 1.5  # Prevent infinite loops in thinking mode
-                }
-            )
-            print_with_color(f"[DEBUG] ollama.chat completed", "cyan")
+        # Print summary
+        print_with_color(f"Response time: {response_time:.2f}s", "yellow")
+        print_with_color(f"Response length: {len(content)} chars", "yellow")
+        print_with_color(f"Images sent: {image_count} images (base64)", "cyan")
 
-            # Calculate response time
-            response_time = time.time() - start_time
+        if PSUTIL_AVAILABLE:
+            print_with_color(f"Resource usage - CPU: {cpu_avg:.1f}%, Memory: {mem_avg:.1f}%", "yellow")
 
-            # Debug: Print response structure (ChatResponse object, not dict)
-            print_with_color(f"[DEBUG] Response type: {type(response)}", "cyan")
-            print_with_color(f"[DEBUG] Response model: {response.model}", "cyan")
-
-            # Extract content from ChatResponse object
-            content = response.message.content
-
-            # If content is empty, try to use thinking field (qwen3-vl:4b sometimes uses this)
-            if not content or len(content.strip()) == 0:
-                cpu_after = psutil.cpu_percent(interval=0.1) if PSUTIL_AVAILABLE else 0
-                mem_after = psutil.virtual_memory().percent if PSUTIL_AVAILABLE else 0
-                cpu_avg = (cpu_before + cpu_after) / 2 if PSUTIL_AVAILABLE else 0
-                mem_avg = (mem_before + mem_after) / 2 if PSUTIL_AVAILABLE else 0
-                metadata = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "response_time": response_time, "provider": "Ollama", "model": self.model, "cpu_usage": cpu_avg, "memory_usage": mem_avg}
-                if hasattr(response.message, 'thinking') and response.message.thinking:
-                    print_with_color("WARNING: Content empty, using thinking field", "yellow")
-                    # Thinking field might be too verbose, skip it
-                    print_with_color(f"[DEBUG] Thinking length: {len(response.message.thinking)} chars", "yellow")
-                    return False, "Model returned empty content (only thinking field available)", metadata
-                else:
-                    print_with_color("WARNING: Model returned empty content", "yellow")
-                    print_with_color(f"[DEBUG] Full message: {response.message}", "red")
-                    return False, "Model returned empty response", metadata
-
-            # Measure final resource usage
-            cpu_after = 0
-            mem_after = 0
-            cpu_avg = 0
-            mem_avg = 0
-
-            if PSUTIL_AVAILABLE:
-                cpu_after = psutil.cpu_percent(interval=0.1)
-                mem_after = psutil.virtual_memory().percent
-                cpu_avg = (cpu_before + cpu_after) / 2
-                mem_avg = (mem_before + mem_after) / 2
-
-            # Print summary
-            print_with_color(f"Response time: {response_time:.2f}s", "yellow")
-            print_with_color(f"Response length: {len(content)} chars", "yellow")
-            print_with_color(f"Images sent: {len(images)} file paths (no base64 encoding)", "cyan")
-
-            if PSUTIL_AVAILABLE:
-                print_with_color(f"Resource usage - CPU: {cpu_avg:.1f}%, Memory: {mem_avg:.1f}%", "yellow")
-
-            # Ollama metadata includes resource usage instead of token counts
-            metadata = {
-                "prompt_tokens": 0,  # Not applicable for Ollama
-                "completion_tokens": 0,  # Not applicable for Ollama
-                "total_tokens": 0,  # Not applicable for Ollama
-                "response_time": response_time,
-                "provider": "Ollama",
-                "model": self.model,
-                "cpu_usage": cpu_avg if PSUTIL_AVAILABLE else 0,
-                "memory_usage": mem_avg if PSUTIL_AVAILABLE else 0
-            }
+        return True, content, metadata
 
-            return True, content, metadata
+    def _ollama_error(self, e: Exception, start_time: float, usage_before: tuple) -> tuple[bool, str, dict]:
+        response_time = time.time() - start_time
+        cpu_avg, mem_avg = self._usage_average(usage_before)
+        print_with_color(f"ERROR: Ollama request failed after {response_time:.2f}s: {e}", "red")
+        metadata = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "response_time": response_time, "provider": "Ollama", "model": self.model, "cpu_usage": cpu_avg, "memory_usage": mem_avg}
+        return False, f"Ollama request failed: {str(e)}", metadata
 
-        except Exception as e:
-            response_time = time.time() - start_time
-            cpu_after = psutil.cpu_percent(interval=0.1) if PSUTIL_AVAILABLE else 0
-            mem_after = psutil.virtual_memory().percent if PSUTIL_AVAILABLE else 0
-            cpu_avg = (cpu_before + cpu_after) / 2 if PSUTIL_AVAILABLE else 0
-            mem_avg = (mem_before + mem_after) / 2 if PSUTIL_AVAILABLE else 0
-            print_with_color(f"ERROR: Ollama request failed after {response_time:.2f}s: {e}", "red")
-            metadata = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "response_time": response_time, "provider": "Ollama", "model": self.model, "cpu_usage": cpu_avg, "memory_usage": mem_avg}
-            return False, f"Ollama request failed: {str(e)}", metadata
 
 def parse_explore_rsp(rsp):
     try:
@@ -40,6 +40,30 @@ understanding of the function of the UI element derived from the given screensho
 because the function of a UI element can be flexible. In this case, your generated description should combine both.
 Old documentation of this UI element: <old_doc>"""
 
+packed_pair_prefix = """The two screenshots mentioned below are combined into one image: the screenshot before the action 
+is on the left (or on top) under the header BEFORE, the screenshot after the action is on the right (or at the bottom) 
+under the header AFTER. The "first screenshot" is the BEFORE one and the "second screenshot" is the AFTER one.
+"""
+
+packed_crop_prefix = """The two screenshots mentioned below are combined into one image and cropped to the part of the 
+screen that changed, which is the same part in both: the crop before the action is on the left (or on top) under the 
+header BEFORE, the crop after the action is on the right (or at the bottom) under the header AFTER. The rest of the 
+screen did not change. The "first screenshot" is the BEFORE one and the "second screenshot" is the AFTER one.
+"""
+
+change_crops_prefix = """Instead of two full screenshots you are given three images. The first one is a small 
+thumbnail of the whole screen after the action, with the part of the screen that changed outlined in red. The second 
+and third images show that part at full resolution, before and after the action; the rest of the screen did not change. 
+The "first screenshot" mentioned below is the second image and the "second screenshot" is the third image.
+"""
+
+packed_change_crops_prefix = """Instead of two full screenshots you are given two images. The first one is a small 
+thumbnail of the whole screen after the action, with the part of the screen that changed outlined in red. The second 
+image shows that part at full resolution before the action on the left (or on top) under the header BEFORE and after 
+the action on the right (or at the bottom) under the header AFTER; the rest of the screen did not change. The "first 
+screenshot" mentioned below is the BEFORE part and the "second screenshot" is the AFTER part.
+"""
+
 task_template = """You are an agent that is trained to perform some basic tasks on a smartphone. You will be given a 
 smartphone screenshot. The interactive UI elements on the screenshot are labeled with numeric tags starting from 1. The 
 numeric tag of each interactive element is located in the center of the element.
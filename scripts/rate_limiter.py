@@ -0,0 +1,278 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Prompt tokens assumed per image before the request is sent (a 512 x 512 image under the tile accounting)
+IMAGE_TOKEN_ESTIMATE = 255
+# Backoff after a 429 that carries no Retry-After header, doubled on every consecutive 429
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+# A lock file older than this is left over from a crashed process
+STALE_LOCK_SECONDS = 10.0
+
+# Rate limit headers of OpenAI-style and Anthropic APIs -> state field
+_HEADERS = {
+    "x-ratelimit-limit-requests": "rpm",
+    "x-ratelimit-limit-tokens": "tpm",
+    "x-ratelimit-remaining-requests": "requests",
+    "x-ratelimit-remaining-tokens": "tokens",
+    "anthropic-ratelimit-requests-limit": "rpm",
+    "anthropic-ratelimit-tokens-limit": "tpm",
+    "anthropic-ratelimit-requests-remaining": "requests",
+    "anthropic-ratelimit-tokens-remaining": "tokens",
+}
+
+
+def estimate_tokens(prompt, images, max_tokens=0):
+    """Rough token cost of a request before it is sent (about 4 characters per token)"""
+    return len(prompt) // 4 + IMAGE_TOKEN_ESTIMATE * len(images) + max_tokens
+
+
+def parse_retry_after(value):
+    """Seconds of a Retry-After header (seconds, or a duration such as "1m30s" / "200ms"), or None"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = re.findall(r"([\d.]+)(ms|s|m|h)", value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+class RateLimiter:
+    """
+    Token buckets for the requests and tokens per minute of one provider.
+
+    Each request reserves one request and an estimate of its tokens before it is sent, waiting
+    until both buckets hold enough; record() then settles the estimate against the usage the
+    provider reported, and refund() returns it if the request failed. A limit of 0 means no limit. The limits adapt at run time: rate limit
+    headers lower the bucket levels to what the provider says is left (and set limits that were
+    not configured), and a 429 blocks the provider until its Retry-After (or an exponential
+    backoff) has passed.
+
+    With state_path the buckets live in a JSON file guarded by a lock file, so every process
+    using the same path (e.g. a fleet of executors on one API key) draws from the same budget.
+    Otherwise they are shared by the threads and event loops of this process.
+    """
+    def __init__(self, name, rpm=0, tpm=0, state_path=None):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.state_path = state_path
+        self.lock = threading.Lock()
+        self.waits = 0
+        self.wait_time = 0.0
+        self._state = None
+        if state_path:
+            os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+
+    def _initial_state(self):
+        return {"requests": float(self.rpm), "tokens": float(self.tpm), "rpm": self.rpm, "tpm": self.tpm,
+                "updated": time.time(), "blocked_until": 0.0, "backoff": 0.0}
+
+    @contextmanager
+    def _locked(self):
+        """Current state, refilled up to now; changes are saved when the block exits"""
+        with self.lock:
+            if not self.state_path:
+                if self._state is None:
+                    self._state = self._initial_state()
+                self._refill(self._state)
+                yield self._state
+                return
+            lock_path = self.state_path + ".lock"
+            self._acquire_file_lock(lock_path)
+            try:
+                try:
+                    with open(self.state_path, "r") as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    state = self._initial_state()
+                # Configured limits win over the ones saved by another process
+                if self.rpm:
+                    state["rpm"] = self.rpm
+                if self.tpm:
+                    state["tpm"] = self.tpm
+                self._refill(state)
+                yield state
+                tmp_path = f"{self.state_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self.state_path)
+            finally:
+                os.remove(lock_path)
+
+    @staticmethod
+    def _acquire_file_lock(lock_path):
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > STALE_LOCK_SECONDS:
+                        os.remove(lock_path)
+                        continue
+                except OSError:
+                    continue
+                time.sleep(0.005)
+
+    @staticmethod
+    def _refill(state):
+        now = time.time()
+        elapsed = max(now - state["updated"], 0.0)
+        state["updated"] = now
+        for level, limit in (("requests", "rpm"), ("tokens", "tpm")):
+            if state[limit]:
+                state[level] = min(state[level] + elapsed * state[limit] / 60, state[limit])
+
+    def reserve(self, tokens):
+        """
+        Take one request and tokens from the buckets if they hold enough.
+
+        Returns:
+            0 if the request may be sent now, else the seconds to wait before trying again
+        """
+        with self._locked() as state:
+            now = time.time()
+            if state["blocked_until"] > now:
+                return state["blocked_until"] - now
+            wait = 0.0
+            if state["rpm"] and state["requests"] < 1:
+                wait = (1 - state["requests"]) * 60 / state["rpm"]
+            if state["tpm"]:
+                # A request larger than the whole bucket only waits for a full bucket
+                needed = min(tokens, state["tpm"])
+                if state["tokens"] < needed:
+                    wait = max(wait, (needed - state["tokens"]) * 60 / state["tpm"])
+            if wait > 0:
+                return wait
+            if state["rpm"]:
+                state["requests"] -= 1
+            if state["tpm"]:
+                state["tokens"] -= tokens
+            return 0.0
+
+    def acquire(self, tokens):
+        """Wait until a request of about tokens tokens may be sent; returns the seconds waited"""
+        start = time.time()
+        while True:
+            wait = self.reserve(tokens)
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        return self._waited(start)
+
+    async def aacquire(self, tokens):
+        """Async counterpart of acquire"""
+        start = time.time()
+        while True:
+            wait = self.reserve(tokens)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        return self._waited(start)
+
+    def _waited(self, start):
+        waited = time.time() - start
+        if waited > 0.001:
+            self.waits += 1
+            self.wait_time += waited
+        return waited
+
+    def record(self, estimated, used):
+        """Settle a request's token estimate against the tokens it actually used (0: unknown)"""
+        with self._locked() as state:
+            state["backoff"] = 0.0
+            if state["tpm"] and used:
+                state["tokens"] -= used - estimated
+
+    def refund(self, estimated):
+        """Give back the token estimate of a request that failed or was cancelled"""
+        with self._locked() as state:
+            if state["tpm"]:
+                state["tokens"] = min(state["tokens"] + estimated, state["tpm"])
+
+    def observe_headers(self, headers):
+        """Adopt the limits and remaining budget a provider reported in its response headers"""
+        if not headers:
+            return
+        values = {}
+        for key, value in headers.items():
+            field = _HEADERS.get(key.lower().replace("llm_provider-", ""))
+            if field is None:
+                continue
+            try:
+                values[field] = float(value)
+            except (TypeError, ValueError):
+                continue
+        if not values:
+            return
+        with self._locked() as state:
+            for level, limit in (("requests", "rpm"), ("tokens", "tpm")):
+                # Configured limits are kept; an unlimited bucket learns the provider's limit
+                if limit in values and not getattr(self, limit):
+                    if not state[limit]:
+                        state[level] = values[limit]
+                    state[limit] = int(values[limit])
+                if level in values and state[limit]:
+                    state[level] = min(state[level], values[level])
+
+    def penalize(self, retry_after=None):
+        """
+        Block the provider after a 429.
+
+        Returns:
+            Seconds until requests are let through again
+        """
+        with self._locked() as state:
+            if retry_after is None:
+                state["backoff"] = min(max(state["backoff"] * 2, BACKOFF_BASE), BACKOFF_MAX)
+                retry_after = state["backoff"]
+            state["blocked_until"] = max(state["blocked_until"], time.time() + retry_after)
+            state["requests"] = min(state["requests"], 0.0)
+        return retry_after
+
+    def summary(self):
+        if not self.waits:
+            return f"{self.name}: no rate limit waits"
+        return f"{self.name}: waited {self.wait_time:.1f}s over {self.waits} requests"
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider, configs):
+    """
+    Shared limiter of a provider, with its RATE_LIMITS entry (or the "default" one).
+
+    Returns:
+        RateLimiter, or None if RATE_LIMIT is off
+    """
+    if not configs.get("RATE_LIMIT", True):
+        return None
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(provider)
+            if limiter is None:
+                limits = configs.get("RATE_LIMITS") or {}
+                limit = limits.get(provider, limits.get("default")) or {}
+                state_dir = configs.get("RATE_LIMIT_STATE_DIR", "")
+                state_path = None
+                if state_dir:
+                    file_name = re.sub(r"[^\w.-]+", "_", provider) + ".json"
+                    state_path = os.path.join(os.path.abspath(state_dir), file_name)
+                limiter = RateLimiter(provider, int(limit.get("rpm", 0)), int(limit.get("tpm", 0)), state_path)
+                _limiters[provider] = limiter
+    return limiter
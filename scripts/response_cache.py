@@ -0,0 +1,194 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from artifacts import Frame, content_digest
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+CREATE INDEX IF NOT EXISTS responses_created ON responses (created);
+"""
+
+
+def image_key(image):
+    """Content hash of a model image: a Frame's pixels (and its max_size), or an image file's bytes"""
+    if isinstance(image, Frame):
+        return f"{image.digest()}:{image.max_size}"
+    with open(image, "rb") as f:
+        return content_digest(f.read())
+
+
+class ResponseCache:
+    """
+    SQLite cache of successful model responses, for deterministic (temperature 0) calls that are
+    repeated byte for byte, e.g. when tasks of the test set are re-run.
+
+    Entries are keyed by a hash of the model, its generation settings, the rendered prompt, the
+    content of every image and the image preparation settings, so a cached answer is only returned
+    for a request that would have sent exactly the same payload. Entries older than max_age seconds
+    are never returned and are deleted on eviction; past max_bytes the least recently used entries
+    go first.
+
+    The database uses WAL mode with a busy timeout, so several processes (e.g. a fleet of executors)
+    can share one file.
+    """
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, max_age=30 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+        self._size = self._total_size()
+
+    @staticmethod
+    def key(model, settings, prompt, images):
+        """
+        Cache key of a request.
+
+        Args:
+            model: Provider and model name, e.g. "OpenAI/gpt-4o"
+            settings: Anything else that changes the response or the payload (temperature, max
+                      tokens, image preparation settings), as a JSON-serializable value
+            prompt: Rendered prompt
+            images: Image paths or Frames, in request order
+
+        Returns:
+            Hex digest
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps([model, settings], sort_keys=True).encode())
+        digest.update(b"\0")
+        digest.update(prompt.encode("utf-8"))
+        for image in images:
+            digest.update(b"\0")
+            digest.update(image_key(image).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Cached (response, metadata) for key, or None.
+
+        A hit refreshes the entry's last use, which keeps it from size-based eviction.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT response, metadata FROM responses WHERE key = ? AND created >= ?",
+                                  (key, now - self.max_age)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return row[0], json.loads(row[1])
+
+    def put(self, key, model, response, metadata):
+        """Store a successful response and its metadata, evicting entries if the cache is over budget"""
+        metadata = json.dumps(metadata)
+        size = len(key) + len(response.encode("utf-8")) + len(metadata)
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (key, model, response, metadata, size, now, now))
+            self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _total_size(self):
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _evict(self):
+        removed = self.db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,)).rowcount
+        # Other processes write to the same file, so the running size is only an estimate
+        self._size = self._total_size()
+        while self._size > self.max_bytes:
+            rows = self.db.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT 64").fetchall()
+            if not rows:
+                break
+            self.db.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key, _ in rows])
+            removed += len(rows)
+            self._size -= sum(size for _, size in rows)
+        self.evictions += removed
+
+    def evict(self):
+        """Delete expired entries and shrink the cache to max_bytes now"""
+        with self.lock:
+            self._evict()
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM responses")
+            self._size = 0
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": entries,
+                "bytes": size}
+
+
+_caches = {}
+
+
+def get_response_cache(configs):
+    """
+    Shared response cache if RESPONSE_CACHE is enabled.
+
+    Returns:
+        ResponseCache, or None when responses are not cached
+    """
+    if not configs.get("RESPONSE_CACHE", False):
+        return None
+    path = os.path.abspath(configs.get("RESPONSE_CACHE_PATH", "./cache/responses.sqlite"))
+    cache = _caches.get(path)
+    if cache is None:
+        cache = ResponseCache(path, configs.get("RESPONSE_CACHE_MB", 256) * 1024 * 1024,
+                              configs.get("RESPONSE_CACHE_MAX_AGE_DAYS", 30) * 24 * 3600)
+        _caches[path] = cache
+    return cache
+
+
+if __name__ == "__main__":
+    from config import get_settings
+    from utils import print_with_color
+
+    arg_desc = "AppAgent - Model Response Cache"
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=arg_desc)
+    parser.add_argument("command", choices=["stats", "evict", "clear"])
+    parser.add_argument("--path", default=None, help="Cache database (default: RESPONSE_CACHE_PATH)")
+    args = vars(parser.parse_args())
+
+    configs = get_settings()
+    path = args["path"] or configs.get("RESPONSE_CACHE_PATH", "./cache/responses.sqlite")
+    if not os.path.exists(path):
+        print_with_color(f"ERROR: No response cache at {path}", "red")
+        sys.exit(1)
+    cache = ResponseCache(path, configs.get("RESPONSE_CACHE_MB", 256) * 1024 * 1024,
+                          configs.get("RESPONSE_CACHE_MAX_AGE_DAYS", 30) * 24 * 3600)
+    if args["command"] == "evict":
+        cache.evict()
+        print_with_color(f"Evicted {cache.evictions} entries", "yellow")
+    elif args["command"] == "clear":
+        cache.clear()
+        print_with_color("Response cache cleared", "yellow")
+    stats = cache.stats()
+    print_with_color(f"{stats['entries']} cached responses, {stats['bytes'] / 1024 ** 2:.1f} MB in {path}", "green")
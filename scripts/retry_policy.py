@@ -0,0 +1,102 @@
+import random
+import threading
+import time
+
+# HTTP statuses worth retrying: request timeout, conflict, rate limit; every 5xx is retried as well
+RETRYABLE_STATUS = (408, 409, 429)
+
+
+def is_retryable_status(status_code):
+    return status_code in RETRYABLE_STATUS or (status_code is not None and status_code >= 500)
+
+
+def backoff_delay(attempt, base, maximum):
+    """
+    Jittered exponential backoff before retry number attempt + 1: a random delay between half and
+    all of base * 2 ** attempt (capped at maximum), so clients that failed together retry apart.
+    """
+    delay = min(base * 2 ** attempt, maximum)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class CircuitBreaker:
+    """
+    Failure tracker of one provider.
+
+    After threshold consecutive failed requests the circuit opens and allow() turns requests away
+    for cooldown seconds, so a provider that is down is skipped (and failover moves on) instead of
+    being retried by every call. Then a single trial request is let through (half-open): success
+    closes the circuit, failure opens it for another cooldown.
+    """
+    def __init__(self, name, threshold=5, cooldown=60.0):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.time() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def allow(self):
+        """Whether a request may be sent to the provider now"""
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.trial:
+                self.trial = True
+                return True
+            return False
+
+    def abandon(self):
+        """
+        Forget a request that says nothing about the provider's health (cancelled, raised, or
+        rejected as invalid), freeing the trial slot
+        """
+        with self.lock:
+            self.trial = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        """
+        Returns:
+            True if this failure opened the circuit
+        """
+        with self.lock:
+            self.failures += 1
+            reopened = self.trial
+            self.trial = False
+            if reopened or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at = time.time()
+                return True
+            return False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider, configs):
+    """Process-wide circuit breaker of a provider, with CIRCUIT_BREAKER_THRESHOLD / _COOLDOWN"""
+    breaker = _breakers.get(provider)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(provider)
+            if breaker is None:
+                breaker = CircuitBreaker(provider, configs.get("CIRCUIT_BREAKER_THRESHOLD", 5),
+                                         configs.get("CIRCUIT_BREAKER_COOLDOWN", 60.0))
+                _breakers[provider] = breaker
+    return breaker
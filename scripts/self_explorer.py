@@ -12,11 +12,15 @@ import time
 
 import cv2
 import prompts
-from config import load_config
-from and_controller import list_all_devices, AndroidController, traverse_tree, start_emulator, list_available_emulators, stop_emulator
+from config import get_settings, override_settings
+from and_controller import list_all_devices, AndroidController, extract_elements, start_emulator, list_available_emulators, stop_emulator
 from web_controller import WebController
-from model import parse_explore_rsp, parse_reflect_rsp, parse_grid_rsp, OpenAIModel, OllamaModel
-from utils import print_with_color, draw_bbox_multi, append_to_log, append_images_as_table, draw_grid
+from model import parse_explore_rsp, parse_reflect_rsp, parse_grid_rsp, OpenAIModel, OllamaModel, EXPLORE_FIELDS
+from utils import (print_with_color, draw_bbox_multi, append_to_log, append_images_as_table, draw_grid, get_grid_layout,
+                   set_log_writer, ScreenCache)
+from artifacts import ArtifactSink, ArtifactWriter, Frame
+from artifact_store import get_artifact_store
+from image_pairs import prepare_image_pair, format_pack_stats
 
 # Global flag to track if we started an emulator
 _emulator_started_by_script = False
@@ -40,7 +44,7 @@ atexit.register(cleanup_on_exit)
 signal.signal(signal.SIGTERM, signal_handler)
 signal.signal(signal.SIGINT, signal_handler)
 
-def calculate_grid_coordinates(area, subarea, screen_width, screen_height, rows, cols):
+def calculate_grid_coordinates(area, subarea, screen_width, screen_height):
     """
     Calculate x, y coordinates from grid area number and subarea position.
 
@@ -49,55 +53,12 @@ def calculate_grid_coordinates(area, subarea, screen_width, screen_height, rows,
         subarea: Subarea position ("center", "top-left", "top", "top-right", "left", "right", "bottom-left", "bottom", "bottom-right")
         screen_width: Screen width in pixels
         screen_height: Screen height in pixels
-        rows: Number of grid rows
-        cols: Number of grid columns
 
     Returns:
         (x, y) coordinates
     """
-    # Calculate unit sizes (matching draw_grid logic)
-    def get_unit_len(n):
-        for i in range(1, n + 1):
-            if n % i == 0 and 120 <= i <= 180:
-                return i
-        return -1
-
-    unit_height = get_unit_len(screen_height)
-    if unit_height < 0:
-        unit_height = 120
-    unit_width = get_unit_len(screen_width)
-    if unit_width < 0:
-        unit_width = 120
-
-    # Convert area number to row and column (area is 1-indexed)
-    area_index = area - 1
-    row = area_index // cols
-    col = area_index % cols
-
-    # Calculate cell boundaries
-    left = int(col * unit_width)
-    top = int(row * unit_height)
-    right = int((col + 1) * unit_width)
-    bottom = int((row + 1) * unit_height)
-
-    # Calculate coordinates based on subarea
-    subarea_offsets = {
-        "center": (0.5, 0.5),
-        "top-left": (0.2, 0.2),
-        "top": (0.5, 0.2),
-        "top-right": (0.8, 0.2),
-        "left": (0.2, 0.5),
-        "right": (0.8, 0.5),
-        "bottom-left": (0.2, 0.8),
-        "bottom": (0.5, 0.8),
-        "bottom-right": (0.8, 0.8)
-    }
-
-    offset_x, offset_y = subarea_offsets.get(subarea, (0.5, 0.5))  # Default to center
-    x = int(left + (right - left) * offset_x)
-    y = int(top + (bottom - top) * offset_y)
-
-    return x, y
+    # Same cached layout draw_grid drew; edge subareas sit 20% into the cell
+    return get_grid_layout(screen_width, screen_height).point(area, subarea, inset=0.2)
 
 
 arg_desc = "AppAgent - Autonomous Exploration"
@@ -119,16 +80,16 @@ parser.add_argument("--task_dir", default=None, help="Directory to store task re
 
 args = vars(parser.parse_args())
 
-configs = load_config()
+configs = get_settings()
 
 # CLI parameters override environment variables and config.yaml (highest priority)
 if args["model"]:
-    configs["MODEL"] = args["model"]
+    override_settings(MODEL=args["model"])
 if args["model_name"]:
     if configs["MODEL"] == "api":
-        configs["API_MODEL"] = args["model_name"]
+        override_settings(API_MODEL=args["model_name"])
     else:
-        configs["LOCAL_MODEL"] = args["model_name"]
+        override_settings(LOCAL_MODEL=args["model_name"])
 
 if configs["MODEL"] == "api":
     # API Model: Supports 100+ providers via LiteLLM (OpenAI, Claude, Grok, Gemini, etc.)
@@ -186,6 +147,11 @@ if not os.path.exists(docs_dir):
 explore_log_path = os.path.join(task_dir, f"log_explore_{task_name}.txt")
 reflect_log_path = os.path.join(task_dir, f"log_reflect_{task_name}.txt")
 report_log_path = os.path.join(task_dir, f"log_report_{task_name}.md")
+# Screenshots, logs and the report are written by a background thread, flushed at exit
+writer = ArtifactWriter(configs.get("ARTIFACT_QUEUE_SIZE", 64)) if configs.get("ASYNC_ARTIFACTS", True) else None
+set_log_writer(writer)
+sink = ArtifactSink(task_dir, enabled=configs.get("SAVE_ARTIFACTS", True), writer=writer,
+                    store=get_artifact_store(root_dir, configs))
 
 # Initialize controller based on platform
 if platform == "android":
@@ -262,6 +228,7 @@ doc_count = 0
 useless_list = set()
 last_act = "None"
 task_complete = False
+screen_cache = ScreenCache(configs.get("SCREEN_REUSE", True), configs.get("SCREEN_REUSE_TOLERANCE", 8))
 
 # Write the report markdown file
 append_to_log(f"# User Testing Report for {app}", report_log_path)
@@ -272,47 +239,31 @@ append_to_log(task_desc, report_log_path)
 while round_count < configs["MAX_ROUNDS"]:
     round_count += 1
     print_with_color(f"Round {round_count}", "yellow", log_file=report_log_path, heading_level=2)
-    screenshot_before = controller.get_screenshot(f"{round_count}_before", task_dir)
+    # Screenshot and UI hierarchy (HTML on web) are captured together; the hierarchy is skipped if the screen is
+    # still the one parsed last round
+    screenshot_before, xml_path = controller.observe(f"{round_count}_before", task_dir,
+                                                     xml_prefix=f"{round_count}", xml_dir=task_dir,
+                                                     unchanged=screen_cache.matches)
+    if screenshot_before == "ERROR" or xml_path == "ERROR":
+        break
 
-    # Get interactive elements based on platform
-    if platform == "android":
-        xml_path = controller.get_xml(f"{round_count}", task_dir)
-        if screenshot_before == "ERROR" or xml_path == "ERROR":
-            break
-        clickable_list = []
-        focusable_list = []
-        traverse_tree(xml_path, clickable_list, "clickable", True)
-        traverse_tree(xml_path, focusable_list, "focusable", True)
-    else:  # web
-        if screenshot_before == "ERROR":
-            break
-        # Save HTML for reference
-        html_path = controller.get_html(f"{round_count}", task_dir)
-        # Get interactive elements from page
-        clickable_list = controller.get_interactive_elements()
-        focusable_list = []  # Web uses same list for both
-    elem_list = []
-    for elem in clickable_list:
-        if elem.uid in useless_list:
-            continue
-        elem_list.append(elem)
-    for elem in focusable_list:
-        if elem.uid in useless_list:
-            continue
-        bbox = elem.bbox
-        center = (bbox[0][0] + bbox[1][0]) // 2, (bbox[0][1] + bbox[1][1]) // 2
-        close = False
-        for e in clickable_list:
-            bbox = e.bbox
-            center_ = (bbox[0][0] + bbox[1][0]) // 2, (bbox[0][1] + bbox[1][1]) // 2
-            dist = (abs(center[0] - center_[0]) ** 2 + abs(center[1] - center_[1]) ** 2) ** 0.5
-            if dist <= configs["MIN_DIST"]:
-                close = True
-                break
-        if not close:
-            elem_list.append(elem)
-    draw_bbox_multi(screenshot_before, os.path.join(task_dir, f"{round_count}_before_labeled.png"), elem_list,
-                    dark_mode=configs["DARK_MODE"])
+    all_elems = screen_cache.lookup(controller.screen_fingerprint, dump_skipped=xml_path is None)
+    if all_elems is not None:
+        print_with_color("Screen unchanged, reusing the elements parsed in the previous round", "yellow")
+    else:
+        # Get interactive elements based on platform
+        if platform == "android":
+            all_elems = extract_elements(xml_path, configs["MIN_DIST"])
+        else:  # web
+            # Get interactive elements from page
+            all_elems = controller.get_interactive_elements()
+        screen_cache.store(controller.screen_fingerprint, all_elems)
+    elem_list = all_elems.without_uids(useless_list)
+    frame_before = controller.frame(screenshot_before)
+    sink.adopt(screenshot_before, frame_before)
+    labeled_before = Frame(draw_bbox_multi(frame_before, None, elem_list, dark_mode=configs["DARK_MODE"]),
+                           f"{round_count}_before_labeled")
+    sink.save(labeled_before)
 
     # Add the screenshots as a table to the report markdown file
     append_images_as_table(
@@ -325,9 +276,9 @@ while round_count < configs["MAX_ROUNDS"]:
 
     prompt = re.sub(r"<task_description>", task_desc, prompts.self_explore_task_template)
     prompt = re.sub(r"<last_act>", last_act, prompt)
-    base64_img_before = os.path.join(task_dir, f"{round_count}_before_labeled.png")
+    base64_img_before = labeled_before
     print_with_color("Thinking about what to do in the next step...", "yellow")
-    status, rsp, metadata = mllm.get_model_response(prompt, [base64_img_before])
+    status, rsp, metadata = mllm.get_model_response(prompt, [base64_img_before], EXPLORE_FIELDS)
 
     # Log performance metrics to report
     if status and metadata:
@@ -336,14 +287,16 @@ while round_count < configs["MAX_ROUNDS"]:
             perf_info += f" | Tokens: {metadata['prompt_tokens']} + {metadata['completion_tokens']} = {metadata['total_tokens']}"
         if metadata.get('cpu_usage', 0) > 0:
             perf_info += f" | CPU: {metadata['cpu_usage']:.1f}% | Memory: {metadata['memory_usage']:.1f}%"
+        perf_info += f" | Image cache: {metadata.get('image_cache_hits', 0)} hit / {metadata.get('image_cache_misses', 0)} miss"
+        if metadata.get('time_to_action') is not None:
+            perf_info += f" | Action after {metadata['time_to_action']:.2f}s (first token {metadata['ttft']:.2f}s)"
         perf_info += f" | Provider: {metadata['provider']} ({metadata['model']})\n"
         append_to_log(perf_info, report_log_path)
 
     if status:
-        with open(explore_log_path, "a") as logfile:
-            log_item = {"step": round_count, "prompt": prompt, "image": f"{round_count}_before_labeled.png",
-                        "response": rsp}
-            logfile.write(json.dumps(log_item) + "\n")
+        log_item = {"step": round_count, "prompt": prompt, "image": f"{round_count}_before_labeled.png",
+                    "response": rsp}
+        append_to_log(json.dumps(log_item), explore_log_path)
         res = parse_explore_rsp(rsp)
         act_name = res[0]
 
@@ -379,12 +332,12 @@ while round_count < configs["MAX_ROUNDS"]:
         if act_name == "tap":
             _, area, _, _, _, _ = res
             tl, br = elem_list[area - 1].bbox
-            x, y = (tl[0] + br[0]) // 2, (tl[1] + br[1]) // 2
+            x, y = elem_list.center(area - 1)
 
             # Draw a bounding box on the canvas image and save it
-            screenshot_before_actioned = os.path.join(task_dir, f"{round_count}_before_labeled_action.png")
-            controller.get_screenshot_with_bbox(screenshot_before, screenshot_before_actioned, tl, br)
+            screenshot_before_actioned = controller.get_screenshot_with_bbox(frame_before, None, tl, br)
             controller.draw_circle(x, y, screenshot_before_actioned)
+            sink.save(screenshot_before_actioned, f"{round_count}_before_labeled_action.png")
 
             ret = controller.tap(x, y)
             if ret == "ERROR":
@@ -394,8 +347,8 @@ while round_count < configs["MAX_ROUNDS"]:
             _, input_str, _, _, _, _ = res
 
             # Draw a bounding box on the canvas image and save it
-            screenshot_before_actioned = os.path.join(task_dir, f"{round_count}_before_labeled_action.png")
-            controller.get_screenshot_with_bbox(screenshot_before, screenshot_before_actioned, tl, br)
+            screenshot_before_actioned = controller.get_screenshot_with_bbox(frame_before, None, tl, br)
+            sink.save(screenshot_before_actioned, f"{round_count}_before_labeled_action.png")
 
             ret = controller.text(input_str)
             if ret == "ERROR":
@@ -404,12 +357,12 @@ while round_count < configs["MAX_ROUNDS"]:
         elif act_name == "long_press":
             _, area, _, _, _, _ = res
             tl, br = elem_list[area - 1].bbox
-            x, y = (tl[0] + br[0]) // 2, (tl[1] + br[1]) // 2
+            x, y = elem_list.center(area - 1)
 
             # Draw a bounding box on the canvas image and save it
-            screenshot_before_actioned = os.path.join(task_dir, f"{round_count}_before_labeled_action.png")
-            controller.get_screenshot_with_bbox(screenshot_before, screenshot_before_actioned, tl, br)
+            screenshot_before_actioned = controller.get_screenshot_with_bbox(frame_before, None, tl, br)
             controller.draw_circle(x, y, screenshot_before_actioned)
+            sink.save(screenshot_before_actioned, f"{round_count}_before_labeled_action.png")
 
             ret = controller.long_press(x, y)
             if ret == "ERROR":
@@ -418,12 +371,12 @@ while round_count < configs["MAX_ROUNDS"]:
         elif act_name == "swipe":
             _, area, swipe_dir, dist, _, _, _, _ = res
             tl, br = elem_list[area - 1].bbox
-            x, y = (tl[0] + br[0]) // 2, (tl[1] + br[1]) // 2
+            x, y = elem_list.center(area - 1)
 
             # Draw a bounding box on the canvas image and save it
-            screenshot_before_actioned = os.path.join(task_dir, f"{round_count}_before_labeled_action.png")
-            controller.get_screenshot_with_bbox(screenshot_before, screenshot_before_actioned, tl, br)
+            screenshot_before_actioned = controller.get_screenshot_with_bbox(frame_before, None, tl, br)
             controller.draw_arrow(x, y, swipe_dir, dist, screenshot_before_actioned)
+            sink.save(screenshot_before_actioned, f"{round_count}_before_labeled_action.png")
 
             ret = controller.swipe(x, y, swipe_dir, dist)
             if ret == "ERROR":
@@ -432,7 +385,7 @@ while round_count < configs["MAX_ROUNDS"]:
         elif act_name == "grid":
             # Grid mode - re-label the screen with grid overlay
             grid_screenshot = os.path.join(task_dir, f"{round_count}_grid.png")
-            rows, cols = draw_grid(screenshot_before, grid_screenshot)
+            draw_grid(frame_before, grid_screenshot)
             print_with_color("Grid mode activated. Waiting for grid-based action...", "yellow")
 
             # Add grid screenshot to report
@@ -445,7 +398,7 @@ while round_count < configs["MAX_ROUNDS"]:
             prompt = re.sub(r"<task_description>", task_desc, prompts.task_template_grid)
             prompt = re.sub(r"<last_act>", last_act, prompt)
 
-            status, grid_rsp, grid_metadata = mllm.get_model_response(prompt, [grid_screenshot])
+            status, grid_rsp, grid_metadata = mllm.get_model_response(prompt, [grid_screenshot], EXPLORE_FIELDS)
 
             # Log grid performance metrics
             if status and grid_metadata:
@@ -454,6 +407,9 @@ while round_count < configs["MAX_ROUNDS"]:
                     perf_info += f" | Tokens: {grid_metadata['prompt_tokens']} + {grid_metadata['completion_tokens']} = {grid_metadata['total_tokens']}"
                 if grid_metadata.get('cpu_usage', 0) > 0:
                     perf_info += f" | CPU: {grid_metadata['cpu_usage']:.1f}% | Memory: {grid_metadata['memory_usage']:.1f}%"
+                if grid_metadata.get('time_to_action') is not None:
+                    perf_info += f" | Action after {grid_metadata['time_to_action']:.2f}s " \
+                                 f"(first token {grid_metadata['ttft']:.2f}s)"
                 perf_info += f" | Provider: {grid_metadata['provider']} ({grid_metadata['model']})\n"
                 append_to_log(perf_info, report_log_path)
 
@@ -480,7 +436,7 @@ while round_count < configs["MAX_ROUNDS"]:
                 append_to_log(f"**Thought:** {think}\n", report_log_path)
                 append_to_log(f"**Action:** {act}\n", report_log_path)
                 append_to_log(f"**Summary:** {last_act}\n", report_log_path)
-                x, y = calculate_grid_coordinates(area, subarea, width, height, rows, cols)
+                x, y = calculate_grid_coordinates(area, subarea, width, height)
                 print_with_color(f"Grid tap: area {area}, subarea {subarea} -> ({x}, {y})", "yellow")
 
                 # Draw circle on the grid screenshot and save
@@ -505,7 +461,7 @@ while round_count < configs["MAX_ROUNDS"]:
                 append_to_log(f"**Thought:** {think}\n", report_log_path)
                 append_to_log(f"**Action:** {act}\n", report_log_path)
                 append_to_log(f"**Summary:** {last_act}\n", report_log_path)
-                x, y = calculate_grid_coordinates(area, subarea, width, height, rows, cols)
+                x, y = calculate_grid_coordinates(area, subarea, width, height)
                 print_with_color(f"Grid long press: area {area}, subarea {subarea} -> ({x}, {y})", "yellow")
 
                 # Draw circle on the grid screenshot and save
@@ -530,8 +486,8 @@ while round_count < configs["MAX_ROUNDS"]:
                 append_to_log(f"**Thought:** {think}\n", report_log_path)
                 append_to_log(f"**Action:** {act}\n", report_log_path)
                 append_to_log(f"**Summary:** {last_act}\n", report_log_path)
-                start_x, start_y = calculate_grid_coordinates(start_area, start_subarea, width, height, rows, cols)
-                end_x, end_y = calculate_grid_coordinates(end_area, end_subarea, width, height, rows, cols)
+                start_x, start_y = calculate_grid_coordinates(start_area, start_subarea, width, height)
+                end_x, end_y = calculate_grid_coordinates(end_area, end_subarea, width, height)
                 print_with_color(f"Grid swipe: from area {start_area}/{start_subarea} ({start_x},{start_y}) to area {end_area}/{end_subarea} ({end_x},{end_y})", "yellow")
 
                 # Draw arrow on the grid screenshot and save
@@ -574,7 +530,8 @@ while round_count < configs["MAX_ROUNDS"]:
                 break
         else:
             break
-        time.sleep(configs["REQUEST_INTERVAL"])
+        settle_time = controller.wait_until_stable()
+        append_to_log(f"\n**Settle time:** {settle_time:.2f}s\n", report_log_path)
 
         # Add the actioned image to the report markdown file
         append_to_log(
@@ -588,9 +545,11 @@ while round_count < configs["MAX_ROUNDS"]:
     screenshot_after = controller.get_screenshot(f"{round_count}_after", task_dir)
     if screenshot_after == "ERROR":
         break
-    draw_bbox_multi(screenshot_after, os.path.join(task_dir, f"{round_count}_after_labeled.png"), elem_list,
-                    dark_mode=configs["DARK_MODE"])
-    base64_img_after = os.path.join(task_dir, f"{round_count}_after_labeled.png")
+    frame_after = controller.frame(screenshot_after)
+    sink.adopt(screenshot_after, frame_after)
+    base64_img_after = Frame(draw_bbox_multi(frame_after, None, elem_list, dark_mode=configs["DARK_MODE"]),
+                             f"{round_count}_after_labeled")
+    sink.save(base64_img_after)
 
     if act_name == "tap":
         prompt = re.sub(r"<action>", "tapping", prompts.self_explore_reflect_template)
@@ -613,7 +572,17 @@ while round_count < configs["MAX_ROUNDS"]:
     prompt = re.sub(r"<last_act>", last_act, prompt)
 
     print_with_color("Reflecting on my previous action...", "yellow")
-    status, rsp, reflect_metadata = mllm.get_model_response(prompt, [base64_img_before, base64_img_after])
+    prompt, reflect_images, pack_stats = prepare_image_pair(prompt, base64_img_before, base64_img_after,
+                                                            f"{round_count}_reflect", focus=elem_list[area - 1].bbox)
+    if pack_stats:
+        print_with_color(format_pack_stats(pack_stats), "cyan")
+    if reflect_images is None:
+        # Nothing changed on screen, which the reflection prompt defines as INEFFECTIVE; no need to ask the model
+        status, rsp, reflect_metadata = True, "Decision: INEFFECTIVE\nThought: The screenshots before and after " \
+                                              "the action are identical.", None
+        append_to_log(f"\n**Reflection skipped:** {format_pack_stats(pack_stats)}\n", report_log_path)
+    else:
+        status, rsp, reflect_metadata = mllm.get_model_response(prompt, reflect_images)
 
     # Log reflection performance metrics
     if status and reflect_metadata:
@@ -622,14 +591,17 @@ while round_count < configs["MAX_ROUNDS"]:
             perf_info += f" | Tokens: {reflect_metadata['prompt_tokens']} + {reflect_metadata['completion_tokens']} = {reflect_metadata['total_tokens']}"
         if reflect_metadata.get('cpu_usage', 0) > 0:
             perf_info += f" | CPU: {reflect_metadata['cpu_usage']:.1f}% | Memory: {reflect_metadata['memory_usage']:.1f}%"
+        perf_info += f" | Image cache: {reflect_metadata.get('image_cache_hits', 0)} hit / {reflect_metadata.get('image_cache_misses', 0)} miss"
+        if pack_stats:
+            perf_info += f" | {format_pack_stats(pack_stats)}"
         perf_info += f" | Provider: {reflect_metadata['provider']} ({reflect_metadata['model']})\n"
         append_to_log(perf_info, report_log_path)
     if status:
         resource_id = elem_list[int(area) - 1].uid
-        with open(reflect_log_path, "a") as logfile:
-            log_item = {"step": round_count, "prompt": prompt, "image_before": f"{round_count}_before_labeled.png",
-                        "image_after": f"{round_count}_after.png", "response": rsp}
-            logfile.write(json.dumps(log_item) + "\n")
+        log_item = {"step": round_count, "prompt": prompt, "image_before": f"{round_count}_before_labeled.png",
+                    "image_after": f"{round_count}_after.png", "response": rsp, "settle_time": settle_time,
+                    "image_pack": pack_stats}
+        append_to_log(json.dumps(log_item), reflect_log_path)
         res = parse_reflect_rsp(rsp)
         decision = res[0]
         reflect_think = res[1]
@@ -655,6 +627,7 @@ while round_count < configs["MAX_ROUNDS"]:
                     if ret == "ERROR":
                         print_with_color("ERROR: back execution failed", "red")
                         break
+                    controller.wait_until_stable()
             doc = res[-1]
             doc_name = resource_id + ".txt"
             doc_path = os.path.join(docs_dir, doc_name)
@@ -682,8 +655,8 @@ while round_count < configs["MAX_ROUNDS"]:
     else:
         print_with_color(f"ERROR: {rsp}", "red")
         break
-    time.sleep(configs["REQUEST_INTERVAL"])
 
+print_with_color(f"Screen reuse: {screen_cache.summary()}", "yellow", log_file=report_log_path)
 if task_complete:
     print_with_color(f"Autonomous exploration completed successfully. {doc_count} docs generated.", "yellow")
     sys.exit(0)  # Exit with success code
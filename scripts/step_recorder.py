@@ -7,8 +7,10 @@ import shutil
 import sys
 import time
 
-from and_controller import list_all_devices, AndroidController, traverse_tree
-from config import load_config
+from and_controller import list_all_devices, AndroidController, extract_elements
+from artifact_store import get_artifact_store
+from artifacts import ArtifactSink
+from config import get_settings
 from utils import print_with_color, draw_bbox_multi
 
 arg_desc = "AppAgent - Human Demonstration"
@@ -22,7 +24,7 @@ app = args["app"]
 demo_name = args["demo"]
 root_dir = args["root_dir"]
 
-configs = load_config()
+configs = get_settings()
 
 if not app:
     print_with_color("What is the name of the app you are going to demo?", "blue")
@@ -51,6 +53,7 @@ xml_dir = os.path.join(task_dir, "xml")
 os.mkdir(xml_dir)
 labeled_ss_dir = os.path.join(task_dir, "labeled_screenshots")
 os.mkdir(labeled_ss_dir)
+sink = ArtifactSink(labeled_ss_dir, store=get_artifact_store(root_dir, configs))
 record_path = os.path.join(task_dir, "record.txt")
 record_file = open(record_path, "w")
 task_desc_path = os.path.join(task_dir, "task_desc.txt")
@@ -85,30 +88,14 @@ print_with_color("All interactive elements on the screen are labeled with red an
 step = 0
 while True:
     step += 1
-    screenshot_path = controller.get_screenshot(f"{demo_name}_{step}", raw_ss_dir)
-    xml_path = controller.get_xml(f"{demo_name}_{step}", xml_dir)
+    screenshot_path, xml_path = controller.observe(f"{demo_name}_{step}", raw_ss_dir, xml_dir=xml_dir)
     if screenshot_path == "ERROR" or xml_path == "ERROR":
         break
-    clickable_list = []
-    focusable_list = []
-    traverse_tree(xml_path, clickable_list, "clickable", True)
-    traverse_tree(xml_path, focusable_list, "focusable", True)
-    elem_list = clickable_list.copy()
-    for elem in focusable_list:
-        bbox = elem.bbox
-        center = (bbox[0][0] + bbox[1][0]) // 2, (bbox[0][1] + bbox[1][1]) // 2
-        close = False
-        for e in clickable_list:
-            bbox = e.bbox
-            center_ = (bbox[0][0] + bbox[1][0]) // 2, (bbox[0][1] + bbox[1][1]) // 2
-            dist = (abs(center[0] - center_[0]) ** 2 + abs(center[1] - center_[1]) ** 2) ** 0.5
-            if dist <= configs["MIN_DIST"]:
-                close = True
-                break
-        if not close:
-            elem_list.append(elem)
-    labeled_img = draw_bbox_multi(screenshot_path, os.path.join(labeled_ss_dir, f"{demo_name}_{step}.png"), elem_list,
-                                  True)
+    elem_list = extract_elements(xml_path, configs["MIN_DIST"])
+    frame = controller.frame(screenshot_path)
+    sink.adopt(screenshot_path, frame)
+    labeled_img = draw_bbox_multi(frame, None, elem_list, True)
+    sink.save(labeled_img, f"{demo_name}_{step}.png")
     cv2.imshow("image", labeled_img)
     cv2.waitKey(0)
     cv2.destroyAllWindows()
@@ -123,8 +110,7 @@ while True:
         user_input = "xxx"
         while not user_input.isnumeric() or int(user_input) > len(elem_list) or int(user_input) < 1:
             user_input = input()
-        tl, br = elem_list[int(user_input) - 1].bbox
-        x, y = (tl[0] + br[0]) // 2, (tl[1] + br[1]) // 2
+        x, y = elem_list.center(int(user_input) - 1)
         ret = controller.tap(x, y)
         if ret == "ERROR":
             print_with_color("ERROR: tap execution failed", "red")
@@ -148,8 +134,7 @@ while True:
         user_input = "xxx"
         while not user_input.isnumeric() or int(user_input) > len(elem_list) or int(user_input) < 1:
             user_input = input()
-        tl, br = elem_list[int(user_input) - 1].bbox
-        x, y = (tl[0] + br[0]) // 2, (tl[1] + br[1]) // 2
+        x, y = elem_list.center(int(user_input) - 1)
         ret = controller.long_press(x, y)
         if ret == "ERROR":
             print_with_color("ERROR: long press execution failed", "red")
@@ -165,8 +150,7 @@ while True:
         print_with_color(f"Which element do you want to swipe? Choose a numeric tag from 1 to {len(elem_list)}:")
         while not user_input.isnumeric() or int(user_input) > len(elem_list) or int(user_input) < 1:
             user_input = input()
-        tl, br = elem_list[int(user_input) - 1].bbox
-        x, y = (tl[0] + br[0]) // 2, (tl[1] + br[1]) // 2
+        x, y = elem_list.center(int(user_input) - 1)
         ret = controller.swipe(x, y, swipe_dir)
         if ret == "ERROR":
             print_with_color("ERROR: swipe execution failed", "red")
@@ -178,6 +162,6 @@ while True:
         break
     else:
         break
-    time.sleep(3)
+    controller.wait_until_stable()
 
 print_with_color(f"Demonstration phase completed. {step} steps were recorded.", "yellow")
@@ -8,10 +8,12 @@ import sys
 import time
 
 import prompts
-from config import load_config
-from and_controller import list_all_devices, AndroidController, traverse_tree, start_emulator, list_available_emulators
-from model import parse_explore_rsp, parse_grid_rsp, OpenAIModel, OllamaModel
-from utils import print_with_color, draw_bbox_multi, draw_grid
+from config import get_settings, override_settings
+from and_controller import list_all_devices, AndroidController, extract_elements, start_emulator, list_available_emulators
+from model import parse_explore_rsp, parse_grid_rsp, OpenAIModel, OllamaModel, EXPLORE_FIELDS
+from utils import print_with_color, draw_bbox_multi, draw_grid, get_grid_layout, ScreenCache
+from artifacts import ArtifactSink, Frame
+from artifact_store import get_artifact_store
 
 arg_desc = "AppAgent Executor"
 parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=arg_desc)
@@ -25,6 +27,10 @@ parser.add_argument("--task_desc", default=None,
                     help="Task description (if not provided, will prompt)")
 parser.add_argument("--url", default=None,
                     help="URL for web platform")
+parser.add_argument("--device", default=None,
+                    help="Serial of the Android device to use (if not provided, will prompt when several are attached)")
+parser.add_argument("--docs", choices=["auto", "demo", "none"], default=None,
+                    help="Documentation base to use (if not provided, will prompt when ambiguous)")
 
 # Model override parameters (Task-specific model selection)
 parser.add_argument("--model", choices=["api", "local"], default=None,
@@ -34,16 +40,16 @@ parser.add_argument("--model_name", default=None,
 
 args = vars(parser.parse_args())
 
-configs = load_config()
+configs = get_settings()
 
 # CLI parameters override environment variables and config.yaml (highest priority)
 if args["model"]:
-    configs["MODEL"] = args["model"]
+    override_settings(MODEL=args["model"])
 if args["model_name"]:
     if configs["MODEL"] == "api":
-        configs["API_MODEL"] = args["model_name"]
+        override_settings(API_MODEL=args["model_name"])
     else:
-        configs["LOCAL_MODEL"] = args["model_name"]
+        override_settings(LOCAL_MODEL=args["model_name"])
 
 if configs["MODEL"] == "api":
     # API Model: Supports 100+ providers via LiteLLM (OpenAI, Claude, Grok, Gemini, etc.)
@@ -77,12 +83,25 @@ auto_docs_dir = os.path.join(app_dir, "auto_docs")
 demo_docs_dir = os.path.join(app_dir, "demo_docs")
 task_timestamp = int(time.time())
 dir_name = datetime.datetime.fromtimestamp(task_timestamp).strftime(f"task_{app}_%Y-%m-%d_%H-%M-%S")
+if args["device"]:
+    # Concurrent executors on different devices may start within the same second
+    dir_name += "_" + re.sub(r"[^\w.-]", "-", args["device"])
 task_dir = os.path.join(work_dir, dir_name)
 os.mkdir(task_dir)
 log_path = os.path.join(task_dir, f"log_{app}_{dir_name}.txt")
+sink = ArtifactSink(task_dir, enabled=configs.get("SAVE_ARTIFACTS", True), store=get_artifact_store(root_dir, configs))
 
 no_doc = False
-if not os.path.exists(auto_docs_dir) and not os.path.exists(demo_docs_dir):
+if args["docs"] == "none":
+    no_doc = True
+elif args["docs"] == "auto" and os.path.exists(auto_docs_dir):
+    docs_dir = auto_docs_dir
+elif args["docs"] == "demo" and os.path.exists(demo_docs_dir):
+    docs_dir = demo_docs_dir
+elif args["docs"]:
+    print_with_color(f"ERROR: No {args['docs']} documentations found for the app {app}!", "red")
+    sys.exit(1)
+elif not os.path.exists(auto_docs_dir) and not os.path.exists(demo_docs_dir):
     print_with_color(f"No documentations found for the app {app}. Do you want to proceed with no docs? Enter y or n",
                      "red")
     user_input = ""
@@ -138,7 +157,13 @@ if not device_list:
         sys.exit()
 
 print_with_color(f"List of devices attached:\n{str(device_list)}", "yellow")
-if len(device_list) == 1:
+if args["device"]:
+    device = args["device"]
+    if device not in device_list:
+        print_with_color(f"ERROR: Device {device} is not attached!", "red")
+        sys.exit(1)
+    print_with_color(f"Device selected: {device}", "yellow")
+elif len(device_list) == 1:
     device = device_list[0]
     print_with_color(f"Device selected: {device}", "yellow")
 else:
@@ -163,67 +188,51 @@ round_count = 0
 last_act = "None"
 task_complete = False
 grid_on = False
-rows, cols = 0, 0
+settle_time = None
+observation = None
+screen_cache = ScreenCache(configs.get("SCREEN_REUSE", True), configs.get("SCREEN_REUSE_TOLERANCE", 8))
 
 
 def area_to_xy(area, subarea):
-    area -= 1
-    row, col = area // cols, area % cols
-    x_0, y_0 = col * (width // cols), row * (height // rows)
-    if subarea == "top-left":
-        x, y = x_0 + (width // cols) // 4, y_0 + (height // rows) // 4
-    elif subarea == "top":
-        x, y = x_0 + (width // cols) // 2, y_0 + (height // rows) // 4
-    elif subarea == "top-right":
-        x, y = x_0 + (width // cols) * 3 // 4, y_0 + (height // rows) // 4
-    elif subarea == "left":
-        x, y = x_0 + (width // cols) // 4, y_0 + (height // rows) // 2
-    elif subarea == "right":
-        x, y = x_0 + (width // cols) * 3 // 4, y_0 + (height // rows) // 2
-    elif subarea == "bottom-left":
-        x, y = x_0 + (width // cols) // 4, y_0 + (height // rows) * 3 // 4
-    elif subarea == "bottom":
-        x, y = x_0 + (width // cols) // 2, y_0 + (height // rows) * 3 // 4
-    elif subarea == "bottom-right":
-        x, y = x_0 + (width // cols) * 3 // 4, y_0 + (height // rows) * 3 // 4
-    else:
-        x, y = x_0 + (width // cols) // 2, y_0 + (height // rows) // 2
-    return x, y
+    return get_grid_layout(width, height).point(area, subarea)
 
 
 while round_count < configs["MAX_ROUNDS"]:
     round_count += 1
     print_with_color(f"Round {round_count}", "yellow")
-    screenshot_path = controller.get_screenshot(f"{dir_name}_{round_count}", task_dir)
-    xml_path = controller.get_xml(f"{dir_name}_{round_count}", task_dir)
+    if observation is not None:
+        # Captured by the previous round's batched action
+        screenshot_path, xml_path = observation
+        observation = None
+    else:
+        screenshot_path, xml_path = controller.observe(f"{dir_name}_{round_count}", task_dir,
+                                                       unchanged=screen_cache.matches)
     if screenshot_path == "ERROR" or xml_path == "ERROR":
         break
+    if screenshot_path is None:
+        # The batched action found the cached screen's exact pixels and captured nothing
+        cached = screen_cache.lookup(screen_cache.fingerprint, dump_skipped=True)
+        frame = cached[0]
+    else:
+        frame = controller.frame(screenshot_path)
+        sink.adopt(screenshot_path, frame)
+        cached = screen_cache.lookup(controller.screen_fingerprint, dump_skipped=xml_path is None)
     if grid_on:
-        rows, cols = draw_grid(screenshot_path, os.path.join(task_dir, f"{dir_name}_{round_count}_grid.png"))
+        draw_grid(frame, os.path.join(task_dir, f"{dir_name}_{round_count}_grid.png"))
         image = os.path.join(task_dir, f"{dir_name}_{round_count}_grid.png")
         prompt = prompts.task_template_grid
     else:
-        clickable_list = []
-        focusable_list = []
-        traverse_tree(xml_path, clickable_list, "clickable", True)
-        traverse_tree(xml_path, focusable_list, "focusable", True)
-        elem_list = clickable_list.copy()
-        for elem in focusable_list:
-            bbox = elem.bbox
-            center = (bbox[0][0] + bbox[1][0]) // 2, (bbox[0][1] + bbox[1][1]) // 2
-            close = False
-            for e in clickable_list:
-                bbox = e.bbox
-                center_ = (bbox[0][0] + bbox[1][0]) // 2, (bbox[0][1] + bbox[1][1]) // 2
-                dist = (abs(center[0] - center_[0]) ** 2 + abs(center[1] - center_[1]) ** 2) ** 0.5
-                if dist <= configs["MIN_DIST"]:
-                    close = True
-                    break
-            if not close:
-                elem_list.append(elem)
-        draw_bbox_multi(screenshot_path, os.path.join(task_dir, f"{dir_name}_{round_count}_labeled.png"), elem_list,
-                        dark_mode=configs["DARK_MODE"])
-        image = os.path.join(task_dir, f"{dir_name}_{round_count}_labeled.png")
+        if cached is not None:
+            print_with_color("Screen unchanged, reusing the elements and labels of the previous round", "yellow")
+            _, elem_list, labeled = cached
+            image = Frame(labeled.image, f"{dir_name}_{round_count}_labeled")
+        else:
+            elem_list = extract_elements(xml_path, configs["MIN_DIST"])
+            # Labeled in memory; the model payload is encoded from the Frame, the sink keeps a copy for the log
+            image = Frame(draw_bbox_multi(frame, None, elem_list, dark_mode=configs["DARK_MODE"]),
+                          f"{dir_name}_{round_count}_labeled")
+            screen_cache.store(controller.screen_fingerprint, (frame, elem_list, image), controller.screen_hash)
+        sink.save(image)
         if no_doc:
             prompt = re.sub(r"<ui_document>", "", prompts.task_template)
         else:
@@ -256,12 +265,14 @@ while round_count < configs["MAX_ROUNDS"]:
     prompt = re.sub(r"<task_description>", task_desc, prompt)
     prompt = re.sub(r"<last_act>", last_act, prompt)
     print_with_color("Thinking about what to do in the next step...", "yellow")
-    status, rsp = mllm.get_model_response(prompt, [image])
+    status, rsp, metadata = mllm.get_model_response(prompt, [image], EXPLORE_FIELDS)
 
     if status:
         with open(log_path, "a") as logfile:
             log_item = {"step": round_count, "prompt": prompt, "image": f"{dir_name}_{round_count}_labeled.png",
-                        "response": rsp}
+                        "response": rsp, "settle_time": settle_time, "screen_reused": cached is not None,
+                        "response_time": metadata["response_time"], "ttft": metadata.get("ttft"),
+                        "time_to_action": metadata.get("time_to_action")}
             logfile.write(json.dumps(log_item) + "\n")
         if grid_on:
             res = parse_grid_rsp(rsp)
@@ -275,66 +286,65 @@ while round_count < configs["MAX_ROUNDS"]:
             break
         last_act = res[-1]
         res = res[:-1]
+        commands = []
         if act_name == "tap":
             _, area = res
-            tl, br = elem_list[area - 1].bbox
-            x, y = (tl[0] + br[0]) // 2, (tl[1] + br[1]) // 2
-            ret = controller.tap(x, y)
-            if ret == "ERROR":
-                print_with_color("ERROR: tap execution failed", "red")
-                break
+            x, y = elem_list.center(area - 1)
+            commands.append(controller.tap_command(x, y))
         elif act_name == "text":
             _, input_str = res
-            ret = controller.text(input_str)
-            if ret == "ERROR":
-                print_with_color("ERROR: text execution failed", "red")
-                break
+            commands.append(controller.text_command(input_str))
         elif act_name == "long_press":
             _, area = res
-            tl, br = elem_list[area - 1].bbox
-            x, y = (tl[0] + br[0]) // 2, (tl[1] + br[1]) // 2
-            ret = controller.long_press(x, y)
-            if ret == "ERROR":
-                print_with_color("ERROR: long press execution failed", "red")
-                break
+            x, y = elem_list.center(area - 1)
+            commands.append(controller.long_press_command(x, y))
         elif act_name == "swipe":
             _, area, swipe_dir, dist = res
-            tl, br = elem_list[area - 1].bbox
-            x, y = (tl[0] + br[0]) // 2, (tl[1] + br[1]) // 2
-            ret = controller.swipe(x, y, swipe_dir, dist)
-            if ret == "ERROR":
+            x, y = elem_list.center(area - 1)
+            command = controller.swipe_command(x, y, swipe_dir, dist)
+            if command == "ERROR":
                 print_with_color("ERROR: swipe execution failed", "red")
                 break
+            commands.append(command)
         elif act_name == "grid":
             grid_on = True
         elif act_name == "tap_grid" or act_name == "long_press_grid":
             _, area, subarea = res
             x, y = area_to_xy(area, subarea)
             if act_name == "tap_grid":
-                ret = controller.tap(x, y)
-                if ret == "ERROR":
-                    print_with_color("ERROR: tap execution failed", "red")
-                    break
+                commands.append(controller.tap_command(x, y))
             else:
-                ret = controller.long_press(x, y)
-                if ret == "ERROR":
-                    print_with_color("ERROR: tap execution failed", "red")
-                    break
+                commands.append(controller.long_press_command(x, y))
         elif act_name == "swipe_grid":
             _, start_area, start_subarea, end_area, end_subarea = res
             start_x, start_y = area_to_xy(start_area, start_subarea)
             end_x, end_y = area_to_xy(end_area, end_subarea)
-            ret = controller.swipe_precise((start_x, start_y), (end_x, end_y))
-            if ret == "ERROR":
-                print_with_color("ERROR: tap execution failed", "red")
-                break
+            commands.append(controller.swipe_precise_command((start_x, start_y), (end_x, end_y)))
         if act_name != "grid":
             grid_on = False
-        time.sleep(configs["REQUEST_INTERVAL"])
+        if not commands:
+            settle_time = None
+            continue
+        if configs.get("ADB_FUSED_ACTIONS", True):
+            # Action, settle wait and the next round's screenshot + hierarchy in one adb round trip
+            ret = controller.act_and_observe(commands, f"{dir_name}_{round_count + 1}", task_dir,
+                                             unchanged_hash=screen_cache.raw_hash)
+            if ret == "ERROR":
+                print_with_color(f"ERROR: {act_name} execution failed", "red")
+                break
+            observation, settle_time = ret[:2], ret[2]
+        else:
+            ret = controller.run_batch(commands)
+            if ret == "ERROR":
+                print_with_color(f"ERROR: {act_name} execution failed", "red")
+                break
+            settle_time = controller.wait_until_stable()
+        print_with_color(f"Screen settled after {settle_time:.2f}s", "yellow")
     else:
         print_with_color(rsp, "red")
         break
 
+print_with_color(f"Screen reuse: {screen_cache.summary()}", "yellow")
 if task_complete:
     print_with_color("Task completed successfully", "yellow")
     sys.exit(0)  # Exit with success code
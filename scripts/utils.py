@@ -1,10 +1,14 @@
 import base64
 import os
+import time
 import cv2
-import pyshine as ps
+import numpy as np
 
 from colorama import Fore, Style
 
+from artifacts import Frame, PayloadCache
+from label_atlas import DARK_SCHEME, LIGHT_SCHEME, RECORD_SCHEME, get_label_atlas
+
 
 def print_with_color(text: str, color="", log_file=None, heading_level=None):
     if color == "red":
@@ -32,13 +36,32 @@ def print_with_color(text: str, color="", log_file=None, heading_level=None):
         # If a heading level is specified, prepend the message with the appropriate number of '#'
         if heading_level is not None:
             text = '#' * heading_level + ' ' + text
-        with open(log_file, "a") as f:
-            f.write(text + "\n")
+        _append(log_file, text + "\n")
 
 
-def append_to_log(text: str, log_file: str, break_line: bool = True):
+_log_writer = None
+
+
+def set_log_writer(writer):
+    """
+    Send log and report appends through an ArtifactWriter (None writes them directly).
+
+    Files written this way must not be read back by the same process before writer.flush().
+    """
+    global _log_writer
+    _log_writer = writer
+
+
+def _append(log_file, text):
+    if _log_writer is not None:
+        _log_writer.append(log_file, text)
+        return
     with open(log_file, "a") as f:
-        f.write(text + ("\n" if break_line else ""))
+        f.write(text)
+
+
+def append_to_log(text: str, log_file: str, break_line: bool = True):
+    _append(log_file, text + ("\n" if break_line else ""))
 
 
 def append_images_as_table(images: list, log_file: str):
@@ -53,81 +76,375 @@ def append_images_as_table(images: list, log_file: str):
     if not images:
         return
 
-    with open(log_file, "a") as f:
-        # Header row with alt texts
-        f.write("| " + " | ".join([alt for alt, _ in images]) + " |\n")
-        # Separator row
-        f.write("|" + "|".join(["------" for _ in images]) + "|\n")
-        # Image row
-        f.write("| " + " | ".join([f"![{alt}]({path})" for alt, path in images]) + " |\n\n")
+    # Header row with alt texts, separator row, image row
+    _append(log_file, "| " + " | ".join([alt for alt, _ in images]) + " |\n" +
+            "|" + "|".join(["------" for _ in images]) + "|\n" +
+            "| " + " | ".join([f"![{alt}]({path})" for alt, path in images]) + " |\n\n")
+
+
+def frame_fingerprint(img, size=32):
+    """
+    Downsampled grayscale thumbnail used to compare screens cheaply.
+
+    Args:
+        img: BGR image (ndarray) or None
+        size: Side length of the square thumbnail
+
+    Returns:
+        uint8 ndarray of shape (size, size) or None
+    """
+    if img is None:
+        return None
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    return cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA)
+
+
+def wait_until_stable(capture_fingerprint, min_wait=0.3, max_wait=10.0, interval=0.25, stable_polls=2,
+                      tolerance=8, baseline=None, unchanged_wait=2.0):
+    """
+    Block until the screen stops changing, instead of sleeping for a fixed interval.
+
+    Polls are compared with screens_match, so a spinner or a toast keeps the screen unsettled even
+    though it covers a small part of it. An action whose effect has not started yet (a network
+    navigation, an app launch) leaves the screen identical to the one before the action; given that
+    baseline, an unchanged screen only counts as settled once unchanged_wait has passed.
+
+    Args:
+        capture_fingerprint: Callable returning the current screen fingerprint (or None on failure)
+        min_wait: Seconds to wait before the first poll (lets the action start animating)
+        max_wait: Upper bound in seconds, returned even if the screen never settles
+        interval: Seconds between polls
+        stable_polls: Number of consecutive unchanged polls that count as settled
+        tolerance: Largest grey-level difference of a fingerprint cell still considered unchanged
+        baseline: Optional fingerprint of the screen before the action
+        unchanged_wait: Seconds a screen still matching baseline is polled before it counts as settled
+
+    Returns:
+        (settle_time, stable): seconds waited and whether the screen settled before max_wait
+    """
+    start = time.time()
+    time.sleep(min_wait)
+    previous = capture_fingerprint()
+    unchanged = 0
+    while time.time() - start < max_wait:
+        time.sleep(interval)
+        current = capture_fingerprint()
+        if screens_match(previous, current, tolerance):
+            unchanged += 1
+            if unchanged >= stable_polls and (baseline is None or not screens_match(baseline, current, tolerance)
+                                              or time.time() - start >= unchanged_wait):
+                return time.time() - start, True
+        else:
+            unchanged = 0
+        previous = current
+    return time.time() - start, False
+
+
+def screens_match(a, b, tolerance=8):
+    """
+    True if no cell of two fingerprints differs by more than tolerance grey levels.
+
+    Comparing the largest cell difference rather than the mean catches small changes: a typed
+    character, a toggled switch or a spinner barely moves the mean but clearly moves its cells.
+    """
+    if a is None or b is None or a.shape != b.shape:
+        return False
+    return int(cv2.absdiff(a, b).max()) <= tolerance
+
+
+class ScreenCache:
+    """
+    Whatever a round derived from the last parsed screen (elements, labeled frame, ...), reused while
+    the device still shows that screen.
+
+    An action that changes nothing (a tap on a dead element, a swipe at the end of a list) would
+    otherwise cost the next round a hierarchy dump, a parse and a relabel of a screen that was just
+    processed. Screens are compared by frame_fingerprint; states stored from the fused adb path also
+    carry the device-side hash of the raw pixels (see AndroidController.act_and_observe), which lets
+    the device skip the capture altogether.
+
+    Attributes:
+        hits: Rounds that reused the cached state
+        misses: Rounds that had to parse their screen
+        dumps_skipped: Hits that did not dump the hierarchy at all
+    """
+    def __init__(self, enabled=True, tolerance=8):
+        self.enabled = enabled
+        self.tolerance = tolerance
+        self.fingerprint = None
+        self.raw_hash = None
+        self.state = None
+        self.hits = 0
+        self.misses = 0
+        self.dumps_skipped = 0
+
+    def matches(self, fingerprint):
+        """True if there is a cached state and fingerprint shows its screen"""
+        return self.enabled and self.state is not None and screens_match(self.fingerprint, fingerprint,
+                                                                          self.tolerance)
+
+    def lookup(self, fingerprint, dump_skipped=False):
+        """
+        Cached state for the screen with this fingerprint, counted as a hit or a miss.
+
+        Args:
+            fingerprint: frame_fingerprint of the new screen
+            dump_skipped: Whether the hierarchy of the new screen was not dumped
+
+        Returns:
+            The stored state, or None
+        """
+        if self.matches(fingerprint):
+            self.hits += 1
+            self.dumps_skipped += dump_skipped
+            return self.state
+        self.misses += 1
+        return None
+
+    def store(self, fingerprint, state, raw_hash=None):
+        if self.enabled:
+            self.fingerprint = fingerprint
+            self.raw_hash = raw_hash
+            self.state = state
+
+    def summary(self):
+        rounds = self.hits + self.misses
+        rate = self.hits / rounds * 100 if rounds else 0.0
+        return f"{self.hits}/{rounds} rounds reused the previous screen ({rate:.0f}%), " \
+               f"{self.dumps_skipped} hierarchy dumps skipped"
+
+
+class CenterGrid:
+    """
+    Uniform grid over element centres answering "is any centre within min_dist of this point".
+
+    Cells are min_dist wide, so every centre within min_dist of a point lies in the 3x3 block
+    of cells around it and a query only looks at a handful of candidates instead of every
+    centre added so far.
+    """
+    def __init__(self, min_dist, inclusive=True):
+        self.min_dist_sq = min_dist * min_dist
+        self.cell = max(min_dist, 1)
+        self.inclusive = inclusive
+        self.cells = {}
+
+    def _key(self, center):
+        return int(center[0] // self.cell), int(center[1] // self.cell)
+
+    def is_close(self, center):
+        cx, cy = self._key(center)
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for x, y in self.cells.get((gx, gy), ()):
+                    dist_sq = (center[0] - x) ** 2 + (center[1] - y) ** 2
+                    if dist_sq < self.min_dist_sq or (self.inclusive and dist_sq == self.min_dist_sq):
+                        return True
+        return False
+
+    def add(self, center):
+        self.cells.setdefault(self._key(center), []).append(center)
 
 
 def draw_bbox_multi(img_path, output_path, elem_list, record_mode=False, dark_mode=False):
-    imgcv = cv2.imread(img_path)
-    count = 1
-    for elem in elem_list:
-        try:
-            top_left = elem.bbox[0]
-            bottom_right = elem.bbox[1]
-            left, top = top_left[0], top_left[1]
-            right, bottom = bottom_right[0], bottom_right[1]
-            label = str(count)
-            if record_mode:
-                if elem.attrib == "clickable":
-                    color = (250, 0, 0)
-                elif elem.attrib == "focusable":
-                    color = (0, 0, 250)
-                else:
-                    color = (0, 250, 0)
-                imgcv = ps.putBText(imgcv, label, text_offset_x=(left + right) // 2 + 10, text_offset_y=(top + bottom) // 2 + 10,
-                                    vspace=10, hspace=10, font_scale=1, thickness=2, background_RGB=color,
-                                    text_RGB=(255, 250, 250), alpha=0.5)
-            else:
-                text_color = (10, 10, 10) if dark_mode else (255, 250, 250)
-                bg_color = (255, 250, 250) if dark_mode else (10, 10, 10)
-                imgcv = ps.putBText(imgcv, label, text_offset_x=(left + right) // 2 + 10, text_offset_y=(top + bottom) // 2 + 10,
-                                    vspace=10, hspace=10, font_scale=1, thickness=2, background_RGB=bg_color,
-                                    text_RGB=text_color, alpha=0.5)
-        except Exception as e:
-            print_with_color(f"ERROR: An exception occurs while labeling the image\n{e}", "red")
-        count += 1
-    cv2.imwrite(output_path, imgcv)
+    """
+    Draw numeric tags on the elements of a screenshot.
+
+    Args:
+        img_path: Screenshot path, or an in-memory image (ndarray / Frame), which is left unmodified
+        output_path: Where to write the labeled image; None keeps it in memory only
+        elem_list: Elements to label (ElementTable or list)
+
+    Returns:
+        Labeled image (ndarray)
+    """
+    if isinstance(img_path, str):
+        imgcv = cv2.imread(img_path)
+    else:
+        imgcv = getattr(img_path, "image", img_path).copy()
+    # Tags sit 10px right/below each element centre; an ElementTable computes them in one go
+    if hasattr(elem_list, "label_positions"):
+        positions = elem_list.label_positions(10).tolist()
+    else:
+        positions = [((e.bbox[0][0] + e.bbox[1][0]) // 2 + 10, (e.bbox[0][1] + e.bbox[1][1]) // 2 + 10)
+                     for e in elem_list]
+    labels = [str(i) for i in range(1, len(positions) + 1)]
+    if record_mode:
+        colors = RECORD_SCHEME["background"]
+        backgrounds = [colors.get(elem.attrib, colors["other"]) for elem in elem_list]
+        scheme = RECORD_SCHEME
+    else:
+        scheme = DARK_SCHEME if dark_mode else LIGHT_SCHEME
+        backgrounds = scheme["background"]
+    get_label_atlas().render(imgcv, labels, positions, backgrounds, scheme["text"])
+    if output_path:
+        cv2.imwrite(output_path, imgcv)
     return imgcv
 
 
-def draw_grid(img_path, output_path):
-    def get_unit_len(n):
-        for i in range(1, n + 1):
-            if n % i == 0 and 120 <= i <= 180:
+class GridLayout:
+    """
+    Numbered grid the model uses to point at screen areas that have no labeled element.
+
+    Cell sides are the first length in 120-180px that divides the screen dimension (120px if none does).
+    The layout and its overlay depend only on the screen size, so get_grid_layout() builds them
+    once per (width, height); draw_grid() and the scripts' area -> coordinate lookups share it.
+
+    Attributes:
+        unit_width, unit_height: Cell size in pixels
+        rows, cols: Number of full cells; areas are numbered 1..rows * cols row by row
+        overlay: BGRA image of the grid lines and cell numbers, transparent elsewhere
+    """
+    SUBAREAS = {"top-left": (0, 0), "top": (1, 0), "top-right": (2, 0), "left": (0, 1), "center": (1, 1),
+                "right": (2, 1), "bottom-left": (0, 2), "bottom": (1, 2), "bottom-right": (2, 2)}
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.unit_width = self.unit_len(width)
+        self.unit_height = self.unit_len(height)
+        self.rows = height // self.unit_height
+        self.cols = width // self.unit_width
+        self.overlay = self._render_overlay()
+        # screenshot * weight / 255 + premultiplied is the alpha blend of the overlay
+        alpha = self.overlay[:, :, 3:]
+        self._weight = np.repeat(255 - alpha, 3, axis=2)
+        self._premultiplied = np.ascontiguousarray(self.overlay[:, :, :3])
+
+    @staticmethod
+    def unit_len(n):
+        for i in range(120, 181):
+            if n % i == 0:
                 return i
-        return -1
+        return 120
+
+    def _render_overlay(self):
+        # Colour is drawn onto black and coverage onto a separate alpha plane, so the colour plane
+        # holds colour * alpha (anti-aliased edges included)
+        color = (255, 116, 113)
+        colors = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        alpha = np.zeros((self.height, self.width), dtype=np.uint8)
+        thick = int(self.unit_width // 50)
+        font_scale = int(0.01 * self.unit_width)
+        for i in range(self.rows):
+            for j in range(self.cols):
+                label = str(i * self.cols + j + 1)
+                left, top, right, bottom = self.cell(i * self.cols + j + 1)
+                text_x, text_y = left + int(self.unit_width * 0.05), top + int(self.unit_height * 0.3)
+                for plane, fill in ((colors, color), (alpha, 255)):
+                    cv2.rectangle(plane, (left, top), (right, bottom), fill, thick // 2)
+                cv2.putText(colors, label, (text_x + 3, text_y + 3), 0, font_scale, (0, 0, 0), thick)
+                cv2.putText(alpha, label, (text_x + 3, text_y + 3), 0, font_scale, 255, thick)
+                for plane, fill in ((colors, color), (alpha, 255)):
+                    cv2.putText(plane, label, (text_x, text_y), 0, font_scale, fill, thick)
+        return np.dstack([colors, alpha])
+
+    def cell(self, area):
+        """(left, top, right, bottom) of a 1-indexed area"""
+        row, col = divmod(area - 1, self.cols)
+        return (col * self.unit_width, row * self.unit_height,
+                (col + 1) * self.unit_width, (row + 1) * self.unit_height)
+
+    def point(self, area, subarea, inset=0.25):
+        """
+        Screen coordinates of a subarea of an area.
+
+        Args:
+            area: 1-indexed area number
+            subarea: "center", "top-left", "top", ..., "bottom-right"; unknown values mean "center"
+            inset: Distance of the edge subareas from the cell border, as a fraction of the cell size
+
+        Returns:
+            (x, y)
+        """
+        left, top, right, bottom = self.cell(area)
+        fractions = (inset, 0.5, 1 - inset)
+        col, row = self.SUBAREAS.get(subarea, (1, 1))
+        return int(left + (right - left) * fractions[col]), int(top + (bottom - top) * fractions[row])
+
+    def apply(self, image):
+        """Screenshot with the grid blended on top (new array)"""
+        if image.shape[:2] != (self.height, self.width):
+            raise ValueError(f"grid is {self.width}x{self.height}, image is {image.shape[1]}x{image.shape[0]}")
+        return cv2.add(cv2.multiply(image, self._weight, scale=1 / 255), self._premultiplied)
+
+
+_grid_layouts = {}
+
+
+def get_grid_layout(width, height):
+    """Grid layout for a screen size, built on first use"""
+    layout = _grid_layouts.get((width, height))
+    if layout is None:
+        layout = GridLayout(width, height)
+        _grid_layouts[(width, height)] = layout
+    return layout
+
 
-    image = cv2.imread(img_path)
+def draw_grid(img_path, output_path):
+    """
+    Draw the numbered grid on a screenshot.
+
+    Args:
+        img_path: Screenshot path, or an in-memory image (ndarray / Frame), which is left unmodified
+        output_path: Where to write the grid image; None keeps it in memory only
+
+    Returns:
+        (rows, cols) of the grid
+    """
+    if isinstance(img_path, str):
+        image = cv2.imread(img_path)
+    else:
+        image = getattr(img_path, "image", img_path)
     height, width, _ = image.shape
-    color = (255, 116, 113)
-    unit_height = get_unit_len(height)
-    if unit_height < 0:
-        unit_height = 120
-    unit_width = get_unit_len(width)
-    if unit_width < 0:
-        unit_width = 120
-    thick = int(unit_width // 50)
-    rows = height // unit_height
-    cols = width // unit_width
-    for i in range(rows):
-        for j in range(cols):
-            label = i * cols + j + 1
-            left = int(j * unit_width)
-            top = int(i * unit_height)
-            right = int((j + 1) * unit_width)
-            bottom = int((i + 1) * unit_height)
-            cv2.rectangle(image, (left, top), (right, bottom), color, thick // 2)
-            cv2.putText(image, str(label), (left + int(unit_width * 0.05) + 3, top + int(unit_height * 0.3) + 3), 0,
-                        int(0.01 * unit_width), (0, 0, 0), thick)
-            cv2.putText(image, str(label), (left + int(unit_width * 0.05), top + int(unit_height * 0.3)), 0,
-                        int(0.01 * unit_width), color, thick)
-    cv2.imwrite(output_path, image)
-    return rows, cols
+    layout = get_grid_layout(width, height)
+    if output_path:
+        cv2.imwrite(output_path, layout.apply(image))
+    return layout.rows, layout.cols
+
+
+_payload_cache = None
+
+
+def get_payload_cache():
+    """Process-wide cache of model image payloads, sized by IMAGE_CACHE_MB"""
+    global _payload_cache
+    if _payload_cache is None:
+        from config import get_settings
+
+        _payload_cache = PayloadCache(get_settings().get("IMAGE_CACHE_MB", 64) * 1024 * 1024)
+    return _payload_cache
+
+
+def prepare_model_image(image):
+    """
+    Base64 JPEG payload for a model request, served from the payload cache when the same image
+    was already prepared with the same settings.
+
+    Args:
+        image: Frame (resized and encoded in memory) or image path (read once, never modified)
+
+    Returns:
+        Base64 string
+    """
+    from config import get_settings
+
+    configs = get_settings()
+    max_size = min(configs.get("IMAGE_MAX_WIDTH", 512), configs.get("IMAGE_MAX_HEIGHT", 512))
+    quality = configs.get("IMAGE_QUALITY", 85)
+    optimize = configs.get("OPTIMIZE_IMAGES", True)
+    cache = get_payload_cache()
+    if isinstance(image, str):
+        with open(image, "rb") as f:
+            data = f.read()
+        if not optimize:
+            return cache.get_or_create(cache.key(data, "original"), lambda: base64.b64encode(data).decode("utf-8"))
+        # Decoded only on a miss, so a hit costs the read and the hash
+        return cache.get_or_create(cache.key(data, max_size, quality),
+                                   lambda: Frame(cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR),
+                                                 image).to_base64(max_size, quality, optimize))
+    max_size = image.max_size or max_size
+    return cache.get_or_create(cache.key(image, max_size, quality, optimize),
+                               lambda: image.to_base64(max_size, quality, optimize))
 
 
 def encode_image(image_path):
@@ -145,14 +462,15 @@ def optimize_image(image_path, max_size=512, quality=85, output_path=None):
         image_path: Path to input image
         max_size: Maximum width or height in pixels (default: 512)
         quality: JPEG quality 1-100 (default: 85)
-        output_path: Path to save optimized image (if None, overwrites input)
+        output_path: Path to save optimized image (if None, <name>_optimized.jpg next to the input;
+                     the input itself is never overwritten)
 
     Returns:
         Path to optimized image
     """
-    from config import load_config
+    from config import get_settings
 
-    configs = load_config()
+    configs = get_settings()
 
     # Check if optimization is enabled
     if not configs.get("OPTIMIZE_IMAGES", True):
@@ -188,7 +506,7 @@ def optimize_image(image_path, max_size=512, quality=85, output_path=None):
 
         # Save optimized image
         if output_path is None:
-            output_path = image_path
+            output_path = os.path.splitext(image_path)[0] + "_optimized.jpg"
 
         cv2.imwrite(output_path, img, [cv2.IMWRITE_JPEG_QUALITY, quality])
 
@@ -4,13 +4,16 @@ import shutil
 from typing import List, Tuple
 from playwright.sync_api import sync_playwright, Page, Browser
 import cv2
+import numpy as np
 from bs4 import BeautifulSoup
 
-from config import load_config
-from utils import print_with_color
+from config import get_settings
+from utils import print_with_color, CenterGrid, frame_fingerprint, wait_until_stable
+from element_table import ElementTable
+from artifacts import Frame
 
 
-configs = load_config()
+configs = get_settings()
 
 
 def normalize_url(url: str) -> str:
@@ -37,7 +40,7 @@ def normalize_url(url: str) -> str:
 
 
 class WebElement:
-    """Web element similar to AndroidElement for consistency"""
+    """Web element similar to AndroidElement for consistency (also the row view of ElementTable)"""
     def __init__(self, uid, bbox, attrib):
         self.uid = uid
         self.bbox = bbox
@@ -75,8 +78,7 @@ def extract_interactive_elements(page: Page, html_content: str = None) -> List[W
         '[contenteditable="true"]',  # Editable content
     ]
 
-    seen_positions = set()
-    min_dist = configs.get("MIN_DIST", 30)
+    seen_positions = CenterGrid(configs.get("MIN_DIST", 30), inclusive=False)
 
     for selector in selectors:
         try:
@@ -106,14 +108,7 @@ def extract_interactive_elements(page: Page, html_content: str = None) -> List[W
                     center_y = int(y + height / 2)
 
                     # Check if too close to existing element
-                    too_close = False
-                    for seen_pos in seen_positions:
-                        dist = ((center_x - seen_pos[0]) ** 2 + (center_y - seen_pos[1]) ** 2) ** 0.5
-                        if dist < min_dist:
-                            too_close = True
-                            break
-
-                    if too_close:
+                    if seen_positions.is_close((center_x, center_y)):
                         continue
 
                     seen_positions.add((center_x, center_y))
@@ -200,6 +195,9 @@ class WebController:
             user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
         )
         self.page = self.context.new_page()
+        self.last_frame = None
+        self._last_png = None
+        self.screen_fingerprint = None
 
         # Get viewport size
         viewport = self.page.viewport_size
@@ -234,9 +232,22 @@ class WebController:
         """
         os.makedirs(save_dir, exist_ok=True)
         screenshot_path = os.path.join(save_dir, f"{prefix}.png")
-        self.page.screenshot(path=screenshot_path, full_page=False)
+        png = self.page.screenshot(full_page=False)
+        with open(screenshot_path, "wb") as f:
+            f.write(png)
+        # Keep the decoded frame so labeling and encoding do not read the file back
+        self._last_png = png
+        self.last_frame = cv2.imdecode(np.frombuffer(png, dtype=np.uint8), cv2.IMREAD_COLOR)
+        self.screen_fingerprint = frame_fingerprint(self.last_frame)
         return screenshot_path
 
+    def frame(self, screenshot_path):
+        """The screenshot at screenshot_path as an in-memory Frame (see AndroidController.frame)"""
+        name = os.path.splitext(os.path.basename(screenshot_path))[0]
+        if self.last_frame is None:
+            return Frame.from_path(screenshot_path, name)
+        return Frame(self.last_frame, name, png=self._last_png)
+
     def get_html(self, prefix: str, save_dir: str) -> str:
         """
         Get HTML content and save to file (similar to get_xml for Android)
@@ -257,9 +268,61 @@ class WebController:
 
         return html_path
 
-    def get_interactive_elements(self) -> List[WebElement]:
-        """Get list of interactive elements on current page"""
-        return extract_interactive_elements(self.page)
+    def observe(self, prefix: str, save_dir: str, xml_prefix: str = None, xml_dir: str = None, unchanged=None):
+        """
+        Capture screenshot and HTML of the current page (counterpart of AndroidController.observe)
+
+        Playwright's sync API is bound to the thread that started it, so the two captures run
+        back to back here; both are in-process and far cheaper than a device round trip.
+
+        Args:
+            prefix: Screenshot filename prefix
+            save_dir: Directory to save the screenshot
+            xml_prefix: HTML filename prefix (defaults to prefix)
+            xml_dir: Directory to save the HTML (defaults to save_dir)
+            unchanged: Optional predicate on the screenshot's fingerprint; if it holds, the HTML is
+                       not fetched
+
+        Returns:
+            (screenshot_path, html_path), with html_path None if the HTML was not fetched
+        """
+        screenshot_path = self.get_screenshot(prefix, save_dir)
+        if unchanged is not None and unchanged(self.screen_fingerprint):
+            return screenshot_path, None
+        html_path = self.get_html(xml_prefix or prefix, xml_dir or save_dir)
+        return screenshot_path, html_path
+
+    def get_interactive_elements(self) -> ElementTable:
+        """Get table of interactive elements on current page"""
+        return ElementTable.from_elements(extract_interactive_elements(self.page), WebElement)
+
+    def _screen_fingerprint(self):
+        try:
+            data = self.page.screenshot(type="jpeg", quality=50)
+        except Exception:
+            return None
+        return frame_fingerprint(cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE))
+
+    def wait_until_stable(self):
+        """
+        Wait for the page to settle after an action (same contract as AndroidController)
+
+        Returns:
+            Measured settle time in seconds
+        """
+        if not configs.get("SETTLE_WAIT", True):
+            time.sleep(configs["REQUEST_INTERVAL"])
+            return float(configs["REQUEST_INTERVAL"])
+        settle_time, stable = wait_until_stable(self._screen_fingerprint,
+                                                min_wait=configs.get("SETTLE_MIN_WAIT", 0.3),
+                                                max_wait=configs.get("SETTLE_MAX_WAIT", 10),
+                                                interval=configs.get("SETTLE_INTERVAL", 0.25),
+                                                tolerance=configs.get("SETTLE_TOLERANCE", 8),
+                                                baseline=self.screen_fingerprint,
+                                                unchanged_wait=configs.get("SETTLE_UNCHANGED_WAIT", 2.0))
+        if not stable:
+            print_with_color(f"WARNING: Page still changing after {settle_time:.2f}s, continuing", "yellow")
+        return settle_time
 
     def back(self):
         """Go back to previous page"""
@@ -379,6 +442,12 @@ class WebController:
         Returns:
             Path to saved screenshot
         """
+        if not isinstance(screenshot_before, str):
+            # In-memory image (ndarray / Frame): draw on a copy and return it
+            img = getattr(screenshot_before, "image", screenshot_before).copy()
+            cv2.rectangle(img, (int(tl[0]), int(tl[1])), (int(br[0]), int(br[1])), (0, 255, 0), 2)
+            return img
+
         # Copy the screenshot_before image
         shutil.copy(screenshot_before, save_path)
 
@@ -400,13 +469,18 @@ class WebController:
         Args:
             x: X coordinate
             y: Y coordinate
-            img_path: Path to image file
+            img_path: Path to image file, or an ndarray to draw on in place
             r: Circle radius (default: 10)
             thickness: Line thickness (default: 2)
+
+        Returns:
+            The drawn image
         """
-        img = cv2.imread(img_path)
+        img = cv2.imread(img_path) if isinstance(img_path, str) else img_path
         cv2.circle(img, (int(x), int(y)), r, (0, 0, 255), thickness)
-        cv2.imwrite(img_path, img)
+        if isinstance(img_path, str):
+            cv2.imwrite(img_path, img)
+        return img
 
     def draw_arrow(self, x, y, direction, dist, image_path, arrow_color=(0, 255, 0), thickness=2):
         """
@@ -417,11 +491,14 @@ class WebController:
             y: Starting Y coordinate
             direction: Arrow direction ("up", "down", "left", "right")
             dist: Distance ("short", "medium", "long")
-            image_path: Path to image file
+            image_path: Path to image file, or an ndarray to draw on in place
             arrow_color: RGB color tuple (default: green)
             thickness: Line thickness (default: 2)
+
+        Returns:
+            The drawn image
         """
-        img = cv2.imread(image_path)
+        img = cv2.imread(image_path) if isinstance(image_path, str) else image_path
 
         # Calculate the arrow length based on the screen width and dist
         screen_width = img.shape[1]
@@ -449,7 +526,9 @@ class WebController:
         cv2.arrowedLine(img, (x, y), end_point, arrow_color, thickness)
 
         # Save the modified image
-        cv2.imwrite(image_path, img)
+        if isinstance(image_path, str):
+            cv2.imwrite(image_path, img)
+        return img
 
     def close(self):
         """Close browser and cleanup"""